@@ -0,0 +1,8 @@
+-- Indexes for the keyset-paginated attendance history (newest first by
+-- attendance_date, attendance_id) when filtered by batch or student.
+-- idx_date already covers the unfiltered case: InnoDB secondary indexes
+-- carry the primary key, so it is effectively (attendance_date, attendance_id).
+ALTER TABLE attendance
+ADD INDEX idx_batch_date (batch_id, attendance_date),
+ADD INDEX idx_student_date (student_id, attendance_date),
+DROP INDEX idx_student;
@@ -0,0 +1,8 @@
+-- Track when batches change so the course catalog can send ETag/Last-Modified
+ALTER TABLE batches
+ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+COMMENT 'Last change to the batch (seats, dates, status...)';
+
+-- MAX(updated_at) is read on every catalog request
+ALTER TABLE batches ADD INDEX idx_course_updated (course_id, updated_at);
+ALTER TABLE courses ADD INDEX idx_updated (updated_at);
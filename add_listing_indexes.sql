@@ -0,0 +1,7 @@
+-- Indexes for sorting the paginated admin listings (manage users, students,
+-- teachers, courses and batches)
+ALTER TABLE users ADD INDEX idx_created (created_at), ADD INDEX idx_full_name (full_name);
+ALTER TABLE students ADD INDEX idx_admission (admission_date);
+ALTER TABLE teachers ADD INDEX idx_joining (joining_date);
+ALTER TABLE courses ADD INDEX idx_created (created_at), ADD INDEX idx_course_name (course_name);
+ALTER TABLE batches ADD INDEX idx_start_date (start_date), ADD INDEX idx_batch_name (batch_name);
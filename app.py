@@ -1,6 +1,10 @@
 from flask import Flask, render_template, redirect, url_for
 from config import Config
-from database import init_connection_pool, test_connection
+from database import init_connection_pool, test_connection, close_request_connection, PoolExhaustedError
+from passwords import PasswordPoolBusy
+from werkzeug.middleware.proxy_fix import ProxyFix
+import query_stats
+import metrics
 import os
 
 # Import blueprints
@@ -18,6 +22,11 @@ def create_app():
     # Initialize configuration
     Config.init_app(app)
     
+    # Behind a reverse proxy, take the client address from X-Forwarded-For
+    # (login throttling is per client IP)
+    if Config.PROXY_FIX_HOPS:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXY_FIX_HOPS, x_proto=Config.PROXY_FIX_HOPS)
+    
     # Initialize database connection pool
     init_connection_pool()
     
@@ -25,6 +34,15 @@ def create_app():
     if not test_connection():
         print("Warning: Could not connect to database. Please check your configuration.")
     
+    # Return the request-scoped database connection to the pool
+    app.teardown_appcontext(close_request_connection)
+    
+    # Per-request query counts and timings (Server-Timing header, debug footer)
+    query_stats.init_app(app)
+    
+    # Prometheus metrics for every blueprint, served from /metrics
+    metrics.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
@@ -58,6 +76,11 @@ def create_app():
     def internal_error(error):
         return render_template('errors/500.html'), 500
     
+    @app.errorhandler(PoolExhaustedError)
+    @app.errorhandler(PasswordPoolBusy)
+    def service_busy(error):
+        return render_template('errors/503.html'), 503, {'Retry-After': '5'}
+    
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,254 @@
+from database import execute_query, transaction, Error
+from attendance_service import ATTENDANCE_TABLES, RETRY_ERRNOS, rebuild_attendance_summary
+from config import Config
+from datetime import datetime
+import csv
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('batch', 'enrollment_no', 'date', 'status')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+# Only the first errors are kept in full; the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+_UPSERT = """INSERT INTO attendance (batch_id, student_id, attendance_date, status, marked_by, remarks)
+             VALUES {values}
+             ON DUPLICATE KEY UPDATE status = VALUES(status),
+                 marked_by = VALUES(marked_by),
+                 remarks = VALUES(remarks)"""
+
+class AttendanceImportError(ValueError):
+    """The attendance file or lookups cannot be used for an import"""
+
+class AttendanceImportReport:
+    """Counts, throughput and the first errors of one attendance import"""
+
+    def __init__(self):
+        self.processed = 0
+        self.written = 0
+        self.failed = 0
+        self.error_count = 0
+        self.errors = []
+        self.batches = set()
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add_error(self, line, message):
+        with self._lock:
+            self.error_count += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({'line': line, 'message': message})
+
+    def chunk_written(self, batch_id, rows):
+        with self._lock:
+            self.written += rows
+            self.batches.add(batch_id)
+
+    def chunk_failed(self, batch_id, lines):
+        with self._lock:
+            self.failed += len(lines)
+        self.add_error(lines[0], f"Database error writing {len(lines)} row(s) of batch {batch_id} "
+                                 f"(lines {lines[0]}-{lines[-1]}), not imported")
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return round(self.written / self.elapsed) if self.elapsed else 0
+
+def read_rows(path):
+    """Stream (line_number, row dict) pairs from a long-format attendance CSV"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.reader(handle)
+        columns = [name.strip().lower().replace(' ', '_') for name in next(reader, [])]
+        missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+        if missing:
+            raise AttendanceImportError(f"Missing column(s): {', '.join(missing)}")
+        for values in reader:
+            if any(value.strip() for value in values):
+                yield reader.line_num, dict(zip(columns, values))
+
+def load_lookups():
+    """
+    Preload what every row is resolved against, with one query per table
+
+    Returns:
+        Dict with 'batches' (batch id or lower-cased name -> batch_id; names
+        used by more than one batch map to None), 'students' (enrollment_no
+        -> student_id) and 'enrolled' (set of (batch_id, student_id))
+    """
+    batch_rows = execute_query("SELECT batch_id, batch_name FROM batches", fetch=True)
+    student_rows = execute_query("SELECT student_id, enrollment_no FROM students", fetch=True)
+    enrollment_rows = execute_query("SELECT batch_id, student_id FROM enrollments", fetch=True)
+    if batch_rows is None or student_rows is None or enrollment_rows is None:
+        raise AttendanceImportError("Could not load batches, students and enrollments")
+
+    batches = {}
+    for row in batch_rows:
+        name = row['batch_name'].strip().lower()
+        batches[name] = None if name in batches else row['batch_id']
+    batches.update((str(row['batch_id']), row['batch_id']) for row in batch_rows)
+    return {
+        'batches': batches,
+        'students': {row['enrollment_no'].strip().upper(): row['student_id'] for row in student_rows},
+        'enrolled': {(row['batch_id'], row['student_id']) for row in enrollment_rows},
+    }
+
+def _parse_date(value, parsed_dates):
+    # A term has a few hundred distinct dates, so each is parsed only once
+    day = parsed_dates.get(value)
+    if day is None:
+        for date_format in DATE_FORMATS:
+            try:
+                day = datetime.strptime(value, date_format).date()
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Unrecognised date '{value}' (use YYYY-MM-DD)")
+        parsed_dates[value] = day
+    return day
+
+def _resolve(row, lookups, parsed_dates):
+    """(batch_id, student_id, date, status, remarks) for one row; ValueError if it cannot be imported"""
+    batch = (row.get('batch') or '').strip()
+    batch_id = lookups['batches'].get(batch.lower())
+    if batch_id is None:
+        if batch.lower() in lookups['batches']:
+            raise ValueError(f"Batch name '{batch}' is used by several batches; use the batch id")
+        raise ValueError(f"Unknown batch '{batch}'")
+
+    enrollment_no = (row.get('enrollment_no') or '').strip().upper()
+    student_id = lookups['students'].get(enrollment_no)
+    if student_id is None:
+        raise ValueError(f"Unknown enrollment_no '{enrollment_no}'")
+    if (batch_id, student_id) not in lookups['enrolled']:
+        raise ValueError(f"{enrollment_no} is not enrolled in batch '{batch}'")
+
+    status = (row.get('status') or '').strip().lower()
+    if status not in ATTENDANCE_TABLES['student']['statuses']:
+        raise ValueError(f"Invalid status '{status}'")
+
+    day = _parse_date((row.get('date') or '').strip(), parsed_dates)
+    return batch_id, student_id, day, status, (row.get('remarks') or '').strip() or None
+
+def _write_chunk(batch_id, chunk, marked_by, report):
+    """Upsert one chunk; a deadlock or lock wait timeout with another writer is retried once"""
+    params = []
+    for _, student_id, day, status, remarks in chunk:
+        params.extend([batch_id, student_id, day, status, marked_by, remarks])
+    query = _UPSERT.format(values=", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk)))
+
+    for attempt in range(2):
+        try:
+            # In a transaction so the error (and its errno) reaches us
+            with transaction():
+                execute_query(query, tuple(params), commit=True)
+            break
+        except Error as e:
+            if attempt or getattr(e, 'errno', None) not in RETRY_ERRNOS:
+                logger.error(f"Attendance import chunk for batch {batch_id} failed: {e}")
+                report.chunk_failed(batch_id, [entry[0] for entry in chunk])
+                return
+    report.chunk_written(batch_id, len(chunk))
+
+def _writer(jobs, marked_by, report):
+    """
+    Write the chunks queued for this thread's batches, then rebuild their summaries
+
+    Every chunk of a batch goes to the same writer, so a batch's rows land
+    in file order and a later mark for the same day wins.
+    """
+    batches = set()
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        batch_id, chunk = job
+        try:
+            _write_chunk(batch_id, chunk, marked_by, report)
+            batches.add(batch_id)
+        except Exception:
+            # Keep draining the queue so the reader never blocks on it
+            logger.exception(f"Attendance import chunk for batch {batch_id} failed")
+            report.chunk_failed(batch_id, [entry[0] for entry in chunk])
+
+    for batch_id in sorted(batches):
+        try:
+            rebuild_attendance_summary(batch_id)
+        except Error as e:
+            logger.error(f"Attendance summary rebuild for batch {batch_id} failed: {e}")
+            report.add_error(None, f"attendance_summary not rebuilt for batch {batch_id}; "
+                                   f"run rebuild_attendance_summary.py --batch {batch_id}")
+
+def import_attendance(rows, marked_by, workers=None, chunk_size=None, progress=None, progress_every=50000):
+    """
+    Load (line_number, row dict) pairs, e.g. read_rows(), into attendance
+
+    Rows are resolved in memory against load_lookups() (no query per row),
+    grouped per batch and written in chunks of chunk_size with one
+    multi-row INSERT ... ON DUPLICATE KEY UPDATE on unique_attendance, so
+    re-running an import updates rows instead of duplicating them.
+    Batches are spread over `workers` writer threads, each with its own
+    pooled connection; the bounded queues hold the reader back when the
+    writers fall behind. attendance_summary is rebuilt once per imported
+    batch at the end instead of being adjusted per chunk.
+
+    Args:
+        marked_by: user_id recorded as the marker
+        workers: Writer threads, default Config.ATTENDANCE_IMPORT_WORKERS
+        chunk_size: Rows per statement, default Config.ATTENDANCE_IMPORT_CHUNK_SIZE
+        progress: Optional callable(report), called every progress_every rows and at the end
+
+    Returns:
+        AttendanceImportReport
+    """
+    workers = max(1, workers or Config.ATTENDANCE_IMPORT_WORKERS)
+    chunk_size = max(1, chunk_size or Config.ATTENDANCE_IMPORT_CHUNK_SIZE)
+    lookups = load_lookups()
+    report = AttendanceImportReport()
+
+    queues = [queue.Queue(maxsize=4) for _ in range(workers)]
+    threads = [threading.Thread(target=_writer, args=(jobs, marked_by, report),
+                                name=f"attendance-import-{index}", daemon=True)
+               for index, jobs in enumerate(queues)]
+    for thread in threads:
+        thread.start()
+
+    pending = {}
+    parsed_dates = {}
+    try:
+        for line, row in rows:
+            report.processed += 1
+            try:
+                batch_id, student_id, day, status, remarks = _resolve(row, lookups, parsed_dates)
+            except ValueError as e:
+                report.add_error(line, str(e))
+                continue
+
+            chunk = pending.setdefault(batch_id, [])
+            chunk.append((line, student_id, day, status, remarks))
+            if len(chunk) >= chunk_size:
+                queues[batch_id % workers].put((batch_id, pending.pop(batch_id)))
+            if progress and report.processed % progress_every == 0:
+                progress(report)
+
+        for batch_id, chunk in pending.items():
+            queues[batch_id % workers].put((batch_id, chunk))
+    finally:
+        for jobs in queues:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+        report.finished = time.monotonic()
+
+    if progress:
+        progress(report)
+    return report
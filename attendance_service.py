@@ -0,0 +1,410 @@
+from database import execute_query, iter_query, transaction, Error
+from datetime import date
+
+# Table, person column and allowed statuses for each kind of attendance sheet
+ATTENDANCE_TABLES = {
+    'student': {
+        'table': 'attendance',
+        'person_column': 'student_id',
+        'statuses': ('present', 'absent', 'late', 'excused'),
+    },
+    'teacher': {
+        'table': 'teacher_attendance',
+        'person_column': 'teacher_id',
+        'statuses': ('present', 'absent', 'late', 'on_leave'),
+    },
+}
+
+# Deadlock and lock wait timeout: InnoDB rolled the transaction back, so it can run again
+RETRY_ERRNOS = (1213, 1205)
+
+# Status counters kept per (batch_id, student_id) in attendance_summary
+SUMMARY_STATUSES = ('present', 'absent', 'late', 'excused')
+
+# Report columns computed from an attendance_summary row aliased "sm"; the
+# names match the columns the report templates already use
+SUMMARY_REPORT_COLUMNS = """
+    COALESCE(sm.total_classes, 0) as total_classes,
+    COALESCE(sm.present_count + sm.late_count, 0) as attended,
+    COALESCE(sm.present_count, 0) as present_count,
+    COALESCE(sm.absent_count, 0) as absent_count,
+    COALESCE(sm.late_count, 0) as late_count,
+    COALESCE(sm.excused_count, 0) as excused_count,
+    ROUND((sm.present_count + sm.late_count) * 100.0 / NULLIF(sm.total_classes, 0), 2) as attendance_percentage
+"""
+
+def apply_summary_changes(changes):
+    """
+    Fold attendance status changes into attendance_summary
+
+    Must run inside the transaction that wrote the attendance rows.
+
+    Args:
+        changes: List of (batch_id, student_id, old_status, new_status) tuples;
+            old_status is None for a new row, new_status None for a deleted one
+    """
+    deltas = {}
+    for batch_id, student_id, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        delta = deltas.setdefault((int(batch_id), int(student_id)), dict.fromkeys(('total',) + SUMMARY_STATUSES, 0))
+        if old_status is None:
+            delta['total'] += 1
+        else:
+            delta[old_status] -= 1
+        if new_status is None:
+            delta['total'] -= 1
+        else:
+            delta[new_status] += 1
+
+    if not deltas:
+        return
+
+    # Key order, so concurrent transactions lock summary rows in the same order
+    params = []
+    for (batch_id, student_id), delta in sorted(deltas.items()):
+        params.extend([batch_id, student_id, delta['total']] + [delta[status] for status in SUMMARY_STATUSES])
+
+    execute_query(
+        f"""INSERT INTO attendance_summary (batch_id, student_id, total_classes,
+                present_count, absent_count, late_count, excused_count)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(deltas))}
+            ON DUPLICATE KEY UPDATE
+                total_classes = total_classes + VALUES(total_classes),
+                present_count = present_count + VALUES(present_count),
+                absent_count = absent_count + VALUES(absent_count),
+                late_count = late_count + VALUES(late_count),
+                excused_count = excused_count + VALUES(excused_count)""",
+        tuple(params),
+        commit=True
+    )
+
+def save_attendance(attendance_type, rows, marked_by):
+    """
+    Write a set of attendance marks in one transaction
+
+    Existing rows are read once (locked) to tell inserts from updates, then
+    every mark is written with a single multi-row INSERT ... ON DUPLICATE KEY
+    UPDATE against the table's unique (batch, person, date) key.
+
+    The sheet's batch rows are locked first, so concurrent saves for a batch
+    queue up instead of interleaving gap locks, and rows are written in key
+    order. A deadlock or lock wait timeout is retried once.
+
+    Args:
+        attendance_type: 'student' or 'teacher'
+        rows: List of (batch_id, person_id, attendance_date, status, remarks) tuples
+        marked_by: user_id recorded as the marker
+
+    Returns:
+        Dict with 'inserted' and 'updated' row counts, and 'skipped' for rows
+        whose batch or person id is not a number (e.g. a tampered form)
+    """
+    spec = ATTENDANCE_TABLES[attendance_type]
+
+    # Last mark wins if the same person appears twice on a sheet
+    marks = {}
+    skipped = 0
+    for batch_id, person_id, attendance_date, status, remarks in rows:
+        if status in spec['statuses']:
+            try:
+                key = (int(batch_id), int(person_id), str(attendance_date))
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            marks[key] = (status, remarks or None)
+
+    if not marks:
+        return {'inserted': 0, 'updated': 0, 'skipped': skipped}
+
+    keys = sorted(marks)
+    for attempt in range(2):
+        try:
+            existing = _write_marks(attendance_type, keys, marks, marked_by)
+            break
+        except Error as e:
+            if attempt or getattr(e, 'errno', None) not in RETRY_ERRNOS:
+                raise
+
+    updated = len(existing)
+    return {'inserted': len(keys) - updated, 'updated': updated, 'skipped': skipped}
+
+def _write_marks(attendance_type, keys, marks, marked_by):
+    """One attempt at save_attendance's transaction; returns the rows that already existed"""
+    spec = ATTENDANCE_TABLES[attendance_type]
+    table = spec['table']
+    person_column = spec['person_column']
+    batch_ids = sorted({key[0] for key in keys})
+
+    key_placeholders = ", ".join(["(%s, %s, %s)"] * len(keys))
+    key_params = tuple(value for key in keys for value in key)
+
+    value_placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(keys))
+    value_params = []
+    for key in keys:
+        status, remarks = marks[key]
+        value_params.extend([key[0], key[1], key[2], status, marked_by, remarks])
+
+    with transaction():
+        execute_query(
+            f"""SELECT batch_id FROM batches
+                WHERE batch_id IN ({", ".join(["%s"] * len(batch_ids))})
+                ORDER BY batch_id
+                FOR UPDATE""",
+            tuple(batch_ids),
+            fetch=True
+        )
+        existing = execute_query(
+            f"""SELECT batch_id, {person_column} AS person_id, attendance_date, status
+                FROM {table}
+                WHERE (batch_id, {person_column}, attendance_date) IN ({key_placeholders})
+                FOR UPDATE""",
+            key_params,
+            fetch=True
+        )
+
+        execute_query(
+            f"""INSERT INTO {table} (batch_id, {person_column}, attendance_date, status, marked_by, remarks)
+                VALUES {value_placeholders}
+                ON DUPLICATE KEY UPDATE status = VALUES(status),
+                    marked_by = VALUES(marked_by),
+                    remarks = VALUES(remarks)""",
+            tuple(value_params),
+            commit=True
+        )
+
+        if attendance_type == 'student':
+            old_statuses = {
+                (row['batch_id'], row['person_id'], str(row['attendance_date'])): row['status']
+                for row in existing
+            }
+            apply_summary_changes([
+                (key[0], key[1], old_statuses.get(key), marks[key][0])
+                for key in keys
+            ])
+    return existing
+
+def update_attendance_record(attendance_id, status, remarks, marked_by):
+    """Change one student attendance record and keep the summary in step"""
+    with transaction():
+        record = execute_query(
+            "SELECT batch_id, student_id, status FROM attendance WHERE attendance_id = %s FOR UPDATE",
+            (attendance_id,),
+            fetch_one=True
+        )
+        if not record:
+            return False
+
+        execute_query(
+            """UPDATE attendance SET status = %s, remarks = %s, marked_by = %s
+               WHERE attendance_id = %s""",
+            (status, remarks or None, marked_by, attendance_id),
+            commit=True
+        )
+        apply_summary_changes([(record['batch_id'], record['student_id'], record['status'], status)])
+    return True
+
+def delete_attendance_record(attendance_id):
+    """Delete one student attendance record and keep the summary in step"""
+    with transaction():
+        record = execute_query(
+            "SELECT batch_id, student_id, status FROM attendance WHERE attendance_id = %s FOR UPDATE",
+            (attendance_id,),
+            fetch_one=True
+        )
+        if not record:
+            return False
+
+        execute_query(
+            "DELETE FROM attendance WHERE attendance_id = %s",
+            (attendance_id,),
+            commit=True
+        )
+        apply_summary_changes([(record['batch_id'], record['student_id'], record['status'], None)])
+    return True
+
+# Per-(batch, student) counts aggregated straight from the attendance table
+_LIVE_SUMMARY_QUERY = """
+    SELECT batch_id, student_id,
+           COUNT(*) as total_classes,
+           SUM(status = 'present') as present_count,
+           SUM(status = 'absent') as absent_count,
+           SUM(status = 'late') as late_count,
+           SUM(status = 'excused') as excused_count
+    FROM attendance
+    {where}
+    GROUP BY batch_id, student_id
+"""
+
+def rebuild_attendance_summary(batch_id=None):
+    """
+    Recompute attendance_summary from the attendance table
+
+    Args:
+        batch_id: Rebuild only this batch; None rebuilds every batch
+
+    Returns:
+        Number of summary rows written
+    """
+    where = "WHERE batch_id = %s" if batch_id else ""
+    params = (batch_id,) if batch_id else None
+
+    with transaction():
+        execute_query(
+            f"DELETE FROM attendance_summary {where}",
+            params,
+            commit=True
+        )
+        return execute_query(
+            f"""INSERT INTO attendance_summary (batch_id, student_id, total_classes,
+                    present_count, absent_count, late_count, excused_count)
+                {_LIVE_SUMMARY_QUERY.format(where=where)}""",
+            params,
+            commit=True
+        )
+
+def verify_attendance_summary(batch_id=None):
+    """
+    Compare attendance_summary with a live aggregation of attendance
+
+    Returns:
+        List of dicts for every (batch_id, student_id) whose counts differ,
+        with the live counts and the stored ones (prefixed with "stored_")
+    """
+    where = "WHERE batch_id = %s" if batch_id else ""
+    summary_where = "WHERE sm.batch_id = %s" if batch_id else ""
+    params = (batch_id, batch_id) if batch_id else None
+
+    return execute_query(
+        f"""SELECT live.*, sm.total_classes as stored_total_classes,
+                   sm.present_count as stored_present_count, sm.absent_count as stored_absent_count,
+                   sm.late_count as stored_late_count, sm.excused_count as stored_excused_count
+            FROM ({_LIVE_SUMMARY_QUERY.format(where=where)}) live
+            LEFT JOIN attendance_summary sm
+                ON sm.batch_id = live.batch_id AND sm.student_id = live.student_id
+            WHERE sm.batch_id IS NULL
+               OR sm.total_classes <> live.total_classes
+               OR sm.present_count <> live.present_count
+               OR sm.absent_count <> live.absent_count
+               OR sm.late_count <> live.late_count
+               OR sm.excused_count <> live.excused_count
+            UNION ALL
+            SELECT sm.batch_id, sm.student_id, 0, 0, 0, 0, 0,
+                   sm.total_classes, sm.present_count, sm.absent_count,
+                   sm.late_count, sm.excused_count
+            FROM attendance_summary sm
+            {summary_where}
+            {"AND" if batch_id else "WHERE"} sm.total_classes <> 0
+              AND NOT EXISTS (
+                  SELECT 1 FROM attendance a
+                  WHERE a.batch_id = sm.batch_id AND a.student_id = sm.student_id
+              )""",
+        params,
+        fetch=True
+    )
+
+# Attendance history rows with the names the history page and export show
+_HISTORY_QUERY = """
+    SELECT
+        a.*,
+        s.enrollment_no,
+        u.full_name as student_name,
+        b.batch_name,
+        c.course_name,
+        marker.full_name as marked_by_name
+    FROM attendance a
+    JOIN students s ON a.student_id = s.student_id
+    JOIN users u ON s.user_id = u.user_id
+    JOIN batches b ON a.batch_id = b.batch_id
+    JOIN courses c ON b.course_id = c.course_id
+    JOIN users marker ON a.marked_by = marker.user_id
+    WHERE {where}
+    ORDER BY a.attendance_date {direction}, a.attendance_id {direction}
+"""
+
+def encode_history_cursor(record):
+    """Cursor pointing at an attendance history row: <date>_<attendance_id>"""
+    return f"{record['attendance_date']}_{record['attendance_id']}"
+
+def decode_history_cursor(cursor):
+    """Return (attendance_date, attendance_id) from a cursor, or None if malformed"""
+    try:
+        day, attendance_id = (cursor or '').split('_')
+        return date.fromisoformat(day), int(attendance_id)
+    except ValueError:
+        return None
+
+def _history_conditions(filters):
+    conditions = ["1=1"]
+    params = []
+    for column, key, operator in (('a.batch_id', 'batch_id', '='),
+                                  ('a.student_id', 'student_id', '='),
+                                  ('a.attendance_date', 'date_from', '>='),
+                                  ('a.attendance_date', 'date_to', '<='),
+                                  ('a.status', 'status', '=')):
+        if filters.get(key):
+            conditions.append(f"{column} {operator} %s")
+            params.append(filters[key])
+    return conditions, params
+
+def _fetch_history(filters, limit, after=None, before=None):
+    conditions, params = _history_conditions(filters)
+    direction = 'DESC'
+    position = after or before
+    if position:
+        # Expanded form of (date, id) < / > (%s, %s) so MySQL can range-scan the index
+        operator = '<' if after else '>'
+        conditions.append(f"(a.attendance_date {operator} %s OR (a.attendance_date = %s AND a.attendance_id {operator} %s))")
+        params.extend([position[0], position[0], position[1]])
+        if before:
+            direction = 'ASC'
+    params.append(limit)
+    rows = execute_query(
+        _HISTORY_QUERY.format(where=" AND ".join(conditions), direction=direction) + " LIMIT %s",
+        tuple(params),
+        fetch=True
+    )
+    return rows or []
+
+def attendance_history_page(filters, per_page, after=None, before=None):
+    """
+    One page of attendance history, newest first, by keyset pagination
+
+    Pages are addressed by the (attendance_date, attendance_id) of the row
+    next to them rather than an OFFSET, so deep pages cost the same as the
+    first and rows added meanwhile do not shift the page boundaries.
+
+    Args:
+        filters: Dict with optional batch_id, student_id, date_from, date_to, status
+        per_page: Rows per page
+        after: Cursor of the last row of the previous page (older rows follow)
+        before: Cursor of the first row of the next page (newer rows precede)
+
+    Returns:
+        Dict with 'records', 'next_cursor' (older page) and 'prev_cursor' (newer page);
+        cursors are None when there is no such page
+    """
+    after = decode_history_cursor(after) if after else None
+    before = decode_history_cursor(before) if before and not after else None
+
+    rows = _fetch_history(filters, per_page + 1, after=after, before=before)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    has_newer = bool(before and has_more) or bool(after)
+    has_older = bool(not before and has_more) or bool(before)
+    return {
+        'records': rows,
+        'next_cursor': encode_history_cursor(rows[-1]) if rows and has_older else None,
+        'prev_cursor': encode_history_cursor(rows[0]) if rows and has_newer else None,
+    }
+
+def iter_attendance_history(filters):
+    """Yield every matching history row, newest first, streamed from the server"""
+    conditions, params = _history_conditions(filters)
+    return iter_query(
+        _HISTORY_QUERY.format(where=" AND ".join(conditions), direction='DESC'),
+        tuple(params)
+    )
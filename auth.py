@@ -1,19 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from functools import wraps
-import bcrypt
-from database import execute_query
+from passwords import hash_password, verify_password, needs_rehash, PasswordPoolBusy
+from database import execute_query, transaction, Error
+from dashboard_counters import adjust_counters
+from typeahead import invalidate_lookups
+from rate_limit import login_key, check_login, record_failed_login, reset_login
+from metrics import login_attempts_total
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password, password_hash):
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
-
 def login_required(f):
     """Decorator to require login for routes"""
     @wraps(f)
@@ -57,7 +53,20 @@ def login():
             fetch_one=True
         )
         
+        # Refuse floods before paying for bcrypt; attempts count against the
+        # account, whichever of its username or email was typed
+        client_ip = request.remote_addr or 'unknown'
+        account = login_key(user, username)
+        wait = check_login(client_ip, account)
+        if wait:
+            login_attempts_total.inc(result='throttled')
+            flash(f'Too many login attempts. Please try again in {wait} seconds.', 'danger')
+            return render_template('login.html'), 429, {'Retry-After': str(wait)}
+        
         if user and verify_password(password, user['password_hash']):
+            login_attempts_total.inc(result='success')
+            reset_login(account)
+            
             # Set session variables
             session['user_id'] = user['user_id']
             session['username'] = user['username']
@@ -65,6 +74,17 @@ def login():
             session['full_name'] = user['full_name']
             session['email'] = user['email']
             
+            # Upgrade hashes made with an older cost while we have the password
+            if needs_rehash(user['password_hash']):
+                try:
+                    execute_query(
+                        "UPDATE users SET password_hash = %s WHERE user_id = %s",
+                        (hash_password(password), user['user_id']),
+                        commit=True
+                    )
+                except PasswordPoolBusy:
+                    pass
+            
             # Get role-specific ID
             if user['role'] == 'student':
                 student = execute_query(
@@ -86,6 +106,8 @@ def login():
             flash(f'Welcome back, {user["full_name"]}!', 'success')
             return redirect(url_for('dashboard'))
         else:
+            login_attempts_total.inc(result='failure')
+            record_failed_login(client_ip)
             flash('Invalid username or password.', 'danger')
     
     return render_template('login.html')
@@ -150,34 +172,37 @@ def register():
                 flash(error, 'danger')
             return render_template('register.html')
         
-        # Create user
+        # Create user and student record in one transaction
         password_hash = hash_password(password)
-        user_id = execute_query(
-            """INSERT INTO users (username, email, password_hash, role, full_name, status)
-               VALUES (%s, %s, %s, 'student', %s, 'active')""",
-            (username, email, password_hash, full_name),
-            commit=True
-        )
-        
-        if user_id:
-            # Generate enrollment number
-            import datetime
-            enrollment_no = f"DSH{datetime.datetime.now().year}{user_id:05d}"
-            
-            # Create student record
-            execute_query(
-                """INSERT INTO students (user_id, enrollment_no, dob, gender, contact, address,
-                   guardian_name, guardian_contact, guardian_email, admission_date)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CURDATE())""",
-                (user_id, enrollment_no, dob or None, gender, contact, address,
-                 guardian_name, guardian_contact, guardian_email),
-                commit=True
-            )
-            
+        try:
+            with transaction():
+                user_id = execute_query(
+                    """INSERT INTO users (username, email, password_hash, role, full_name, status)
+                       VALUES (%s, %s, %s, 'student', %s, 'active')""",
+                    (username, email, password_hash, full_name),
+                    commit=True
+                )
+                
+                # Generate enrollment number
+                import datetime
+                enrollment_no = f"DSH{datetime.datetime.now().year}{user_id:05d}"
+                
+                # Create student record
+                execute_query(
+                    """INSERT INTO students (user_id, enrollment_no, dob, gender, contact, address,
+                       guardian_name, guardian_contact, guardian_email, admission_date)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CURDATE())""",
+                    (user_id, enrollment_no, dob or None, gender, contact, address,
+                     guardian_name, guardian_contact, guardian_email),
+                    commit=True
+                )
+        except Error:
+            flash('Registration failed. Please try again.', 'danger')
+        else:
+            adjust_counters({'total_students': 1, 'active_students': 1})
+            invalidate_lookups('students')
             flash('Registration successful! Please log in with your credentials.', 'success')
             return redirect(url_for('auth.login'))
-        else:
-            flash('Registration failed. Please try again.', 'danger')
     
     return render_template('register.html')
 
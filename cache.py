@@ -0,0 +1,193 @@
+from flask import g, request, session, make_response
+from config import Config
+from functools import wraps
+from collections import OrderedDict
+from urllib.parse import urlencode
+import hashlib
+from metrics import register_collector, cache_entries, cache_requests_total
+import threading
+import time
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with per-entry expiry
+
+    get_or_set() recomputes a missing or expired key in one thread only;
+    concurrent callers for the same key wait for that result instead of
+    all hitting the database at once (e.g. right after an invalidation).
+    Each worker process holds its own copy, so the TTL bounds how long a
+    write made through another worker can go unseen.
+    """
+
+    def __init__(self, name, ttl, max_entries=1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._generation = 0
+        register_collector(self._collect_metrics)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        # Least recently used entries go first when the cache is full
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_set(self, key, compute, should_store=None, ttl=None):
+        """
+        Return the cached value for key, computing it once on a miss
+
+        Args:
+            key: Cache key
+            compute: Zero-argument callable producing the value
+            should_store: Optional predicate; results it rejects are returned
+                to the caller but not cached (and waiting callers compute their own)
+            ttl: Override the cache's default TTL for this entry
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+            generation = self._generation
+
+        if not leader:
+            flight.wait(timeout=30)
+            value = self.get(key, _MISSING)
+            return compute() if value is _MISSING else value
+
+        try:
+            value = compute()
+            if should_store is None or should_store(value):
+                with self._lock:
+                    # An invalidation while computing means the value may be stale
+                    if generation == self._generation:
+                        self._store(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def invalidate(self, key=None):
+        """Drop one key, or every entry when key is None"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _collect_metrics(self):
+        with self._lock:
+            size = len(self._entries)
+        cache_entries.set(size, cache=self.name)
+        cache_requests_total.set(self.hits, cache=self.name, result='hit')
+        cache_requests_total.set(self.misses, cache=self.name, result='miss')
+
+def cached_page(cache, ttl=None):
+    """
+    Serve a view's rendered HTML from cache for anonymous visitors
+
+    Logged-in users (whose navbar differs), requests with flash messages
+    waiting to be shown and non-GET requests always run the view. Only
+    plain rendered pages are cached - redirects and other responses are not.
+    Pages are keyed on the path plus the sorted query arguments.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or 'user_id' in session or session.get('_flashes'):
+                return view(*args, **kwargs)
+            # Rendered for everyone: keep per-user extras such as the query footer out
+            g.page_cache_render = True
+            # The query string is part of the page; keep its order from splitting entries
+            query = urlencode(sorted(request.args.items(multi=True)))
+            return cache.get_or_set(
+                f"page:{request.path}?{query}" if query else f"page:{request.path}",
+                lambda: view(*args, **kwargs),
+                should_store=lambda result: isinstance(result, str),
+                ttl=ttl
+            )
+        return wrapper
+    return decorator
+
+def conditional_get(version, max_age=None):
+    """
+    Answer repeat GETs with 304 Not Modified while the data is unchanged
+
+    version(**view_kwargs) returns (token, last_modified) - a cheap summary
+    of the rows behind the page - or (None, None) to skip validation. The
+    ETag also covers whether the visitor is logged in, since the navbar
+    differs. Anonymous responses are marked public so a reverse proxy may
+    keep them for max_age seconds; logged-in ones are private.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            token, last_modified = version(**kwargs)
+            if token is None:
+                return view(*args, **kwargs)
+
+            viewer = session.get('user_id', 'anonymous')
+            etag = hashlib.sha1(f"{request.path}:{token}:{viewer}".encode()).hexdigest()[:20]
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = (last_modified is not None and request.if_modified_since is not None
+                                and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None))
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            if 'user_id' in session:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            else:
+                response.cache_control.public = True
+                response.cache_control.max_age = 0
+                response.cache_control.s_maxage = max_age if max_age is not None else Config.VISITOR_CACHE_TTL
+            return response
+        return wrapper
+    return decorator
+
+# Public visitor pages and the data behind them (courses, batches, counts)
+visitor_cache = TTLCache('visitor', Config.VISITOR_CACHE_TTL)
+
+def invalidate_visitor_cache():
+    """Call after any write to courses or batches shown on the public pages"""
+    visitor_cache.invalidate()
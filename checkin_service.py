@@ -0,0 +1,140 @@
+from database import execute_query, Error
+from config import Config
+from metrics import register_collector, cache_entries, cache_requests_total
+from datetime import date
+import threading
+import time
+
+class EnrollmentWindowCache:
+    """
+    In-process map of (student_id, batch_id) -> (start_date, end_date)
+
+    Holds every active enrollment in an upcoming or ongoing batch so the
+    check-in route can turn away ineligible requests without touching the
+    database. The map is reloaded lazily after invalidate() or once it is
+    older than ttl seconds, so a drop made through another worker can linger
+    here that long; record_checkin's insert re-checks the enrollment itself.
+    Only one thread reloads at a time; the others wait for its result.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._windows = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self):
+        return self._windows is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def invalidate(self):
+        """Drop the map; the next lookup reloads it"""
+        with self._lock:
+            self._windows = None
+
+    def get(self, student_id, batch_id):
+        """Return (start_date, end_date) for an active enrollment, or None if not cached"""
+        if not self._fresh():
+            self._load()
+        window = (self._windows or {}).get((student_id, batch_id))
+        if window:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return window
+
+    def discard(self, student_id, batch_id):
+        """Forget a window the database no longer allows"""
+        with self._lock:
+            if self._windows is not None:
+                self._windows.pop((student_id, batch_id), None)
+
+    def add(self, student_id, batch_id, start_date, end_date):
+        """Record a window found by a direct lookup"""
+        with self._lock:
+            if self._windows is not None:
+                self._windows[(student_id, batch_id)] = (start_date, end_date)
+
+    def _load(self):
+        with self._lock:
+            if self._fresh():
+                return
+            rows = execute_query(
+                """SELECT e.student_id, e.batch_id, b.start_date, b.end_date
+                   FROM enrollments e
+                   JOIN batches b ON e.batch_id = b.batch_id
+                   WHERE e.status = 'active'
+                   AND b.status IN ('upcoming', 'ongoing')
+                   AND b.end_date >= CURDATE()""",
+                fetch=True
+            )
+            if rows is None:
+                return
+            self._windows = {
+                (row['student_id'], row['batch_id']): (row['start_date'], row['end_date'])
+                for row in rows
+            }
+            self._loaded_at = time.monotonic()
+
+enrollment_windows = EnrollmentWindowCache(Config.CHECKIN_CACHE_TTL)
+
+@register_collector
+def _collect_cache_metrics():
+    cache_entries.set(len(enrollment_windows._windows or {}), cache='enrollment_windows')
+    cache_requests_total.set(enrollment_windows.hits, cache='enrollment_windows', result='hit')
+    cache_requests_total.set(enrollment_windows.misses, cache='enrollment_windows', result='miss')
+
+def invalidate_enrollment_windows():
+    """Call after any change to enrollments or batch dates/status"""
+    enrollment_windows.invalidate()
+
+def _lookup_window(student_id, batch_id):
+    """Direct lookup for pairs missing from the map (e.g. enrolled via another worker)"""
+    row = execute_query(
+        """SELECT b.start_date, b.end_date FROM enrollments e
+           JOIN batches b ON e.batch_id = b.batch_id
+           WHERE e.student_id = %s AND e.batch_id = %s
+           AND e.status = 'active'
+           AND b.status IN ('upcoming', 'ongoing')""",
+        (student_id, batch_id),
+        fetch_one=True
+    )
+    if not row:
+        return None
+    enrollment_windows.add(student_id, batch_id, row['start_date'], row['end_date'])
+    return row['start_date'], row['end_date']
+
+def record_checkin(student_id, batch_id, today=None):
+    """
+    Check a student in for today's class
+
+    Returns:
+        'recorded' for a new check-in, 'duplicate' if already checked in
+        today, or 'ineligible' if the enrollment/batch window does not allow it
+    """
+    today = today or date.today()
+
+    window = enrollment_windows.get(student_id, batch_id) or _lookup_window(student_id, batch_id)
+    if not window or not window[1] or not (window[0] <= today <= window[1]):
+        return 'ineligible'
+
+    # Inserts only while the enrollment is still active (the cached window may
+    # predate a drop made through another worker); the unique_checkin key
+    # makes a repeat a no-op. Either way 0 rows are affected.
+    affected = execute_query(
+        """INSERT INTO student_checkins (student_id, batch_id, checkin_date)
+           SELECT e.student_id, e.batch_id, %s FROM enrollments e
+           WHERE e.student_id = %s AND e.batch_id = %s AND e.status = 'active'
+           ON DUPLICATE KEY UPDATE checkin_id = checkin_id""",
+        (today.isoformat(), student_id, batch_id),
+        commit=True
+    )
+    if affected is None:
+        raise Error("Check-in could not be recorded")
+    if affected:
+        return 'recorded'
+    if _lookup_window(student_id, batch_id) is None:
+        enrollment_windows.discard(student_id, batch_id)
+        return 'ineligible'
+    return 'duplicate'
@@ -14,6 +14,12 @@ class Config:
     DB_NAME = os.environ.get('DB_NAME', 'disha_computer')
     DB_PORT = int(os.environ.get('DB_PORT', '3306'))
     
+    # Connection pool: persistent connections, extra on-demand connections,
+    # and how long (seconds) a request waits for one before failing
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+    
     # Upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -28,6 +34,78 @@ class Config:
     # Pagination
     ITEMS_PER_PAGE = 10
     
+    # Seconds the in-memory check-in enrollment map is trusted before reloading
+    CHECKIN_CACHE_TTL = int(os.environ.get('CHECKIN_CACHE_TTL', '300'))
+    
+    # Seconds public visitor pages (home, course catalog/detail) stay cached
+    VISITOR_CACHE_TTL = int(os.environ.get('VISITOR_CACHE_TTL', '60'))
+    
+    # Seconds the in-memory student/batch typeahead indexes are kept before rebuilding
+    TYPEAHEAD_CACHE_TTL = int(os.environ.get('TYPEAHEAD_CACHE_TTL', '300'))
+    
+    # Seconds computed exam statistics are kept (they are also dropped when marks change)
+    EXAM_STATS_CACHE_TTL = int(os.environ.get('EXAM_STATS_CACHE_TTL', '600'))
+    
+    # Seconds student results snapshots are kept, and how many each worker holds
+    RESULTS_CACHE_TTL = int(os.environ.get('RESULTS_CACHE_TTL', '1800'))
+    RESULTS_CACHE_MAX_ENTRIES = int(os.environ.get('RESULTS_CACHE_MAX_ENTRIES', '5000'))
+    
+    # Exam grade bands: (minimum percentage, grade); a mark gets the highest band it reaches
+    GRADE_BANDS = ((90, 'A+'), (80, 'A'), (70, 'B+'), (60, 'B'), (50, 'C'), (0, 'F'))
+    
+    # Receipt numbers each worker reserves from receipt_sequences per round trip
+    RECEIPT_BLOCK_SIZE = int(os.environ.get('RECEIPT_BLOCK_SIZE', '20'))
+    
+    # Seconds before the materialized dashboard counters are recomputed from scratch
+    COUNTERS_RECONCILE_SECONDS = int(os.environ.get('COUNTERS_RECONCILE_SECONDS', '600'))
+    
+    # Opt-in query result cache (execute_query(..., cached=True)): on/off, default
+    # seconds per result and results kept per worker (least recently used go first)
+    QUERY_CACHE_ENABLED = os.environ.get('QUERY_CACHE_ENABLED', '1') == '1'
+    QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', '60'))
+    QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', '2000'))
+    
+    # Query instrumentation: per-request totals, Server-Timing header, slow-query
+    # log threshold (ms) and how many runs of one statement shape count as N+1
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', '1') == '1'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '10'))
+    # The footer lists every statement, so it is off by default and only ever shown to admins
+    QUERY_DEBUG_FOOTER = os.environ.get('QUERY_DEBUG_FOOTER', '0') == '1'
+    
+    # bcrypt cost for new hashes (older hashes are upgraded at login), and the
+    # process pool that runs bcrypt: worker count (0 = inline), how many more
+    # jobs may queue before requests get a 503, and seconds to wait for a result
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+    PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+    PASSWORD_QUEUE_DEPTH = int(os.environ.get('PASSWORD_QUEUE_DEPTH', '16'))
+    PASSWORD_TIMEOUT = float(os.environ.get('PASSWORD_TIMEOUT', '10'))
+    
+    # Rows per transaction (and per duplicate check) in bulk student imports
+    STUDENT_IMPORT_CHUNK_SIZE = int(os.environ.get('STUDENT_IMPORT_CHUNK_SIZE', '500'))
+    
+    # Historical attendance imports: writer threads (batches are spread over them)
+    # and rows per multi-row upsert
+    ATTENDANCE_IMPORT_WORKERS = int(os.environ.get('ATTENDANCE_IMPORT_WORKERS', '4'))
+    ATTENDANCE_IMPORT_CHUNK_SIZE = int(os.environ.get('ATTENDANCE_IMPORT_CHUNK_SIZE', '1000'))
+    
+    # Login throttling (token buckets checked before any bcrypt work): burst size
+    # and tokens regained per minute per client IP (charged for failures only) and
+    # per account (username and email share one); 'database' shares the account
+    # buckets across workers through the login_throttle table
+    LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', '20'))
+    LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', '10'))
+    LOGIN_USER_BURST = int(os.environ.get('LOGIN_USER_BURST', '5'))
+    LOGIN_USER_PER_MINUTE = float(os.environ.get('LOGIN_USER_PER_MINUTE', '2'))
+    LOGIN_THROTTLE_BACKEND = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')
+    
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto headers are
+    # trusted, so request.remote_addr is the real client (0 = none, direct access)
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', '0'))
+    
+    # Bearer token for scraping /metrics; empty means only admin sessions may view it
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    
     @staticmethod
     def init_app(app):
         """Initialize application"""
@@ -36,3 +114,4 @@ class Config:
         os.makedirs(os.path.join(Config.UPLOAD_FOLDER, 'materials'), exist_ok=True)
         os.makedirs(os.path.join(Config.UPLOAD_FOLDER, 'certificates'), exist_ok=True)
         os.makedirs(os.path.join(Config.UPLOAD_FOLDER, 'photos'), exist_ok=True)
+        os.makedirs(os.path.join(Config.UPLOAD_FOLDER, 'imports'), exist_ok=True)
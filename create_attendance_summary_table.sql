@@ -0,0 +1,30 @@
+-- Attendance rollup: per-(batch, student) status counts kept up to date by the
+-- attendance write paths so the attendance reports never scan the attendance table
+
+CREATE TABLE IF NOT EXISTS attendance_summary (
+    batch_id INT NOT NULL,
+    student_id INT NOT NULL,
+    total_classes INT NOT NULL DEFAULT 0,
+    present_count INT NOT NULL DEFAULT 0,
+    absent_count INT NOT NULL DEFAULT 0,
+    late_count INT NOT NULL DEFAULT 0,
+    excused_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (batch_id, student_id),
+    FOREIGN KEY (batch_id) REFERENCES batches(batch_id) ON DELETE CASCADE,
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    INDEX idx_student (student_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Backfill from existing attendance (re-run with: python rebuild_attendance_summary.py)
+DELETE FROM attendance_summary;
+INSERT INTO attendance_summary (batch_id, student_id, total_classes,
+    present_count, absent_count, late_count, excused_count)
+SELECT batch_id, student_id,
+       COUNT(*),
+       SUM(status = 'present'),
+       SUM(status = 'absent'),
+       SUM(status = 'late'),
+       SUM(status = 'excused')
+FROM attendance
+GROUP BY batch_id, student_id;
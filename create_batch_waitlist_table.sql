@@ -0,0 +1,14 @@
+-- FIFO waitlist for full batches. Students join it when enrollment finds no
+-- free seat and are enrolled automatically, oldest first, when a seat is
+-- freed by a cancellation or added by raising max_students.
+
+CREATE TABLE IF NOT EXISTS batch_waitlist (
+    waitlist_id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT NOT NULL,
+    batch_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    FOREIGN KEY (batch_id) REFERENCES batches(batch_id) ON DELETE CASCADE,
+    UNIQUE KEY unique_waitlist (student_id, batch_id),
+    INDEX idx_batch_queue (batch_id, waitlist_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,9 @@
+-- Materialized counters for the admin dashboard and reports pages. Rows are
+-- recomputed by the write routes and reconciled when older than
+-- COUNTERS_RECONCILE_SECONDS; an empty table is filled on first read.
+
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    counter_name VARCHAR(50) PRIMARY KEY,
+    counter_value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
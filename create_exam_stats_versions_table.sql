@@ -0,0 +1,10 @@
+-- Per-batch exam statistics version. Saving marks and creating exams bump
+-- it (marks in the same transaction as the results), and the cached exam
+-- statistics and batch trends are keyed on it, so every worker sees new
+-- marks on the next page view.
+
+CREATE TABLE IF NOT EXISTS exam_stats_versions (
+    batch_id INT PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (batch_id) REFERENCES batches(batch_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
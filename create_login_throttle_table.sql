@@ -0,0 +1,10 @@
+-- Shared login rate limit buckets, used only with LOGIN_THROTTLE_BACKEND=database
+-- so per-username limits hold across worker processes. Rows idle for a day
+-- are purged automatically.
+
+CREATE TABLE IF NOT EXISTS login_throttle (
+    bucket_key VARCHAR(191) PRIMARY KEY,
+    tokens DECIMAL(10, 4) NOT NULL,
+    updated_at DATETIME(6) NOT NULL,
+    INDEX idx_updated (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
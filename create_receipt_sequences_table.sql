@@ -0,0 +1,8 @@
+-- Per-year receipt counter. Each worker reserves a block of RECEIPT_BLOCK_SIZE
+-- numbers with one atomic upsert and hands them out from memory, giving
+-- receipts like RCP2026-000042. Rows are created on first use each year.
+
+CREATE TABLE IF NOT EXISTS receipt_sequences (
+    sequence_year SMALLINT PRIMARY KEY,
+    next_value BIGINT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,9 @@
+-- Per-student results version. save_exam_results bumps it in the same
+-- transaction as the marks, and the cached results page snapshots are keyed
+-- on it, so every worker sees new marks on the next page view.
+
+CREATE TABLE IF NOT EXISTS results_versions (
+    student_id INT PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
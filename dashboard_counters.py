@@ -0,0 +1,147 @@
+from database import execute_query
+from config import Config
+import threading
+
+# counter name -> (group, SQL expression producing its value)
+COUNTERS = {
+    'active_students': ('students', "SELECT COUNT(*) FROM students s JOIN users u ON s.user_id = u.user_id WHERE u.status = 'active'"),
+    'total_students': ('students', "SELECT COUNT(*) FROM students"),
+    'active_teachers': ('teachers', "SELECT COUNT(*) FROM teachers t JOIN users u ON t.user_id = u.user_id WHERE u.status = 'active'"),
+    'total_teachers': ('teachers', "SELECT COUNT(*) FROM teachers"),
+    'active_courses': ('courses', "SELECT COUNT(*) FROM courses WHERE status = 'active'"),
+    'ongoing_batches': ('batches', "SELECT COUNT(*) FROM batches WHERE status = 'ongoing'"),
+    'open_batches': ('batches', "SELECT COUNT(*) FROM batches WHERE status IN ('ongoing', 'upcoming')"),
+    'pending_fees': ('fees', "SELECT COALESCE(SUM(due_amount), 0) FROM fees WHERE payment_status IN ('pending', 'partial', 'overdue')"),
+    'total_fees': ('fees', "SELECT COALESCE(SUM(total_amount), 0) FROM fees"),
+    'collected_fees': ('fees', "SELECT COALESCE(SUM(paid_amount), 0) FROM fees"),
+    'due_fees': ('fees', "SELECT COALESCE(SUM(due_amount), 0) FROM fees"),
+}
+
+# Counters holding money; the rest are row counts
+AMOUNT_COUNTERS = ('pending_fees', 'total_fees', 'collected_fees', 'due_fees')
+
+# Reconciliation in progress in this worker: {'done': Event, 'values': dict}
+_refresh_flight = None
+_refresh_flight_lock = threading.Lock()
+
+def refresh_counters(*groups):
+    """
+    Recompute stored counters
+
+    Write routes call this after a successful change with the groups they
+    touched ('students', 'teachers', 'courses', 'batches', 'fees'); no
+    groups recomputes everything. The aggregates are read with a plain
+    SELECT (a non-locking consistent read) and the values written back as
+    literals; an INSERT ... SELECT would take shared locks on every row it
+    scans and hold up payments and registrations meanwhile.
+
+    Returns:
+        Dict of the recomputed counter values, or None on a database error
+    """
+    names = [name for name, (group, _) in COUNTERS.items() if not groups or group in groups]
+    if not names:
+        return None
+
+    fresh = execute_query(
+        "SELECT " + ", ".join(f"({COUNTERS[name][1]}) AS {name}" for name in names),
+        fetch_one=True
+    )
+    if fresh is None:
+        return None
+
+    written = execute_query(
+        f"""INSERT INTO dashboard_counters (counter_name, counter_value)
+            VALUES {", ".join(["(%s, %s)"] * len(names))}
+            ON DUPLICATE KEY UPDATE counter_value = VALUES(counter_value),
+                updated_at = CURRENT_TIMESTAMP""",
+        tuple(value for name in names for value in (name, fresh[name])),
+        commit=True
+    )
+    return None if written is None else {name: fresh[name] for name in names}
+
+def _reconcile(wait):
+    """
+    Run refresh_counters() in one thread per worker at a time
+
+    Callers arriving during a refresh get its values when wait is True
+    (single-flight), or None straight away when wait is False.
+    """
+    global _refresh_flight
+    with _refresh_flight_lock:
+        flight = _refresh_flight
+        leader = flight is None
+        if leader:
+            flight = _refresh_flight = {'done': threading.Event(), 'values': None}
+
+    if not leader:
+        if wait:
+            flight['done'].wait(timeout=30)
+            return flight['values']
+        return None
+
+    try:
+        flight['values'] = refresh_counters()
+    finally:
+        with _refresh_flight_lock:
+            _refresh_flight = None
+        flight['done'].set()
+    return flight['values']
+
+def adjust_counters(deltas):
+    """
+    Add deltas to stored counters, e.g. {'collected_fees': 500, 'due_fees': -500}
+
+    For hot write paths (registration, enrollment, payments) where a full
+    recompute would cost more than the write itself. Call it after the
+    write has committed so payments do not queue on the counter rows; any
+    drift is corrected by the next reconciliation (updated_at is left alone
+    so adjustments do not postpone it).
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return None
+
+    cases = " ".join("WHEN %s THEN %s" for _ in deltas)
+    params = [value for item in deltas.items() for value in item]
+    params.extend(deltas)
+    return execute_query(
+        f"""UPDATE dashboard_counters
+            SET counter_value = counter_value + CASE counter_name {cases} ELSE 0 END,
+                updated_at = updated_at
+            WHERE counter_name IN ({", ".join(["%s"] * len(deltas))})""",
+        tuple(params),
+        commit=True
+    )
+
+def get_counters():
+    """
+    Read every counter with one query
+
+    Counters older than Config.COUNTERS_RECONCILE_SECONDS (or missing) are
+    recomputed first, which catches writes made outside the hooked routes
+    (scripts, triggers, phpMyAdmin). Only one thread per worker reconciles;
+    the others use the stored values meanwhile, or wait for its result when
+    nothing is stored yet.
+
+    Returns:
+        Dict of counter name -> int (counts) or Decimal (amounts)
+    """
+    rows = execute_query(
+        """SELECT counter_name, counter_value,
+               TIMESTAMPDIFF(SECOND, updated_at, NOW()) as age
+           FROM dashboard_counters""",
+        fetch=True
+    ) or []
+
+    stale = len(rows) < len(COUNTERS) or any(row['age'] >= Config.COUNTERS_RECONCILE_SECONDS for row in rows)
+    if stale:
+        fresh = _reconcile(wait=not rows)
+        if fresh:
+            rows = [{'counter_name': name, 'counter_value': value} for name, value in fresh.items()]
+
+    counters = dict.fromkeys(COUNTERS, 0)
+    for row in rows:
+        if row['counter_name'] in counters:
+            value = row['counter_value']
+            counters[row['counter_name']] = value if row['counter_name'] in AMOUNT_COUNTERS else int(value)
+    return counters
@@ -1,7 +1,15 @@
 import mysql.connector
 from mysql.connector import Error, pooling
+from flask import g, has_app_context, has_request_context, request
+from contextlib import contextmanager
 from config import Config
+from query_stats import record_query
+from query_cache import query_cache, tables_written, MISSING
+import heapq
+import itertools
 import logging
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -10,14 +18,163 @@ logger = logging.getLogger(__name__)
 # Connection pool
 connection_pool = None
 
+# Connection state for code running outside a Flask app context (scripts, threads)
+_local = threading.local()
+
+# Checkout priorities - lower values are served first when the pool is exhausted
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+ENDPOINT_PRIORITIES = {
+    'student.checkin': PRIORITY_HIGH,
+    'student.pay_fee': PRIORITY_HIGH,
+    'admin.reports': PRIORITY_LOW,
+    'admin.attendance_reports': PRIORITY_LOW,
+    'admin.attendance_history': PRIORITY_LOW,
+    'teacher.attendance_reports': PRIORITY_LOW,
+}
+
+# Upper bounds (seconds) of the checkout wait-time histogram buckets
+WAIT_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class PoolExhaustedError(pooling.PoolError):
+    """Raised when no connection frees up within the checkout timeout"""
+
+class _PooledConnection:
+    """Connection proxy that gives its pool slot back when closed"""
+    
+    def __init__(self, connection, pool, overflow):
+        self._connection = connection
+        self._pool = pool
+        self.overflow = overflow
+    
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+    
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        try:
+            self._connection.close()
+        finally:
+            pool._release(self.overflow)
+
+class ConnectionPool:
+    """
+    MySQL connection pool with overflow, a prioritised wait queue and live gauges
+    
+    Up to pool_size connections are kept open and reused; when they are all in
+    use up to max_overflow extra connections are opened and closed again on
+    release. Beyond that, callers queue (highest priority first, then FIFO)
+    for up to timeout seconds before PoolExhaustedError is raised.
+    """
+    
+    def __init__(self, pool_size, max_overflow, timeout, **db_config):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._db_config = db_config
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name="disha_pool",
+            pool_size=pool_size,
+            pool_reset_session=True,
+            **db_config
+        )
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        
+        # Gauges and counters
+        self.in_use = 0
+        self.overflow_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_sum = 0.0
+        self.wait_time_counts = [0] * (len(WAIT_TIME_BUCKETS) + 1)
+    
+    def get_connection(self, priority=PRIORITY_NORMAL):
+        """Check out a connection, waiting in priority order while the pool is exhausted"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while (self._waiters[0] != ticket or
+                       self.in_use >= self.pool_size + self.max_overflow):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.checkout_failures += 1
+                        raise PoolExhaustedError(
+                            f"No connection available after {self.timeout}s "
+                            f"({self.in_use} in use, {len(self._waiters)} waiting)"
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+            
+            self.in_use += 1
+            self.checkouts += 1
+            self._observe_wait(time.monotonic() - started)
+        
+        try:
+            try:
+                return _PooledConnection(self._pool.get_connection(), self, overflow=False)
+            except pooling.PoolError:
+                connection = mysql.connector.connect(**self._db_config)
+                with self._condition:
+                    self.overflow_in_use += 1
+                return _PooledConnection(connection, self, overflow=True)
+        except Error:
+            with self._condition:
+                self.checkout_failures += 1
+            self._release(overflow=False)
+            raise
+    
+    def _release(self, overflow):
+        with self._condition:
+            self.in_use -= 1
+            if overflow:
+                self.overflow_in_use -= 1
+            self._condition.notify_all()
+    
+    def _observe_wait(self, seconds):
+        self.wait_time_sum += seconds
+        for index, bound in enumerate(WAIT_TIME_BUCKETS):
+            if seconds <= bound:
+                self.wait_time_counts[index] += 1
+                return
+        self.wait_time_counts[-1] += 1
+    
+    def stats(self):
+        """Snapshot of the pool gauges, with a cumulative wait-time histogram"""
+        with self._condition:
+            cumulative = list(itertools.accumulate(self.wait_time_counts))
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'in_use': self.in_use,
+                'overflow_in_use': self.overflow_in_use,
+                'waiting': len(self._waiters),
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'wait_time_sum': self.wait_time_sum,
+                'wait_time_buckets': list(zip(WAIT_TIME_BUCKETS + (float('inf'),), cumulative)),
+            }
+
 def init_connection_pool():
     """Initialize MySQL connection pool"""
     global connection_pool
     try:
-        connection_pool = pooling.MySQLConnectionPool(
-            pool_name="disha_pool",
-            pool_size=5,
-            pool_reset_session=True,
+        connection_pool = ConnectionPool(
+            pool_size=max(1, min(Config.DB_POOL_SIZE, pooling.CNX_POOL_MAXSIZE)),
+            max_overflow=max(0, Config.DB_POOL_MAX_OVERFLOW),
+            timeout=Config.DB_POOL_TIMEOUT,
             host=Config.DB_HOST,
             database=Config.DB_NAME,
             user=Config.DB_USER,
@@ -30,62 +187,224 @@ def init_connection_pool():
         logger.error(f"Error creating connection pool: {e}")
         return False
 
-def get_db_connection():
-    """Get a connection from the pool"""
+def _request_priority():
+    """Checkout priority for the current request's endpoint"""
+    if has_request_context():
+        return ENDPOINT_PRIORITIES.get(request.endpoint, PRIORITY_NORMAL)
+    return PRIORITY_NORMAL
+
+def get_db_connection(priority=None):
+    """
+    Get a connection from the pool
+    
+    Waits up to Config.DB_POOL_TIMEOUT when the pool is exhausted and raises
+    PoolExhaustedError if nothing frees up; other errors return None.
+    """
     global connection_pool
     try:
-        if connection_pool is None:
-            init_connection_pool()
-        connection = connection_pool.get_connection()
-        return connection
+        if connection_pool is None and not init_connection_pool():
+            return None
+        if priority is None:
+            priority = _request_priority()
+        return connection_pool.get_connection(priority)
+    except PoolExhaustedError as e:
+        logger.error(f"Connection pool exhausted: {e}")
+        raise
     except Error as e:
         logger.error(f"Error getting connection from pool: {e}")
         return None
 
-def execute_query(query, params=None, fetch=False, fetch_one=False, commit=False):
+def _db_state():
+    """Return the object holding connection state: Flask's g in an app context, else a thread-local"""
+    return g if has_app_context() else _local
+
+def _acquire_connection():
+    """
+    Get the connection the current unit of work should use
+    
+    Inside an app context the first call checks a connection out of the pool
+    and binds it to g, so every query of the request reuses it. Outside an app
+    context a bound connection only exists within transaction().
+    
+    Returns:
+        (connection, owned) - owned is True when the caller must close it
+    """
+    state = _db_state()
+    connection = getattr(state, 'db_connection', None)
+    if connection is not None:
+        return connection, False
+    
+    connection = get_db_connection()
+    if connection is not None and has_app_context():
+        g.db_connection = connection
+        return connection, False
+    return connection, True
+
+def _in_transaction():
+    """Whether a transaction() block is active for the current unit of work"""
+    return getattr(_db_state(), 'db_transaction_depth', 0) > 0
+
+def _note_write(query):
+    """
+    Invalidate cached results that read the tables a write statement touched
+    
+    Inside transaction() the tables are collected and invalidated once the
+    block commits, so a concurrent reader cannot re-cache pre-commit rows
+    under the new versions.
+    """
+    tables = tables_written(query)
+    if tables is None:
+        return
+    state = _db_state()
+    if getattr(state, 'db_transaction_depth', 0) > 0:
+        pending = getattr(state, 'db_written_tables', None)
+        if pending is None:
+            pending = state.db_written_tables = set()
+        pending.update(tables)
+    else:
+        query_cache.bump(tables)
+
+def close_request_connection(exception=None):
+    """Return the request-scoped connection to the pool (teardown handler)"""
+    connection = g.pop('db_connection', None)
+    g.pop('db_transaction_depth', None)
+    g.pop('db_written_tables', None)
+    if connection is None:
+        return
+    try:
+        connection.close()
+    except Error as e:
+        logger.error(f"Error returning connection to pool: {e}")
+
+@contextmanager
+def transaction():
+    """
+    Run several execute_query/execute_many calls as one unit of work
+    
+    Statements inside the block share one connection and are committed once
+    when the block exits; any exception rolls the whole block back and is
+    re-raised. Nested blocks join the outermost transaction. The outermost
+    block starts from a fresh snapshot, not the request's earlier reads.
+    
+    Usage:
+        with transaction():
+            user_id = execute_query("INSERT ...", params, commit=True)
+            execute_query("INSERT ...", (user_id,), commit=True)
+    """
+    state = _db_state()
+    depth = getattr(state, 'db_transaction_depth', 0)
+    if depth:
+        state.db_transaction_depth = depth + 1
+        try:
+            yield state.db_connection
+        finally:
+            state.db_transaction_depth -= 1
+        return
+    
+    connection, owned = _acquire_connection()
+    if connection is None:
+        raise Error("No database connection available")
+    if owned:
+        state.db_connection = connection
+    state.db_transaction_depth = 1
+    state.db_written_tables = None
+    try:
+        # End the REPEATABLE READ snapshot earlier reads of the request opened,
+        # so plain reads in the block see everything committed before it began
+        if connection.in_transaction:
+            connection.commit()
+        yield connection
+        connection.commit()
+        if state.db_written_tables:
+            query_cache.bump(state.db_written_tables)
+    except Exception:
+        try:
+            connection.rollback()
+        except Error as e:
+            logger.error(f"Rollback failed: {e}")
+        raise
+    finally:
+        state.db_transaction_depth = 0
+        state.db_written_tables = None
+        if owned:
+            state.db_connection = None
+            connection.close()
+
+def execute_query(query, params=None, fetch=False, fetch_one=False, commit=False, cached=False, cache_ttl=None):
     """
     Execute a database query
     
+    Inside a request the query runs on the request-scoped connection. Inside a
+    transaction() block commit is deferred to the end of the block and errors
+    are re-raised so the block rolls back.
+    
     Args:
         query: SQL query string
         params: Query parameters (tuple)
         fetch: Whether to fetch results
         fetch_one: Fetch only one row
         commit: Whether to commit the transaction
+        cached: Serve this read from the shared query result cache; it is
+            dropped automatically when a write touches one of its tables
+            (ignored inside transaction() and for locking reads)
+        cache_ttl: Seconds to keep the cached result, default Config.QUERY_CACHE_TTL
     
     Returns:
         Query results or affected row count
     """
-    connection = get_db_connection()
+    in_transaction = _in_transaction()
+    cache_key = None
+    if cached and (fetch or fetch_one) and not commit and not in_transaction and Config.QUERY_CACHE_ENABLED:
+        cache_key, cache_versions, result = query_cache.lookup(query, params, fetch_one)
+        if result is not MISSING:
+            return result
+    
+    connection, owned = _acquire_connection()
     if not connection:
         return None
     
     cursor = None
     try:
+        if cache_key is not None and connection.in_transaction:
+            # The request connection reads from the REPEATABLE READ snapshot of
+            # its first SELECT, which may predate writes already counted in
+            # cache_versions; end it so the rows cached are at least that new
+            connection.commit()
         cursor = connection.cursor(dictionary=True)
+        started = time.perf_counter()
         cursor.execute(query, params or ())
         
         if fetch_one:
             result = cursor.fetchone()
+            rows = 1 if result else 0
         elif fetch:
             result = cursor.fetchall()
+            rows = len(result)
         else:
-            result = cursor.rowcount
+            result = rows = cursor.rowcount
+        record_query(query, params, time.perf_counter() - started, rows)
             
         if commit:
-            connection.commit()
+            if not in_transaction:
+                connection.commit()
             result = cursor.lastrowid if cursor.lastrowid else cursor.rowcount
+        
+        if cache_key is not None:
+            query_cache.store(cache_key, cache_versions, result, cache_ttl or Config.QUERY_CACHE_TTL)
+        else:
+            _note_write(query)
             
         return result
     except Error as e:
         logger.error(f"Database error: {e}")
-        if connection:
-            connection.rollback()
+        if in_transaction:
+            raise
+        connection.rollback()
         return None
     finally:
         if cursor:
             cursor.close()
-        if connection:
+        if owned:
             connection.close()
 
 def execute_many(query, data_list):
@@ -99,25 +418,87 @@ def execute_many(query, data_list):
     Returns:
         Number of affected rows
     """
-    connection = get_db_connection()
+    connection, owned = _acquire_connection()
     if not connection:
         return 0
     
+    in_transaction = _in_transaction()
     cursor = None
     try:
         cursor = connection.cursor()
+        started = time.perf_counter()
         cursor.executemany(query, data_list)
-        connection.commit()
+        record_query(query, None, time.perf_counter() - started, cursor.rowcount)
+        if not in_transaction:
+            connection.commit()
+        _note_write(query)
         return cursor.rowcount
     except Error as e:
         logger.error(f"Database error in executemany: {e}")
-        if connection:
-            connection.rollback()
+        if in_transaction:
+            raise
+        connection.rollback()
         return 0
     finally:
         if cursor:
             cursor.close()
-        if connection:
+        if owned:
+            connection.close()
+
+def iter_query(query, params=None, batch_size=1000, row_type='dict'):
+    """
+    Stream the rows of a query instead of loading them all
+    
+    Rows are read with an unbuffered cursor, batch_size at a time, on a
+    connection of their own (a streaming cursor would block every other
+    query on the request's connection). The connection goes back to the pool
+    when the generator is exhausted or closed, e.g. when the consumer stops
+    early or a streamed response is aborted. Runs outside any transaction()
+    block, so it does not see that block's uncommitted writes. Database
+    errors, including one part way through the rows, are raised.
+    
+    Args:
+        query: SQL query string
+        params: Query parameters (tuple)
+        batch_size: Rows fetched from the server per round trip
+        row_type: 'dict', 'tuple' or 'namedtuple'
+    
+    Yields:
+        One row at a time in the requested shape
+    """
+    connection = get_db_connection(PRIORITY_LOW)
+    if not connection:
+        raise Error("No database connection available")
+    
+    cursor = None
+    rows = 0
+    started = time.perf_counter()
+    try:
+        cursor = connection.cursor(buffered=False,
+                                   dictionary=row_type == 'dict',
+                                   named_tuple=row_type == 'namedtuple')
+        cursor.execute(query, params or ())
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            rows += len(batch)
+            yield from batch
+    except Error as e:
+        # Re-raised so a consumer cannot mistake a broken stream for the last row
+        logger.error(f"Database error in iter_query after {rows} rows: {e}")
+        raise
+    finally:
+        record_query(query, params, time.perf_counter() - started, rows)
+        try:
+            # Rows left unread (consumer stopped early) must be drained
+            # before the connection can be reset and reused
+            if cursor:
+                connection.consume_results()
+                cursor.close()
+        except Error as e:
+            logger.error(f"Error releasing streaming cursor: {e}")
+        finally:
             connection.close()
 
 def test_connection():
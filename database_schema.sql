@@ -3,6 +3,12 @@
 -- Database: disha_computer
 
 -- Drop tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS login_throttle;
+DROP TABLE IF EXISTS exam_stats_versions;
+DROP TABLE IF EXISTS results_versions;
+DROP TABLE IF EXISTS receipt_sequences;
+DROP TABLE IF EXISTS batch_waitlist;
+DROP TABLE IF EXISTS dashboard_counters;
 DROP TABLE IF EXISTS feedback;
 DROP TABLE IF EXISTS learning_materials;
 DROP TABLE IF EXISTS fee_transactions;
@@ -12,6 +18,7 @@ DROP TABLE IF EXISTS exam_results;
 DROP TABLE IF EXISTS exams;
 DROP TABLE IF EXISTS student_checkins;
 DROP TABLE IF EXISTS teacher_attendance;
+DROP TABLE IF EXISTS attendance_summary;
 DROP TABLE IF EXISTS attendance;
 DROP TABLE IF EXISTS enrollments;
 DROP TABLE IF EXISTS batches;
@@ -33,7 +40,9 @@ CREATE TABLE users (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_email (email),
     INDEX idx_username (username),
-    INDEX idx_role (role)
+    INDEX idx_role (role),
+    INDEX idx_created (created_at),
+    INDEX idx_full_name (full_name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Students table (extended info for students)
@@ -52,7 +61,8 @@ CREATE TABLE students (
     photo_path VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-    INDEX idx_enrollment (enrollment_no)
+    INDEX idx_enrollment (enrollment_no),
+    INDEX idx_admission (admission_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Teachers table (extended info for teachers)
@@ -69,7 +79,8 @@ CREATE TABLE teachers (
     photo_path VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-    INDEX idx_employee (employee_id)
+    INDEX idx_employee (employee_id),
+    INDEX idx_joining (joining_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Courses table
@@ -88,7 +99,10 @@ CREATE TABLE courses (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_course_code (course_code),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_updated (updated_at),
+    INDEX idx_created (created_at),
+    INDEX idx_course_name (course_name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Batches table
@@ -106,10 +120,14 @@ CREATE TABLE batches (
     status ENUM('upcoming', 'ongoing', 'completed') DEFAULT 'upcoming',
     classroom VARCHAR(50),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
     FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id) ON DELETE SET NULL,
     INDEX idx_status (status),
-    INDEX idx_course (course_id)
+    INDEX idx_course (course_id),
+    INDEX idx_course_updated (course_id, updated_at),
+    INDEX idx_start_date (start_date),
+    INDEX idx_batch_name (batch_name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Enrollments table
@@ -148,6 +166,23 @@ CREATE TABLE attendance (
     FOREIGN KEY (marked_by) REFERENCES users(user_id) ON DELETE CASCADE,
     UNIQUE KEY unique_attendance (batch_id, student_id, attendance_date),
     INDEX idx_date (attendance_date),
+    INDEX idx_batch_date (batch_id, attendance_date),
+    INDEX idx_student_date (student_id, attendance_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Attendance Summary table (per batch/student rollup maintained by the attendance write paths)
+CREATE TABLE attendance_summary (
+    batch_id INT NOT NULL,
+    student_id INT NOT NULL,
+    total_classes INT NOT NULL DEFAULT 0,
+    present_count INT NOT NULL DEFAULT 0,
+    absent_count INT NOT NULL DEFAULT 0,
+    late_count INT NOT NULL DEFAULT 0,
+    excused_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (batch_id, student_id),
+    FOREIGN KEY (batch_id) REFERENCES batches(batch_id) ON DELETE CASCADE,
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
     INDEX idx_student (student_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -221,6 +256,20 @@ CREATE TABLE exam_results (
     INDEX idx_student (student_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Results Versions table (bumped with every marks save; keys the cached results pages)
+CREATE TABLE results_versions (
+    student_id INT PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Exam Stats Versions table (bumped with every marks save or new exam; keys the cached exam statistics)
+CREATE TABLE exam_stats_versions (
+    batch_id INT PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (batch_id) REFERENCES batches(batch_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Certificates table
 CREATE TABLE certificates (
     certificate_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -277,6 +326,12 @@ CREATE TABLE fee_transactions (
     INDEX idx_date (payment_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Receipt Sequences table (per-year counter that workers reserve receipt numbers from)
+CREATE TABLE receipt_sequences (
+    sequence_year SMALLINT PRIMARY KEY,
+    next_value BIGINT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Learning Materials table
 CREATE TABLE learning_materials (
     material_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -316,6 +371,33 @@ CREATE TABLE feedback (
     INDEX idx_course (course_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Batch Waitlist table (FIFO queue for full batches)
+CREATE TABLE batch_waitlist (
+    waitlist_id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT NOT NULL,
+    batch_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    FOREIGN KEY (batch_id) REFERENCES batches(batch_id) ON DELETE CASCADE,
+    UNIQUE KEY unique_waitlist (student_id, batch_id),
+    INDEX idx_batch_queue (batch_id, waitlist_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Login Throttle table (shared rate limit buckets, LOGIN_THROTTLE_BACKEND=database)
+CREATE TABLE login_throttle (
+    bucket_key VARCHAR(191) PRIMARY KEY,
+    tokens DECIMAL(10, 4) NOT NULL,
+    updated_at DATETIME(6) NOT NULL,
+    INDEX idx_updated (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Dashboard Counters table (materialized admin dashboard/report figures)
+CREATE TABLE dashboard_counters (
+    counter_name VARCHAR(50) PRIMARY KEY,
+    counter_value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Insert default admin user
 -- Password: admin123 (hashed using bcrypt)
 INSERT INTO users (username, email, password_hash, role, full_name, status) 
@@ -0,0 +1,210 @@
+from database import execute_query, transaction, Error
+from dashboard_counters import adjust_counters
+from checkin_service import invalidate_enrollment_windows
+from cache import invalidate_visitor_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Claims one seat only while capacity remains; the row lock it takes also
+# serialises concurrent claims, cancellations and promotions for the batch
+_CLAIM_SEAT = """UPDATE batches SET current_students = current_students + 1
+                 WHERE batch_id = %s AND status IN ('upcoming', 'ongoing')
+                 AND current_students < max_students"""
+
+def _create_enrollment(student_id, batch):
+    """Insert the enrollment and its fee record (call inside the seat's transaction)"""
+    execute_query(
+        """INSERT INTO enrollments (student_id, batch_id, enrollment_date, status)
+           VALUES (%s, %s, CURDATE(), 'active')""",
+        (student_id, batch['batch_id']),
+        commit=True
+    )
+    execute_query(
+        """INSERT INTO fees (student_id, course_id, total_amount, due_amount, payment_status)
+           VALUES (%s, %s, %s, %s, 'pending')""",
+        (student_id, batch['course_id'], batch['fees'], batch['fees']),
+        commit=True
+    )
+
+def _after_enrollments(fees):
+    """Refresh caches and counters once enrollments have committed"""
+    invalidate_enrollment_windows()
+    invalidate_visitor_cache()
+    if fees:
+        adjust_counters({'total_fees': fees, 'due_fees': fees, 'pending_fees': fees})
+
+def _batch(batch_id):
+    return execute_query(
+        """SELECT b.batch_id, b.course_id, b.status, c.fees FROM batches b
+           JOIN courses c ON b.course_id = c.course_id
+           WHERE b.batch_id = %s""",
+        (batch_id,),
+        fetch_one=True
+    )
+
+def enroll_student(student_id, batch_id):
+    """
+    Reserve a seat and enroll, or join the batch's waitlist when it is full
+
+    The seat claim, enrollment and fee record commit together, so a failed
+    insert gives the seat back and a full batch can never be oversold.
+
+    Returns:
+        'enrolled', 'waitlisted', 'duplicate' (already enrolled or waiting)
+        or 'unavailable' (no such batch, or not open for enrollment)
+    """
+    existing = execute_query(
+        """SELECT 1 FROM enrollments WHERE student_id = %s AND batch_id = %s
+           UNION ALL
+           SELECT 1 FROM batch_waitlist WHERE student_id = %s AND batch_id = %s
+           LIMIT 1""",
+        (student_id, batch_id, student_id, batch_id),
+        fetch_one=True
+    )
+    if existing:
+        return 'duplicate'
+
+    batch = _batch(batch_id)
+    if not batch or batch['status'] not in ('upcoming', 'ongoing'):
+        return 'unavailable'
+
+    try:
+        with transaction():
+            claimed = execute_query(_CLAIM_SEAT, (batch_id,))
+            if claimed:
+                _create_enrollment(student_id, batch)
+            else:
+                # unique_waitlist makes a double submit a no-op
+                execute_query(
+                    """INSERT INTO batch_waitlist (student_id, batch_id)
+                       VALUES (%s, %s)
+                       ON DUPLICATE KEY UPDATE waitlist_id = waitlist_id""",
+                    (student_id, batch_id)
+                )
+    except Error as e:
+        # A concurrent submit by the same student trips unique_enrollment
+        if getattr(e, 'errno', None) == 1062:
+            return 'duplicate'
+        raise
+
+    if not claimed:
+        return 'waitlisted'
+    _after_enrollments(batch['fees'])
+    return 'enrolled'
+
+def waitlist_position(student_id, batch_id):
+    """1-based place in the batch's waitlist, or None if not waiting"""
+    row = execute_query(
+        """SELECT COUNT(*) as position FROM batch_waitlist w
+           JOIN batch_waitlist mine ON mine.batch_id = w.batch_id
+           WHERE mine.student_id = %s AND mine.batch_id = %s
+           AND w.waitlist_id <= mine.waitlist_id""",
+        (student_id, batch_id),
+        fetch_one=True
+    )
+    return row['position'] if row and row['position'] else None
+
+def leave_waitlist(student_id, batch_id):
+    """Remove a student from a waitlist; returns True if they were on it"""
+    return bool(execute_query(
+        "DELETE FROM batch_waitlist WHERE student_id = %s AND batch_id = %s",
+        (student_id, batch_id),
+        commit=True
+    ))
+
+def _promote(batch):
+    """
+    Move waitlisted students into free seats, oldest first
+
+    Must run inside a transaction; returns how many were enrolled. Each
+    promotion goes through the same conditional seat claim as a new
+    enrollment, so promotions can never overfill the batch either.
+    """
+    # Take the batch row before any waitlist rows, the order enroll_student uses
+    execute_query(
+        "SELECT batch_id FROM batches WHERE batch_id = %s FOR UPDATE",
+        (batch['batch_id'],),
+        fetch_one=True
+    )
+    promoted = 0
+    while True:
+        waiting = execute_query(
+            """SELECT waitlist_id, student_id FROM batch_waitlist
+               WHERE batch_id = %s
+               ORDER BY waitlist_id
+               LIMIT 1
+               FOR UPDATE""",
+            (batch['batch_id'],),
+            fetch_one=True
+        )
+        if not waiting or not execute_query(_CLAIM_SEAT, (batch['batch_id'],)):
+            return promoted
+
+        execute_query(
+            "DELETE FROM batch_waitlist WHERE waitlist_id = %s",
+            (waiting['waitlist_id'],)
+        )
+        already = execute_query(
+            "SELECT 1 FROM enrollments WHERE student_id = %s AND batch_id = %s",
+            (waiting['student_id'], batch['batch_id']),
+            fetch_one=True
+        )
+        if already:
+            # Enrolled some other way meanwhile; hand the seat to the next in line
+            execute_query(
+                "UPDATE batches SET current_students = current_students - 1 WHERE batch_id = %s",
+                (batch['batch_id'],)
+            )
+            continue
+
+        _create_enrollment(waiting['student_id'], batch)
+        logger.info(f"Promoted student {waiting['student_id']} from the waitlist of batch {batch['batch_id']}")
+        promoted += 1
+
+def promote_waitlist(batch_id):
+    """
+    Fill any free seats in a batch from its waitlist
+
+    Call after capacity is added (e.g. max_students raised). Returns the
+    number of students enrolled.
+    """
+    batch = _batch(batch_id)
+    if not batch or batch['status'] not in ('upcoming', 'ongoing'):
+        return 0
+
+    with transaction():
+        promoted = _promote(batch)
+    if promoted:
+        _after_enrollments(batch['fees'] * promoted)
+    return promoted
+
+def drop_enrollment(enrollment_id, batch_id):
+    """
+    Drop an active enrollment and give its seat to the next waitlisted student
+
+    The seat is released and re-claimed in one transaction, so a waitlisted
+    student gets it before any new enrollment can.
+
+    Returns:
+        True if the enrollment was cancelled, False if it was no longer active
+    """
+    batch = _batch(batch_id)
+    promoted = 0
+    with transaction():
+        dropped = execute_query(
+            "UPDATE enrollments SET status = 'dropped' WHERE enrollment_id = %s AND status = 'active'",
+            (enrollment_id,)
+        )
+        if dropped:
+            execute_query(
+                "UPDATE batches SET current_students = GREATEST(current_students - 1, 0) WHERE batch_id = %s",
+                (batch_id,)
+            )
+            if batch and batch['status'] in ('upcoming', 'ongoing'):
+                promoted = _promote(batch)
+
+    if not dropped:
+        return False
+    _after_enrollments(batch['fees'] * promoted if promoted else 0)
+    return True
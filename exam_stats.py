@@ -0,0 +1,163 @@
+from database import execute_query
+from cache import TTLCache
+from config import Config
+import statistics
+
+# Per-exam statistics ("exam:<id>:<version>") and per-batch trends
+# ("batch:<id>:<version>"). The version is the batch's row in
+# exam_stats_versions, bumped by invalidate_exam_stats() whenever marks are
+# written, so every worker stops serving the old figures on the next view.
+exam_stats_cache = TTLCache('exam_stats', Config.EXAM_STATS_CACHE_TTL, max_entries=512)
+
+PERCENTILES = (25, 50, 75, 90)
+HISTOGRAM_BUCKETS = 10
+
+def _summarize(exam, rows):
+    """
+    Statistics for one exam from its (student_id, marks_obtained) rows
+
+    Marks are pulled into one column up front and every figure is computed
+    over that column; ranks use competition ranking (1, 2, 2, 4).
+    """
+    total_marks = exam['total_marks']
+    marks = [row['marks_obtained'] for row in rows]
+    count = len(marks)
+    summary = {
+        'exam_id': exam['exam_id'],
+        'exam_name': exam['exam_name'],
+        'exam_date': exam['exam_date'],
+        'total_marks': total_marks,
+        'passing_marks': exam['passing_marks'],
+        'count': count,
+        'mean': None, 'median': None, 'stdev': None,
+        'min': None, 'max': None,
+        'mean_percentage': None, 'pass_rate': None,
+        'percentiles': {},
+        'histogram': [0] * HISTOGRAM_BUCKETS,
+        'ranks': {},
+    }
+    if not count:
+        return summary
+
+    ordered = sorted(marks)
+    mean = statistics.fmean(ordered)
+    summary.update(
+        mean=round(mean, 2),
+        median=statistics.median(ordered),
+        stdev=round(statistics.pstdev(ordered, mean), 2),
+        min=ordered[0],
+        max=ordered[-1],
+        mean_percentage=round(mean * 100 / total_marks, 2) if total_marks else None,
+        pass_rate=round(sum(1 for mark in ordered if mark >= exam['passing_marks']) * 100 / count, 2),
+    )
+
+    if count > 1:
+        cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+        summary['percentiles'] = {p: round(cuts[p - 1], 2) for p in PERCENTILES}
+    else:
+        summary['percentiles'] = {p: ordered[0] for p in PERCENTILES}
+
+    # Bucket i covers [i*10%, (i+1)*10%); full marks land in the top bucket
+    histogram = summary['histogram']
+    for mark in ordered:
+        bucket = mark * HISTOGRAM_BUCKETS // total_marks if total_marks else 0
+        histogram[min(bucket, HISTOGRAM_BUCKETS - 1)] += 1
+
+    # Rank = 1 + number of students with strictly higher marks
+    position = {}
+    for index, mark in enumerate(sorted(marks, reverse=True)):
+        position.setdefault(mark, index + 1)
+    summary['ranks'] = {row['student_id']: position[row['marks_obtained']] for row in rows}
+    return summary
+
+def _load_batch(batch_id):
+    """Every exam of a batch summarized from one query, oldest exam first"""
+    rows = execute_query(
+        """SELECT e.exam_id, e.exam_name, e.exam_date, e.total_marks, e.passing_marks,
+               er.student_id, er.marks_obtained
+           FROM exams e
+           LEFT JOIN exam_results er ON er.exam_id = e.exam_id
+           WHERE e.batch_id = %s
+           ORDER BY e.exam_date, e.exam_id""",
+        (batch_id,),
+        fetch=True
+    )
+    if rows is None:
+        return None
+
+    exams = {}
+    results = {}
+    for row in rows:
+        exams.setdefault(row['exam_id'], row)
+        if row['student_id'] is not None:
+            results.setdefault(row['exam_id'], []).append(row)
+
+    return [_summarize(exam, results.get(exam_id, [])) for exam_id, exam in exams.items()]
+
+def _load_exam(exam_id):
+    rows = execute_query(
+        """SELECT e.exam_id, e.exam_name, e.exam_date, e.total_marks, e.passing_marks,
+               er.student_id, er.marks_obtained
+           FROM exams e
+           LEFT JOIN exam_results er ON er.exam_id = e.exam_id
+           WHERE e.exam_id = %s""",
+        (exam_id,),
+        fetch=True
+    )
+    if not rows:
+        return None
+    return _summarize(rows[0], [row for row in rows if row['student_id'] is not None])
+
+def _version(query, key):
+    """Stats version (0 if never bumped); None on a database error"""
+    row = execute_query(query, (key,), fetch_one=True)
+    return row['version'] if row else None
+
+def _batch_version(batch_id):
+    return _version("SELECT COALESCE(MAX(version), 0) AS version FROM exam_stats_versions WHERE batch_id = %s",
+                    batch_id)
+
+def _exam_version(exam_id):
+    return _version(
+        """SELECT COALESCE(MAX(v.version), 0) AS version FROM exams e
+           LEFT JOIN exam_stats_versions v ON v.batch_id = e.batch_id
+           WHERE e.exam_id = %s""",
+        exam_id
+    )
+
+def exam_statistics(exam_id):
+    """
+    Distribution of one exam's marks
+
+    Returns:
+        Dict with count, mean, median, stdev, min, max, mean_percentage,
+        pass_rate, percentiles {25, 50, 75, 90}, histogram (10 buckets of
+        10% each) and ranks {student_id: rank}; None if the exam is missing
+    """
+    version = _exam_version(exam_id)
+    if version is None:
+        return _load_exam(exam_id)
+    return exam_stats_cache.get_or_set(f"exam:{exam_id}:{version}", lambda: _load_exam(exam_id),
+                                       should_store=lambda summary: summary is not None)
+
+def batch_trends(batch_id):
+    """Per-exam statistics for every exam of a batch, in exam date order"""
+    version = _batch_version(batch_id)
+    if version is None:
+        return _load_batch(batch_id) or []
+    return exam_stats_cache.get_or_set(f"batch:{batch_id}:{version}", lambda: _load_batch(batch_id),
+                                       should_store=lambda summaries: summaries is not None) or []
+
+def invalidate_exam_stats(batch_id):
+    """
+    Bump a batch's stats version; call after marks are written or exams change
+
+    Inside transaction() the bump commits with the marks. Returns None on a
+    database error outside a transaction.
+    """
+    return execute_query(
+        """INSERT INTO exam_stats_versions (batch_id, version) VALUES (%s, 1)
+           ON DUPLICATE KEY UPDATE version = version + 1""",
+        (batch_id,),
+        commit=True
+    )
@@ -0,0 +1,128 @@
+from database import execute_query, transaction
+from decimal import Decimal
+
+CENT = Decimal('0.01')
+
+# Live totals per fee from fee_transactions, for reconciliation
+_LIVE_FEE_QUERY = """
+    SELECT f.fee_id, f.student_id, f.total_amount, COALESCE(f.discount_amount, 0) as discount_amount,
+           f.paid_amount as stored_paid_amount, f.due_amount as stored_due_amount,
+           f.payment_status as stored_payment_status,
+           COALESCE(t.paid, 0) as paid_amount,
+           GREATEST(f.total_amount - COALESCE(f.discount_amount, 0) - COALESCE(t.paid, 0), 0) as due_amount
+    FROM fees f
+    LEFT JOIN (
+        SELECT fee_id, SUM(amount) as paid FROM fee_transactions GROUP BY fee_id
+    ) t ON t.fee_id = f.fee_id
+    {where}"""
+
+def payment_status(paid_amount, due_amount):
+    """Status implied by a fee's paid and due amounts"""
+    if due_amount <= 0:
+        return 'paid'
+    return 'partial' if paid_amount > 0 else 'pending'
+
+def settle_payment(fee_id, student_id, amount, payment_method, transaction_ref, receipt_no, received_by):
+    """
+    Record a payment and apply it to the fee in one locked transaction
+
+    The fee row is read FOR UPDATE, so concurrent payments on the same fee
+    queue behind each other and each one sees the amounts the previous one
+    left; the amount is re-checked against the due amount under that lock.
+    paid_amount and due_amount are adjusted by the payment with Decimal
+    arithmetic instead of re-summing fee_transactions.
+
+    Args:
+        amount: Decimal payment amount (rounded to paise)
+
+    Returns:
+        (before, after) dicts of paid_amount/due_amount/payment_status, or
+        None if the fee is not the student's or the amount exceeds what is due
+    """
+    amount = Decimal(amount).quantize(CENT)
+    with transaction():
+        fee = execute_query(
+            """SELECT paid_amount, due_amount, payment_status FROM fees
+               WHERE fee_id = %s AND student_id = %s
+               FOR UPDATE""",
+            (fee_id, student_id),
+            fetch_one=True
+        )
+        if not fee or amount <= 0 or amount > fee['due_amount']:
+            return None
+
+        execute_query(
+            """INSERT INTO fee_transactions (fee_id, amount, payment_date, payment_method,
+               transaction_ref, receipt_no, received_by)
+               VALUES (%s, %s, CURDATE(), %s, %s, %s, %s)""",
+            (fee_id, amount, payment_method, transaction_ref, receipt_no, received_by),
+            commit=True
+        )
+
+        paid = fee['paid_amount'] + amount
+        due = fee['due_amount'] - amount
+        settled = {'paid_amount': paid, 'due_amount': due, 'payment_status': payment_status(paid, due)}
+        execute_query(
+            """UPDATE fees SET paid_amount = %s, due_amount = %s, payment_status = %s
+               WHERE fee_id = %s""",
+            (paid, due, settled['payment_status'], fee_id),
+            commit=True
+        )
+
+    return fee, settled
+
+def verify_fees(fee_id=None):
+    """
+    Compare stored fee amounts with the totals of their fee_transactions
+
+    Returns:
+        List of dicts for every fee whose paid/due amounts or status differ,
+        with the live values and the stored ones (prefixed with "stored_"),
+        or None on a database error
+    """
+    where = "WHERE f.fee_id = %s" if fee_id else ""
+    rows = execute_query(
+        _LIVE_FEE_QUERY.format(where=where),
+        (fee_id,) if fee_id else None,
+        fetch=True
+    )
+    if rows is None:
+        return None
+
+    drift = []
+    for row in rows:
+        # 'overdue' is set by staff for unpaid fees and is not drift
+        status = payment_status(row['paid_amount'], row['due_amount'])
+        status_ok = row['stored_payment_status'] == status or (
+            row['stored_payment_status'] == 'overdue' and status != 'paid')
+        if (row['stored_paid_amount'] != row['paid_amount']
+                or row['stored_due_amount'] != row['due_amount'] or not status_ok):
+            row['payment_status'] = status
+            drift.append(row)
+    return drift
+
+def repair_fee(row):
+    """Overwrite one drifted fee (a row from verify_fees) with its live totals"""
+    with transaction():
+        execute_query(
+            "SELECT fee_id FROM fees WHERE fee_id = %s FOR UPDATE",
+            (row['fee_id'],),
+            fetch_one=True
+        )
+        # Re-read under the lock in case a payment landed since verify_fees
+        live = execute_query(
+            _LIVE_FEE_QUERY.format(where="WHERE f.fee_id = %s"),
+            (row['fee_id'],),
+            fetch_one=True
+        )
+        if not live:
+            return 0
+        status = payment_status(live['paid_amount'], live['due_amount'])
+        if live['stored_payment_status'] == 'overdue' and status != 'paid':
+            status = 'overdue'
+        return execute_query(
+            """UPDATE fees SET paid_amount = %s, due_amount = %s, payment_status = %s
+               WHERE fee_id = %s""",
+            (live['paid_amount'], live['due_amount'], status, row['fee_id']),
+            commit=True
+        )
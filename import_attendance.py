@@ -0,0 +1,59 @@
+import argparse
+import csv
+from database import execute_query
+from attendance_import_service import read_rows, import_attendance, AttendanceImportError, MAX_REPORTED_ERRORS
+
+def main():
+    parser = argparse.ArgumentParser(description="Load historical student attendance from a long-format CSV "
+                                                 "(columns: batch, enrollment_no, date, status[, remarks])")
+    parser.add_argument('file', help="attendance CSV; batch is a batch id or name, date is YYYY-MM-DD or DD/MM/YYYY")
+    parser.add_argument('--marked-by', type=int, help="user_id recorded as the marker (default: the first admin)")
+    parser.add_argument('--workers', type=int, help="parallel writer threads (default ATTENDANCE_IMPORT_WORKERS)")
+    parser.add_argument('--chunk-size', type=int, help="rows per upsert (default ATTENDANCE_IMPORT_CHUNK_SIZE)")
+    parser.add_argument('--errors', help="write the rows that were not imported to this CSV file")
+    args = parser.parse_args()
+    
+    marked_by = args.marked_by
+    if not marked_by:
+        admin = execute_query("SELECT user_id FROM users WHERE role = 'admin' ORDER BY user_id LIMIT 1", fetch_one=True)
+        if not admin:
+            print("✗ No admin user found - pass --marked-by USER_ID.")
+            return 1
+        marked_by = admin['user_id']
+    
+    def progress(report):
+        print(f"  {report.processed} rows read, {report.written} written, {report.error_count} error(s) "
+              f"- {report.rows_per_second} rows/s")
+    
+    try:
+        report = import_attendance(read_rows(args.file), marked_by, workers=args.workers,
+                                   chunk_size=args.chunk_size, progress=progress)
+    except (AttendanceImportError, OSError) as e:
+        print(f"✗ {e}")
+        return 1
+    
+    print(f"✓ Wrote {report.written} of {report.processed} row(s) for {len(report.batches)} batch(es) "
+          f"in {report.elapsed:.1f}s ({report.rows_per_second} rows/s).")
+    if not report.error_count:
+        return 0
+    
+    skipped = report.processed - report.written
+    
+    errors = sorted(report.errors, key=lambda error: error['line'] or 0)
+    if args.errors:
+        with open(args.errors, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Line', 'Error'])
+            for error in errors:
+                writer.writerow([error['line'] or '', error['message']])
+        print(f"✗ {skipped} row(s) not imported - see {args.errors}")
+    else:
+        print(f"✗ {skipped} row(s) not imported:")
+        for error in errors:
+            print(f"  line {error['line'] or '-'}: {error['message']}")
+    if report.error_count > MAX_REPORTED_ERRORS:
+        print(f"  (only the first {MAX_REPORTED_ERRORS} errors are listed)")
+    return 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
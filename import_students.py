@@ -0,0 +1,41 @@
+import argparse
+import csv
+from student_import_service import read_rows, count_rows, import_students, ImportFileError
+
+def main():
+    parser = argparse.ArgumentParser(description="Create student accounts in bulk from a CSV or XLSX file")
+    parser.add_argument('file', help="students file; first row holds the column names")
+    parser.add_argument('--errors', help="write the rows that were not imported to this CSV file")
+    args = parser.parse_args()
+    
+    expected = count_rows(args.file)
+    
+    def progress(report):
+        total = f"/{expected}" if expected else ""
+        print(f"  {report.processed}{total} rows read, {report.imported} imported, {len(report.errors)} error(s)")
+    
+    try:
+        report = import_students(read_rows(args.file), progress=progress)
+    except (ImportFileError, OSError) as e:
+        print(f"✗ {e}")
+        return 1
+    
+    print(f"✓ Imported {report.imported} of {report.processed} student(s).")
+    if not report.errors:
+        return 0
+    
+    if args.errors:
+        with open(args.errors, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Line', 'Username', 'Error'])
+            for error in sorted(report.errors, key=lambda error: error['line']):
+                writer.writerow([error['line'], error['username'], error['message']])
+        print(f"✗ {len(report.errors)} row(s) not imported - see {args.errors}")
+    else:
+        print(f"✗ {len(report.errors)} row(s) not imported:")
+        for error in sorted(report.errors, key=lambda error: error['line']):
+            print(f"  line {error['line']} ({error['username']}): {error['message']}")
+    return 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
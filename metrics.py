@@ -0,0 +1,294 @@
+from flask import Blueprint, Response, g, request, session, abort, template_rendered, before_render_template
+from config import Config
+import hmac
+import threading
+import time
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Default histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in items]
+
+class Counter(_Metric):
+    """Monotonic counter"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Mirror a running total kept elsewhere (used by collectors)"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket bounds"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][index] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def set_cumulative(self, buckets, total, **labels):
+        """Mirror a histogram kept elsewhere from (bound, cumulative count) pairs ending at +Inf"""
+        finite = [(bound, count) for bound, count in buckets if bound != float('inf')]
+        counts = [count - previous for (_, count), previous in zip(finite, [0] + [count for _, count in finite])]
+        with self._lock:
+            self.buckets = tuple(bound for bound, _ in finite)
+            self._values[self._key(labels)] = {'counts': counts, 'sum': total, 'count': buckets[-1][1]}
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, dict(entry, counts=list(entry['counts'])))
+                           for key, entry in self._values.items())
+        lines = []
+        bucket_labels = self.label_names + ('le',)
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['counts']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(float(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + ('+Inf',))} {entry['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(entry['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {entry['count']}")
+        return lines
+
+class Registry:
+    """
+    Metrics of one process
+
+    Collectors are callables run at scrape time to refresh gauges that
+    mirror state held elsewhere (the connection pool, caches). With several
+    worker processes each worker serves its own numbers.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        for collector in list(self._collectors):
+            collector()
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+register_collector = registry.register_collector
+
+# HTTP
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests by blueprint, endpoint, method and status',
+    ('blueprint', 'endpoint', 'method', 'status'))
+http_request_duration_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by blueprint and endpoint',
+    ('blueprint', 'endpoint'))
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled')
+
+# Database
+db_queries_total = registry.counter(
+    'db_queries_total', 'Queries executed while handling requests', ('blueprint',))
+db_query_duration_seconds = registry.histogram(
+    'db_query_duration_seconds', 'Database time per request', ('blueprint',))
+db_pool_connections = registry.gauge(
+    'db_pool_connections', 'Connection pool state', ('state',))
+db_pool_checkouts_total = registry.counter(
+    'db_pool_checkouts_total', 'Connections handed out by the pool since start')
+db_pool_checkout_failures_total = registry.counter(
+    'db_pool_checkout_failures_total', 'Checkouts that timed out waiting for a connection')
+# Buckets come from the pool's own histogram (database.WAIT_TIME_BUCKETS)
+db_pool_wait_seconds = registry.histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled connection', buckets=())
+
+# Templates
+template_render_duration_seconds = registry.histogram(
+    'template_render_duration_seconds', 'Template render time', ('template',))
+
+# Caches
+cache_entries = registry.gauge('cache_entries', 'Entries held by an in-process cache', ('cache',))
+cache_requests_total = registry.counter('cache_requests_total', 'Cache lookups by result', ('cache', 'result'))
+
+# Login throttling
+login_attempts_total = registry.counter(
+    'login_attempts_total', 'Login attempts by outcome (success, failure, throttled)', ('result',))
+login_lockouts_total = registry.counter(
+    'login_lockouts_total', 'Login attempts refused because a rate limit bucket was empty', ('scope',))
+rate_limit_keys = registry.gauge('rate_limit_keys', 'Keys tracked by an in-process rate limiter', ('limiter',))
+
+@register_collector
+def _collect_pool():
+    import database
+    if database.connection_pool is None:
+        return
+    stats = database.connection_pool.stats()
+    db_pool_connections.set(stats['pool_size'], state='size')
+    db_pool_connections.set(stats['max_overflow'], state='max_overflow')
+    db_pool_connections.set(stats['in_use'], state='in_use')
+    db_pool_connections.set(stats['overflow_in_use'], state='overflow_in_use')
+    db_pool_connections.set(stats['waiting'], state='waiting')
+    db_pool_checkouts_total.set(stats['checkouts'])
+    db_pool_checkout_failures_total.set(stats['checkout_failures'])
+    db_pool_wait_seconds.set_cumulative(stats['wait_time_buckets'], stats['wait_time_sum'])
+
+def _labels():
+    return request.blueprint or 'app', request.endpoint or 'unmatched'
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    http_requests_in_flight.inc()
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    http_requests_in_flight.dec()
+
+    blueprint, endpoint = _labels()
+    http_request_duration_seconds.observe(time.perf_counter() - started,
+                                          blueprint=blueprint, endpoint=endpoint)
+    http_requests_total.inc(blueprint=blueprint, endpoint=endpoint,
+                            method=request.method, status=response.status_code)
+
+    stats = g.get('query_stats')
+    if stats is not None:
+        db_queries_total.inc(stats['count'], blueprint=blueprint)
+        db_query_duration_seconds.observe(stats['total_ms'] / 1000, blueprint=blueprint)
+    return response
+
+def _abandon_request(exception=None):
+    # after_request is skipped for unhandled exceptions; keep in-flight honest
+    if g.pop('metrics_started', None) is not None:
+        http_requests_in_flight.dec()
+        blueprint, endpoint = _labels()
+        http_requests_total.inc(blueprint=blueprint, endpoint=endpoint,
+                                method=request.method, status=500)
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+def _template_finished(sender, template, context, **extra):
+    starts = g.get('metrics_templates')
+    if starts:
+        template_render_duration_seconds.observe(time.perf_counter() - starts.pop(),
+                                                 template=template.name or 'string')
+
+def _authorized():
+    if session.get('role') == 'admin':
+        return True
+    token = Config.METRICS_TOKEN
+    if not token:
+        return False
+    # Header only: a token in the query string would end up in access logs
+    supplied = request.headers.get('Authorization', '')
+    if not supplied.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(supplied[len('Bearer '):].encode(), token.encode())
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (admin session or METRICS_TOKEN)"""
+    if not _authorized():
+        abort(404)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def init_app(app):
+    """Register request/template hooks and the /metrics endpoint"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_abandon_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.register_blueprint(metrics_bp)
@@ -0,0 +1,150 @@
+from database import execute_query
+from config import Config
+import math
+
+# Unfiltered listings of tables bigger than this use the InnoDB row estimate
+# instead of COUNT(*); filtered counts stop at COUNT_CAP matching rows
+ESTIMATE_THRESHOLD = 10000
+COUNT_CAP = 10000
+MAX_PER_PAGE = 100
+
+class Page:
+    """One page of a listing plus what the templates need to link to others"""
+
+    def __init__(self, items, page, per_page, total, estimated, sort, order, args):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.estimated = estimated
+        self.sort = sort
+        self.order = order
+        self._args = args
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages or (self.estimated and len(self.items) == self.per_page)
+
+    def args(self, **overrides):
+        """Current query string values (filters, sort, page) with overrides, for url_for"""
+        args = dict(self._args, **overrides)
+        return {key: value for key, value in args.items() if value not in (None, '')}
+
+    def sort_args(self, key):
+        """Query string for sorting by key, toggling the order if it is already the sort"""
+        order = 'desc' if self.sort == key and self.order == 'asc' else 'asc'
+        return self.args(sort=key, order=order, page=None)
+
+    def page_numbers(self, window=2):
+        """Page numbers around the current one, with None marking gaps"""
+        last = self.pages
+        shown = sorted({1, last, *range(max(1, self.page - window), min(last, self.page + window) + 1)})
+        numbers = []
+        for number in shown:
+            if numbers and number - numbers[-1] > 1:
+                numbers.append(None)
+            numbers.append(number)
+        return numbers
+
+class Listing:
+    """
+    A paginated, sortable, filterable admin listing
+
+    Args:
+        select: SELECT list
+        from_clause: FROM/JOIN clause
+        sort_columns: Dict of sort key -> SQL column (keep these indexed)
+        default_sort: (sort key, 'asc' or 'desc')
+        tiebreak: Unique column appended to ORDER BY so pages do not overlap
+        search_columns: Columns matched by the free-text "q" filter
+        filters: Dict of query string name -> SQL column for exact-match filters
+        count_table: Table whose row estimate stands in for an unfiltered COUNT(*)
+    """
+
+    def __init__(self, select, from_clause, sort_columns, default_sort, tiebreak,
+                 search_columns=(), filters=None, count_table=None):
+        self.select = select
+        self.from_clause = from_clause
+        self.sort_columns = sort_columns
+        self.default_sort = default_sort
+        self.tiebreak = tiebreak
+        self.search_columns = search_columns
+        self.filters = filters or {}
+        self.count_table = count_table
+
+    def _where(self, args):
+        conditions = []
+        params = []
+        search = (args.get('q') or '').strip()
+        if search and self.search_columns:
+            conditions.append("(" + " OR ".join(f"{column} LIKE %s" for column in self.search_columns) + ")")
+            pattern = "%" + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + "%"
+            params.extend([pattern] * len(self.search_columns))
+        for name, column in self.filters.items():
+            value = args.get(name)
+            if value:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def _count(self, where, params):
+        if not where and self.count_table:
+            estimate = execute_query(
+                """SELECT TABLE_ROWS as estimate FROM information_schema.TABLES
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+                (self.count_table,),
+                fetch_one=True
+            )
+            if estimate and (estimate['estimate'] or 0) > ESTIMATE_THRESHOLD:
+                return estimate['estimate'], True
+
+        row = execute_query(
+            f"""SELECT COUNT(*) as total FROM (
+                    SELECT 1 {self.from_clause}{where} LIMIT {COUNT_CAP + 1}
+                ) capped""",
+            tuple(params),
+            fetch_one=True
+        )
+        total = row['total'] if row else 0
+        if total > COUNT_CAP:
+            return COUNT_CAP, True
+        return total, False
+
+    def page(self, args):
+        """Fetch the page described by the request's query string"""
+        sort = args.get('sort')
+        if sort not in self.sort_columns:
+            sort = self.default_sort[0]
+        order = args.get('order')
+        if order not in ('asc', 'desc'):
+            order = self.default_sort[1] if sort == self.default_sort[0] else 'asc'
+
+        try:
+            per_page = min(MAX_PER_PAGE, max(1, int(args.get('per_page') or Config.ITEMS_PER_PAGE)))
+            page = max(1, int(args.get('page') or 1))
+        except ValueError:
+            per_page, page = Config.ITEMS_PER_PAGE, 1
+
+        where, params = self._where(args)
+        total, estimated = self._count(where, params)
+
+        items = execute_query(
+            f"""SELECT {self.select} {self.from_clause}{where}
+                ORDER BY {self.sort_columns[sort]} {order.upper()}, {self.tiebreak} {order.upper()}
+                LIMIT %s OFFSET %s""",
+            tuple(params) + (per_page, (page - 1) * per_page),
+            fetch=True
+        ) or []
+
+        kept = ['q', *self.filters, 'per_page']
+        query_args = {key: args.get(key) for key in kept}
+        query_args.update(sort=sort, order=order, page=page)
+        return Page(items, page, per_page, total, estimated, sort, order, query_args)
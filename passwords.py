@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from config import Config
+import bcrypt
+import logging
+import multiprocessing
+import threading
+
+logger = logging.getLogger(__name__)
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password worker pool is full; the app answers 503"""
+
+_pool = None
+_pool_lock = threading.Lock()
+# Jobs running plus jobs waiting; beyond this callers fail fast
+_slots = threading.BoundedSemaphore(max(1, Config.PASSWORD_WORKERS) + Config.PASSWORD_QUEUE_DEPTH)
+# Passwords per pool job in hash_passwords()
+BULK_HASH_BATCH = 8
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _hash_many(passwords, rounds):
+    return [_hash(password, rounds) for password in passwords]
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking a threaded server can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=Config.PASSWORD_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _run(function, *args):
+    """
+    Run a bcrypt call on the worker pool and wait for its result
+
+    The calling request thread still blocks until the job finishes (up to
+    PASSWORD_TIMEOUT); what the pool bounds is how many bcrypt calls burn
+    CPU at once, and the slot cap turns a backlog into fast 503s instead of
+    an ever-growing queue of waiting threads. PASSWORD_WORKERS = 0 runs it
+    inline instead (e.g. for scripts).
+    """
+    if Config.PASSWORD_WORKERS <= 0:
+        return function(*args)
+
+    if not _slots.acquire(blocking=False):
+        raise PasswordPoolBusy("Password worker queue is full")
+    try:
+        future = _get_pool().submit(function, *args)
+    except Exception:
+        _slots.release()
+        raise
+    # The slot is held until the job finishes, even if this caller gives up
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=Config.PASSWORD_TIMEOUT)
+    except FutureTimeoutError:
+        logger.warning("Password hashing timed out waiting for a worker")
+        raise PasswordPoolBusy("Password worker timed out")
+
+def hash_password(password):
+    """Hash a password using bcrypt at Config.BCRYPT_ROUNDS"""
+    return _run(_hash, password.encode('utf-8'), Config.BCRYPT_ROUNDS)
+
+def hash_passwords(passwords):
+    """
+    Hash many passwords (bulk imports) across the worker pool
+
+    Work goes out in batches of BULK_HASH_BATCH with at most one batch per
+    worker in flight, so a login queued behind an import waits for one
+    batch rather than the whole import. Blocks until every hash is done.
+
+    Returns:
+        List of hashes in the same order as passwords
+    """
+    encoded = [password.encode('utf-8') for password in passwords]
+    if Config.PASSWORD_WORKERS <= 0:
+        return _hash_many(encoded, Config.BCRYPT_ROUNDS)
+
+    in_flight = threading.BoundedSemaphore(Config.PASSWORD_WORKERS)
+    futures = []
+    for start in range(0, len(encoded), BULK_HASH_BATCH):
+        in_flight.acquire()
+        try:
+            future = _get_pool().submit(_hash_many, encoded[start:start + BULK_HASH_BATCH], Config.BCRYPT_ROUNDS)
+        except Exception:
+            in_flight.release()
+            raise
+        future.add_done_callback(lambda _: in_flight.release())
+        futures.append(future)
+    return [password_hash for future in futures for password_hash in future.result()]
+
+def verify_password(password, password_hash):
+    """Verify a password against its hash"""
+    return _run(_check, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with a different cost than Config.BCRYPT_ROUNDS"""
+    try:
+        return int(password_hash.split('$')[2]) != Config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
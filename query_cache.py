@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from functools import lru_cache
+from metrics import register_collector, cache_entries, cache_requests_total
+from config import Config
+import re
+import threading
+import time
+
+MISSING = object()
+# Marker in a set of written tables meaning "could be any table"
+ALL_TABLES = '*'
+
+_WHITESPACE = re.compile(r"\s+")
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+_WRITE_TABLES = re.compile(r"\b(?:INTO|UPDATE|FROM|JOIN|TABLE)\s+`?(\w+)`?", re.IGNORECASE)
+_LOCKING_READ = re.compile(r"\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.IGNORECASE)
+_READ_STATEMENTS = ('SELECT', 'WITH', 'SHOW', 'EXPLAIN', 'DESCRIBE', '(')
+_SESSION_STATEMENTS = ('SET', 'START', 'BEGIN', 'COMMIT', 'ROLLBACK', 'USE')
+
+@lru_cache(maxsize=1024)
+def _parse(query):
+    """(normalized SQL, tables read or None, tables written or None) for one statement"""
+    sql = _WHITESPACE.sub(' ', query).strip()
+    first = sql.split(' ', 1)[0].upper()
+    if first.startswith(_READ_STATEMENTS):
+        # Locking reads belong to a write path and must hit the database
+        tables = None if _LOCKING_READ.search(sql) else tuple(sorted({t.lower() for t in _READ_TABLES.findall(sql)}))
+        return sql, tables or None, None
+    if first in _SESSION_STATEMENTS:
+        return sql, None, None
+    # Over-matching (e.g. "ON DUPLICATE KEY UPDATE col") only invalidates a little more
+    written = frozenset(t.lower() for t in _WRITE_TABLES.findall(sql))
+    return sql, None, written or frozenset((ALL_TABLES,))
+
+def tables_written(query):
+    """Tables a write statement may change (ALL_TABLES if unknown), or None for reads"""
+    return _parse(query)[2]
+
+class QueryCache:
+    """
+    LRU cache of SELECT results, invalidated by per-table version counters
+
+    Every write that goes through execute_query/execute_many bumps the
+    version of each table it names (after its commit, for transactions).
+    An entry remembers the versions of the tables its query read, taken
+    before the query ran, and is only served while they are unchanged - so
+    callers never need to invalidate by hand. Versions live in each worker
+    process: writes made by another worker or outside the app are only
+    picked up when the entry's TTL runs out.
+    """
+
+    def __init__(self, name, max_entries):
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._epoch = 0
+        register_collector(self._collect_metrics)
+
+    def _snapshot(self, tables):
+        return (self._epoch,) + tuple(self._versions.get(table, 0) for table in tables)
+
+    def lookup(self, query, params, fetch_one):
+        """
+        Find a cached result for a read
+
+        Returns:
+            (key, versions, value) - value is MISSING on a miss; key is None
+            when the statement cannot be cached (not a plain SELECT,
+            unhashable params)
+        """
+        sql, tables, _ = _parse(query)
+        if not tables:
+            return None, None, MISSING
+        try:
+            key = (sql, tuple(params) if params else (), fetch_one)
+            hash(key)
+        except TypeError:
+            return None, None, MISSING
+
+        with self._lock:
+            versions = self._snapshot(tables)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, entry_versions, value = entry
+                if expires > time.monotonic() and entry_versions == versions:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return key, versions, _copy(value)
+                del self._entries[key]
+            self.misses += 1
+        return key, versions, MISSING
+
+    def store(self, key, versions, value, ttl):
+        """Keep a result read under the given versions; stale versions are simply never served"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, versions, _copy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump(self, tables):
+        """Invalidate every cached result that read any of these tables"""
+        with self._lock:
+            if ALL_TABLES in tables:
+                self._epoch += 1
+                self._entries.clear()
+                return
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self):
+        self.bump((ALL_TABLES,))
+
+    def _collect_metrics(self):
+        with self._lock:
+            size = len(self._entries)
+        cache_entries.set(size, cache=self.name)
+        cache_requests_total.set(self.hits, cache=self.name, result='hit')
+        cache_requests_total.set(self.misses, cache=self.name, result='miss')
+
+def _copy(value):
+    # Callers are free to modify the rows they get back
+    if isinstance(value, list):
+        return [dict(row) if isinstance(row, dict) else row for row in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+query_cache = QueryCache('query_results', Config.QUERY_CACHE_MAX_ENTRIES)
@@ -0,0 +1,127 @@
+from flask import g, has_request_context, request, session
+from config import Config
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_query')
+
+# Per-request statement timings beyond this many are counted but not kept
+MAX_RECORDED_STATEMENTS = 200
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\([^)]*\)s")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_sql(query):
+    """
+    Reduce a statement to its shape for logging and grouping
+
+    Literals and placeholders become "?", multi-row VALUES and IN lists
+    collapse to a single entry and whitespace is squeezed, so the same
+    statement run with different parameters normalizes to the same text.
+    """
+    shape = _STRING_LITERAL.sub('?', query)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (?)', shape)
+    shape = _VALUE_LIST.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+def _redacted(params):
+    if not params:
+        return 'none'
+    return f"<{len(params)} redacted>"
+
+def start_request():
+    """Begin collecting query statistics for the current request"""
+    g.query_stats = {
+        'started': time.perf_counter(),
+        'count': 0,
+        'total_ms': 0.0,
+        'statements': [],
+        'shapes': {},
+        'n_plus_one': [],
+    }
+
+def current_stats():
+    """Query statistics for the current request, or None outside one"""
+    if not has_request_context():
+        return None
+    return g.get('query_stats')
+
+def record_query(query, params, seconds, rows=None):
+    """
+    Record one executed statement
+
+    Called by execute_query/execute_many. Adds the timing to the request's
+    totals, writes the slow-query log and raises an N+1 warning the first
+    time a statement shape passes Config.N_PLUS_ONE_THRESHOLD in a request.
+    """
+    elapsed_ms = seconds * 1000
+    shape = None
+
+    if elapsed_ms >= Config.SLOW_QUERY_MS:
+        shape = normalize_sql(query)
+        slow_query_logger.warning(
+            "Slow query (%.1f ms, %s rows) [%s]: %s params=%s",
+            elapsed_ms, rows if rows is not None else '-',
+            request.endpoint if has_request_context() else 'no request',
+            shape, _redacted(params)
+        )
+
+    stats = current_stats()
+    if stats is None:
+        return
+
+    shape = shape or normalize_sql(query)
+    stats['count'] += 1
+    stats['total_ms'] += elapsed_ms
+    if len(stats['statements']) < MAX_RECORDED_STATEMENTS:
+        stats['statements'].append({'sql': shape, 'ms': elapsed_ms, 'rows': rows})
+
+    runs = stats['shapes'].get(shape, 0) + 1
+    stats['shapes'][shape] = runs
+    if runs == Config.N_PLUS_ONE_THRESHOLD + 1:
+        stats['n_plus_one'].append(shape)
+        logger.warning(
+            "Possible N+1 in %s: statement ran more than %d times: %s",
+            request.endpoint, Config.N_PLUS_ONE_THRESHOLD, shape
+        )
+
+def server_timing_header(stats):
+    """Build a Server-Timing value with the database and total request time"""
+    total_ms = (time.perf_counter() - stats['started']) * 1000
+    return (
+        f'db;dur={stats["total_ms"]:.1f};desc="{stats["count"]} queries", '
+        f'app;dur={total_ms:.1f}'
+    )
+
+def init_app(app):
+    """Register the request hooks and the footer context on a Flask app"""
+    if not Config.QUERY_STATS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_query_stats():
+        start_request()
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = current_stats()
+        if stats is not None:
+            response.headers['Server-Timing'] = server_timing_header(stats)
+        return response
+
+    @app.context_processor
+    def _query_debug_context():
+        return {
+            # Never in pages headed for the shared page cache
+            'show_query_debug': (Config.QUERY_DEBUG_FOOTER and session.get('role') == 'admin'
+                                 and not g.get('page_cache_render')),
+            'query_stats': current_stats,
+        }
@@ -0,0 +1,179 @@
+from database import execute_query, transaction, Error
+from config import Config
+from metrics import register_collector, rate_limit_keys, login_lockouts_total
+from collections import OrderedDict
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenBucketLimiter:
+    """
+    In-process token buckets keyed by a string (an IP, a username)
+
+    Each key holds capacity tokens and regains refill_per_minute of them
+    per minute; an attempt takes one. Buckets live in an LRU-ordered dict
+    capped at max_keys, so a flood of distinct keys evicts the idlest
+    buckets instead of growing memory. Each worker keeps its own buckets.
+    """
+
+    def __init__(self, name, capacity, refill_per_minute, max_keys=10000):
+        self.name = name
+        self.capacity = capacity
+        self.rate = refill_per_minute / 60.0
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        register_collector(self._collect_metrics)
+
+    def _wait(self, tokens):
+        return math.ceil((1 - tokens) / self.rate) if self.rate else 60
+
+    def wait_time(self, key):
+        """Seconds until key has a token (0 if it has one now), without taking it"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        return 0 if tokens >= 1 else self._wait(tokens)
+
+    def take(self, key):
+        """
+        Take one token for key
+
+        Returns:
+            0 if allowed, else the seconds until a token is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return 0
+        return self._wait(tokens)
+
+    def reset(self, key):
+        """Forget a key (e.g. after a successful login)"""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _collect_metrics(self):
+        with self._lock:
+            size = len(self._buckets)
+        rate_limit_keys.set(size, limiter=self.name)
+
+class DatabaseBuckets:
+    """
+    Token buckets shared by every worker, stored in login_throttle
+
+    One upsert refills and takes a token under the row lock; the stored
+    balance never drops below -1 so a blocked key recovers on schedule.
+    """
+
+    # Every this many takes, rows idle for a day are purged
+    PURGE_EVERY = 1000
+
+    def __init__(self, capacity, refill_per_minute):
+        self.capacity = capacity
+        self.rate = refill_per_minute / 60.0
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key):
+        with self._lock:
+            self._takes += 1
+            purge = self._takes % self.PURGE_EVERY == 0
+        if purge:
+            execute_query(
+                "DELETE FROM login_throttle WHERE updated_at < NOW() - INTERVAL 1 DAY",
+                commit=True
+            )
+        with transaction():
+            execute_query(
+                """INSERT INTO login_throttle (bucket_key, tokens, updated_at)
+                   VALUES (%s, %s, NOW(6))
+                   ON DUPLICATE KEY UPDATE
+                       tokens = GREATEST(LEAST(%s, tokens + TIMESTAMPDIFF(MICROSECOND, updated_at, NOW(6)) / 1000000 * %s) - 1, -1),
+                       updated_at = NOW(6)""",
+                (key, self.capacity - 1, self.capacity, self.rate)
+            )
+            row = execute_query(
+                "SELECT tokens FROM login_throttle WHERE bucket_key = %s",
+                (key,),
+                fetch_one=True
+            )
+        tokens = float(row['tokens']) if row else 0
+        if tokens >= 0:
+            return 0
+        return math.ceil(-tokens / self.rate) if self.rate else 60
+
+    def reset(self, key):
+        execute_query("DELETE FROM login_throttle WHERE bucket_key = %s", (key,), commit=True)
+
+_ip_buckets = TokenBucketLimiter('login_ip', Config.LOGIN_IP_BURST, Config.LOGIN_IP_PER_MINUTE)
+_user_buckets = TokenBucketLimiter('login_username', Config.LOGIN_USER_BURST, Config.LOGIN_USER_PER_MINUTE)
+_shared_user_buckets = (DatabaseBuckets(Config.LOGIN_USER_BURST, Config.LOGIN_USER_PER_MINUTE)
+                        if Config.LOGIN_THROTTLE_BACKEND == 'database' else None)
+
+def login_key(user, submitted):
+    """
+    Bucket key for a login attempt: the account, not the text typed in
+
+    A username and an email for the same account share one bucket; an
+    identifier that matches no account gets a bucket of its own.
+    """
+    if user:
+        return f"id:{user['user_id']}"
+    return f"name:{submitted.strip().lower()}"
+
+def check_login(ip, account):
+    """
+    Check the IP's bucket and take a login attempt from the account's bucket
+
+    account is login_key() of the looked-up user. Call before the bcrypt
+    work. The IP bucket is only charged
+    by record_failed_login(), so a classroom behind one NAT address can all
+    log in at the start of a session; it only blocks an address that keeps
+    failing. The in-process buckets are always checked first; with
+    LOGIN_THROTTLE_BACKEND=database the account is also checked against
+    the shared table so a limit holds across workers (a database error
+    there fails open).
+
+    Returns:
+        0 if the attempt may proceed, else seconds to wait before retrying
+    """
+    wait = _ip_buckets.wait_time(ip)
+    if wait:
+        login_lockouts_total.inc(scope='ip')
+        return wait
+
+    wait = _user_buckets.take(account)
+    if not wait and _shared_user_buckets:
+        try:
+            wait = _shared_user_buckets.take(f"user:{account}")
+        except Error as e:
+            logger.error(f"Shared login throttle unavailable: {e}")
+    if wait:
+        login_lockouts_total.inc(scope='username')
+    return wait
+
+def record_failed_login(ip):
+    """Charge a failed login attempt to the client IP's bucket"""
+    _ip_buckets.take(ip)
+
+def reset_login(account):
+    """Refill an account's bucket (a login_key()) after a successful login"""
+    _user_buckets.reset(account)
+    if _shared_user_buckets:
+        try:
+            _shared_user_buckets.reset(f"user:{account}")
+        except Error as e:
+            logger.error(f"Shared login throttle unavailable: {e}")
@@ -0,0 +1,30 @@
+import argparse
+from attendance_service import rebuild_attendance_summary, verify_attendance_summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or verify the attendance_summary rollup table")
+    parser.add_argument('--verify', action='store_true', help="only report rows that differ from the attendance table")
+    parser.add_argument('--batch', type=int, help="limit to one batch_id")
+    args = parser.parse_args()
+    
+    if args.verify:
+        mismatches = verify_attendance_summary(args.batch)
+        if mismatches is None:
+            print("✗ Verification failed - see the database error above.")
+            return 1
+        if not mismatches:
+            print("✓ attendance_summary matches the attendance table.")
+            return 0
+        print(f"✗ {len(mismatches)} summary row(s) out of date:")
+        for row in mismatches:
+            print(f"  batch {row['batch_id']}, student {row['student_id']}: "
+                  f"stored total {row['stored_total_classes']}, actual {row['total_classes']}")
+        print("Run without --verify to rebuild.")
+        return 1
+    
+    rows = rebuild_attendance_summary(args.batch)
+    print(f"✓ Rebuilt attendance_summary ({rows} rows).")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+from database import execute_query, transaction
+from config import Config
+from collections import deque
+from datetime import date
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_RESERVE_BLOCK = """INSERT INTO receipt_sequences (sequence_year, next_value)
+                    VALUES (%s, LAST_INSERT_ID(1 + %s))
+                    ON DUPLICATE KEY UPDATE next_value = LAST_INSERT_ID(next_value + %s)"""
+
+class ReceiptSequence:
+    """
+    Receipt numbers handed out from blocks reserved in receipt_sequences
+
+    Each worker process reserves block_size numbers per round trip with one
+    atomic upsert and then serves them from memory, so numbers are unique
+    across threads and processes. The lock only guards handing out numbers:
+    the reservation runs without it, and threads that run dry at the same
+    time each reserve a block of their own. Numbers left unused when a
+    worker restarts (or when a payment fails) are simply skipped; receipts
+    are unique, not gap-free or strictly increasing.
+    """
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._year = None
+        # [next, end) ranges still to hand out for self._year
+        self._blocks = deque()
+
+    def _reserve(self, year):
+        """
+        Reserve a block on the current unit of work's connection
+
+        Must run outside any transaction() so the block stays reserved even
+        if the payment that asked for it rolls back.
+
+        Returns:
+            (start, end) of the reserved numbers
+        """
+        with transaction():
+            execute_query(_RESERVE_BLOCK, (year, self.block_size, self.block_size), commit=True)
+            end = execute_query("SELECT LAST_INSERT_ID() AS end_value", fetch_one=True)['end_value']
+        logger.debug(f"Reserved receipt numbers {end - self.block_size}-{end - 1} for {year}")
+        return end - self.block_size, end
+
+    def _take(self, year):
+        """Next number from the reserved blocks, or None when they are used up"""
+        with self._lock:
+            if year != self._year:
+                self._year = year
+                self._blocks.clear()
+            while self._blocks:
+                block = self._blocks[0]
+                if block[0] < block[1]:
+                    block[0] += 1
+                    return block[0] - 1
+                self._blocks.popleft()
+        return None
+
+    def next_number(self, today=None):
+        """Return the next receipt number, e.g. RCP2026-000042"""
+        year = (today or date.today()).year
+        number = self._take(year)
+        if number is None:
+            start, end = self._reserve(year)
+            number = start
+            with self._lock:
+                if year == self._year:
+                    self._blocks.append([start + 1, end])
+        return f"RCP{year}-{number:06d}"
+
+receipt_sequence = ReceiptSequence(Config.RECEIPT_BLOCK_SIZE)
+
+def next_receipt_no():
+    """
+    Allocate a fee receipt number; raises database Error if no block could be reserved
+
+    Call it before opening the payment's transaction().
+    """
+    return receipt_sequence.next_number()
@@ -0,0 +1,36 @@
+import argparse
+from fee_service import verify_fees, repair_fee
+from dashboard_counters import refresh_counters
+
+def main():
+    parser = argparse.ArgumentParser(description="Check fees against their fee_transactions (e.g. nightly from cron)")
+    parser.add_argument('--fix', action='store_true', help="rewrite drifted fees from their transactions")
+    parser.add_argument('--fee', type=int, help="limit to one fee_id")
+    args = parser.parse_args()
+    
+    drift = verify_fees(args.fee)
+    if drift is None:
+        print("✗ Reconciliation failed - see the database error above.")
+        return 1
+    if not drift:
+        print("✓ All fees match their transactions.")
+        return 0
+    
+    print(f"✗ {len(drift)} fee(s) out of step with their transactions:")
+    for row in drift:
+        print(f"  fee {row['fee_id']} (student {row['student_id']}): "
+              f"stored paid {row['stored_paid_amount']}, due {row['stored_due_amount']}, {row['stored_payment_status']}; "
+              f"transactions give paid {row['paid_amount']}, due {row['due_amount']}, {row['payment_status']}")
+    
+    if not args.fix:
+        print("Run with --fix to correct them.")
+        return 1
+    
+    for row in drift:
+        repair_fee(row)
+    refresh_counters('fees')
+    print(f"✓ Corrected {len(drift)} fee(s).")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
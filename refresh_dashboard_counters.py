@@ -0,0 +1,21 @@
+import argparse
+from dashboard_counters import COUNTERS, refresh_counters, get_counters
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the dashboard_counters table (e.g. from cron)")
+    parser.add_argument('groups', nargs='*',
+                        choices=sorted({group for group, _ in COUNTERS.values()}),
+                        help="only refresh these counter groups (default: all)")
+    args = parser.parse_args()
+    
+    if refresh_counters(*args.groups) is None:
+        print("✗ Refresh failed - see the database error above.")
+        return 1
+    
+    for name, value in get_counters().items():
+        print(f"  {name}: {value}")
+    print("✓ Dashboard counters refreshed.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,216 @@
+from database import execute_query, transaction, Error
+from exam_stats import invalidate_exam_stats
+from cache import TTLCache
+from config import Config
+import bisect
+
+# Per-student results page data, keyed by (student_id, results version). The
+# version lives in results_versions and is bumped with every marks save, so
+# all workers move to the new snapshot on the next page view; the saving
+# worker builds it straight away so release day reads hit the cache.
+results_cache = TTLCache('student_results', Config.RESULTS_CACHE_TTL, max_entries=Config.RESULTS_CACHE_MAX_ENTRIES)
+
+_RESULTS_QUERY = """SELECT er.*, e.exam_name, e.exam_type, e.exam_date, e.total_marks,
+                        b.batch_name, c.course_name
+                    FROM exam_results er
+                    JOIN exams e ON er.exam_id = e.exam_id
+                    JOIN batches b ON e.batch_id = b.batch_id
+                    JOIN courses c ON b.course_id = c.course_id
+                    WHERE er.student_id IN ({placeholders})
+                    ORDER BY e.exam_date DESC"""
+
+def grade_marks(marks, total_marks, passing_marks, bands=None):
+    """
+    Grade a whole list of marks against one exam at once
+
+    Band thresholds are scaled to the exam once, so each row is a single
+    bisect with exact integer comparisons (no float rounding at band edges).
+
+    Args:
+        marks: List of integer marks
+        bands: (min_percentage, grade) pairs, default Config.GRADE_BANDS
+
+    Returns:
+        List of (grade, result_status) tuples in the same order as marks
+    """
+    bands = sorted(bands or Config.GRADE_BANDS)
+    scaled = [threshold * total_marks for threshold, _ in bands]
+    grades = [grade for _, grade in bands]
+    return [
+        (grades[max(bisect.bisect_right(scaled, mark * 100) - 1, 0)],
+         'pass' if mark >= passing_marks else 'fail')
+        for mark in marks
+    ]
+
+def parse_marks(student_ids, marks_list, total_marks):
+    """
+    Pair submitted student ids with their marks and validate them
+
+    Blank marks are skipped. A student listed twice keeps the last mark.
+
+    Returns:
+        (entries, errors) - entries is a dict of student_id -> marks, errors
+        lists the submitted values that are not whole numbers in 0..total_marks
+        and the student ids that are not numbers
+    """
+    entries = {}
+    errors = []
+    for student_id, value in zip(student_ids, marks_list):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            student_id = int(student_id)
+        except ValueError:
+            errors.append(f"student {student_id}")
+            continue
+        try:
+            mark = int(value)
+        except ValueError:
+            errors.append(value)
+            continue
+        if not 0 <= mark <= total_marks:
+            errors.append(value)
+            continue
+        entries[student_id] = mark
+    return entries, errors
+
+def not_enrolled(batch_id, student_ids):
+    """
+    Student ids without an active enrollment in the batch
+
+    Returns:
+        Set of student ids, or None on a database error
+    """
+    if not student_ids:
+        return set()
+    rows = execute_query(
+        f"""SELECT student_id FROM enrollments
+            WHERE batch_id = %s AND status = 'active'
+            AND student_id IN ({", ".join(["%s"] * len(student_ids))})""",
+        (batch_id, *student_ids),
+        fetch=True
+    )
+    if rows is None:
+        return None
+    return set(student_ids) - {row['student_id'] for row in rows}
+
+def save_exam_results(exam, entries, entered_by):
+    """
+    Write the marks for one exam with a single multi-row upsert
+
+    Args:
+        exam: Dict with exam_id, batch_id, total_marks and passing_marks
+        entries: Dict of student_id -> marks (already validated, see
+            parse_marks and not_enrolled)
+        entered_by: user_id recorded on each result
+
+    Returns:
+        Number of results written, or None on a database error
+    """
+    if not entries:
+        return 0
+
+    student_ids = list(entries)
+    graded = grade_marks([entries[student_id] for student_id in student_ids],
+                         exam['total_marks'], exam['passing_marks'])
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(student_ids))
+    params = []
+    for student_id, (grade, result_status) in zip(student_ids, graded):
+        params.extend([exam['exam_id'], student_id, entries[student_id], grade, result_status, entered_by])
+
+    try:
+        with transaction():
+            execute_query(
+                f"""INSERT INTO exam_results (exam_id, student_id, marks_obtained, grade, result_status, entered_by)
+                    VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE marks_obtained = VALUES(marks_obtained),
+                        grade = VALUES(grade),
+                        result_status = VALUES(result_status),
+                        entered_by = VALUES(entered_by)""",
+                tuple(params),
+                commit=True
+            )
+            execute_query(
+                f"""INSERT INTO results_versions (student_id, version)
+                    VALUES {", ".join(["(%s, 1)"] * len(student_ids))}
+                    ON DUPLICATE KEY UPDATE version = version + 1""",
+                tuple(student_ids),
+                commit=True
+            )
+            invalidate_exam_stats(exam['batch_id'])
+    except Error:
+        return None
+    prewarm_student_results(student_ids)
+    return len(student_ids)
+
+def _snapshot(rows):
+    """Results page data for one student: exams newest first plus the average percentage"""
+    average = sum(row['marks_obtained'] * 100 / row['total_marks'] for row in rows) / len(rows) if rows else 0
+    return {'exam_results': rows, 'avg_percentage': average}
+
+def _versions(student_ids):
+    """Current results version per student (0 if never saved); None on a database error"""
+    rows = execute_query(
+        f"""SELECT student_id, version FROM results_versions
+            WHERE student_id IN ({", ".join(["%s"] * len(student_ids))})""",
+        tuple(student_ids),
+        fetch=True
+    )
+    if rows is None:
+        return None
+    versions = dict.fromkeys(student_ids, 0)
+    versions.update((row['student_id'], row['version']) for row in rows)
+    return versions
+
+def _load_snapshots(student_ids):
+    """Snapshots for many students from one query; None on a database error"""
+    rows = execute_query(
+        _RESULTS_QUERY.format(placeholders=", ".join(["%s"] * len(student_ids))),
+        tuple(student_ids),
+        fetch=True
+    )
+    if rows is None:
+        return None
+    grouped = {student_id: [] for student_id in student_ids}
+    for row in rows:
+        grouped[row['student_id']].append(row)
+    return {student_id: _snapshot(student_rows) for student_id, student_rows in grouped.items()}
+
+def student_results(student_id):
+    """
+    Results page data for a student, from the snapshot cache
+
+    Each view reads the student's results version (a primary key lookup)
+    and serves the snapshot cached for that version. On a miss one request
+    per worker builds it while concurrent requests for the same student
+    wait. Returns None if the database could not be read.
+    """
+    def load():
+        snapshots = _load_snapshots([student_id])
+        return snapshots[student_id] if snapshots else None
+
+    versions = _versions([student_id])
+    if versions is None:
+        return load()
+    return results_cache.get_or_set((student_id, versions[student_id]), load,
+                                    should_store=lambda snapshot: snapshot is not None)
+
+def prewarm_student_results(student_ids):
+    """
+    Build and cache the snapshots of students whose marks just changed
+
+    Versions are read before the rows, so a snapshot is never newer-keyed
+    than its data. Only this worker's cache is warmed; the others see the
+    bumped version on their next read and rebuild that student's snapshot
+    once (single-flight).
+    """
+    for start in range(0, len(student_ids), 500):
+        chunk = student_ids[start:start + 500]
+        versions = _versions(chunk)
+        snapshots = _load_snapshots(chunk) if versions is not None else None
+        if snapshots is None:
+            return
+        for student_id, snapshot in snapshots.items():
+            results_cache.set((student_id, versions[student_id]), snapshot)
@@ -1,46 +1,99 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from auth import role_required
-from database import execute_query
-import bcrypt
+from database import execute_query, Error
+from checkin_service import invalidate_enrollment_windows
+from cache import invalidate_visitor_cache
+from enrollment_service import promote_waitlist
+from exam_stats import batch_trends
+from dashboard_counters import get_counters, refresh_counters
+from attendance_service import (save_attendance, update_attendance_record, delete_attendance_record,
+                                attendance_history_page, iter_attendance_history, SUMMARY_REPORT_COLUMNS)
+from config import Config
+from pagination import Listing
+from passwords import hash_password
+from student_import_service import (start_import, get_import, REQUIRED_COLUMNS, OPTIONAL_COLUMNS,
+                                    ALLOWED_EXTENSIONS as IMPORT_EXTENSIONS)
+from typeahead import lookup, lookup_label, invalidate_lookups
+from werkzeug.utils import secure_filename
+import csv
+import io
+import os
+import uuid
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-def hash_password(password):
-    """Hash password"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Admin listings: sort keys map to indexed columns (see add_listing_indexes.sql)
+USER_LISTING = Listing(
+    select="*",
+    from_clause="FROM users",
+    sort_columns={'created': 'created_at', 'username': 'username', 'name': 'full_name', 'email': 'email'},
+    default_sort=('created', 'desc'),
+    tiebreak='user_id',
+    search_columns=('username', 'full_name', 'email'),
+    filters={'role': 'role', 'status': 'status'},
+    count_table='users'
+)
+
+STUDENT_LISTING = Listing(
+    select="s.*, u.username, u.email, u.full_name, u.status",
+    from_clause="FROM students s JOIN users u ON s.user_id = u.user_id",
+    sort_columns={'admission': 's.admission_date', 'enrollment_no': 's.enrollment_no', 'name': 'u.full_name'},
+    default_sort=('admission', 'desc'),
+    tiebreak='s.student_id',
+    search_columns=('s.enrollment_no', 'u.full_name', 'u.email', 's.contact'),
+    filters={'status': 'u.status'},
+    count_table='students'
+)
+
+TEACHER_LISTING = Listing(
+    select="t.*, u.username, u.email, u.full_name, u.status",
+    from_clause="FROM teachers t JOIN users u ON t.user_id = u.user_id",
+    sort_columns={'joining': 't.joining_date', 'employee_id': 't.employee_id', 'name': 'u.full_name'},
+    default_sort=('joining', 'desc'),
+    tiebreak='t.teacher_id',
+    search_columns=('t.employee_id', 'u.full_name', 'u.email', 't.specialization'),
+    filters={'status': 'u.status'},
+    count_table='teachers'
+)
+
+COURSE_LISTING = Listing(
+    select="*",
+    from_clause="FROM courses",
+    sort_columns={'created': 'created_at', 'code': 'course_code', 'name': 'course_name'},
+    default_sort=('created', 'desc'),
+    tiebreak='course_id',
+    search_columns=('course_code', 'course_name', 'category'),
+    filters={'status': 'status', 'level': 'level'},
+    count_table='courses'
+)
+
+BATCH_LISTING = Listing(
+    select="b.*, c.course_name, t.employee_id, u.full_name as teacher_name",
+    from_clause="""FROM batches b
+           JOIN courses c ON b.course_id = c.course_id
+           LEFT JOIN teachers t ON b.teacher_id = t.teacher_id
+           LEFT JOIN users u ON t.user_id = u.user_id""",
+    sort_columns={'start': 'b.start_date', 'name': 'b.batch_name'},
+    default_sort=('start', 'desc'),
+    tiebreak='b.batch_id',
+    search_columns=('b.batch_name', 'c.course_name', 'u.full_name'),
+    filters={'status': 'b.status', 'course_id': 'b.course_id'},
+    count_table='batches'
+)
 
 @admin_bp.route('/dashboard')
 @role_required('admin')
 def dashboard():
     """Admin dashboard with statistics"""
-    stats = {}
-    
-    # Get counts
-    stats['total_students'] = execute_query(
-        "SELECT COUNT(*) as count FROM students s JOIN users u ON s.user_id = u.user_id WHERE u.status = 'active'",
-        fetch_one=True
-    )['count']
-    
-    stats['total_teachers'] = execute_query(
-        "SELECT COUNT(*) as count FROM teachers t JOIN users u ON t.user_id = u.user_id WHERE u.status = 'active'",
-        fetch_one=True
-    )['count']
-    
-    stats['total_courses'] = execute_query(
-        "SELECT COUNT(*) as count FROM courses WHERE status = 'active'",
-        fetch_one=True
-    )['count']
-    
-    stats['active_batches'] = execute_query(
-        "SELECT COUNT(*) as count FROM batches WHERE status = 'ongoing'",
-        fetch_one=True
-    )['count']
-    
-    stats['pending_fees'] = execute_query(
-        "SELECT COALESCE(SUM(due_amount), 0) as total FROM fees WHERE payment_status IN ('pending', 'partial', 'overdue')",
-        fetch_one=True
-    )['total']
+    counters = get_counters()
+    stats = {
+        'total_students': counters['active_students'],
+        'total_teachers': counters['active_teachers'],
+        'total_courses': counters['active_courses'],
+        'active_batches': counters['ongoing_batches'],
+        'pending_fees': counters['pending_fees'],
+    }
     
     # Recent enrollments
     recent_enrollments = execute_query(
@@ -60,11 +113,8 @@ def dashboard():
 @role_required('admin')
 def manage_users():
     """Manage all users"""
-    users = execute_query(
-        "SELECT * FROM users ORDER BY created_at DESC",
-        fetch=True
-    )
-    return render_template('admin/manage_users.html', users=users)
+    page = USER_LISTING.page(request.args)
+    return render_template('admin/manage_users.html', users=page.items, page=page)
 
 @admin_bp.route('/users/create', methods =['GET', 'POST'])
 @role_required('admin')
@@ -122,6 +172,8 @@ def edit_user(user_id):
             (full_name, email, status, user_id),
             commit=True
         )
+        refresh_counters('students', 'teachers')
+        invalidate_lookups('students')
         
         flash('User updated successfully!', 'success')
         return redirect(url_for('admin.manage_users'))
@@ -133,6 +185,10 @@ def edit_user(user_id):
 def delete_user(user_id):
     """Delete user"""
     execute_query("DELETE FROM users WHERE user_id = %s", (user_id,), commit=True)
+    invalidate_enrollment_windows()
+    invalidate_visitor_cache()
+    refresh_counters()
+    invalidate_lookups()
     flash('User deleted successfully!', 'success')
     return redirect(url_for('admin.manage_users'))
 
@@ -140,14 +196,8 @@ def delete_user(user_id):
 @role_required('admin')
 def manage_students():
     """Manage students"""
-    students = execute_query(
-        """SELECT s.*, u.username, u.email, u.full_name, u.status
-           FROM students s
-           JOIN users u ON s.user_id = u.user_id
-           ORDER BY s.admission_date DESC""",
-        fetch=True
-    )
-    return render_template('admin/manage_students.html', students=students)
+    page = STUDENT_LISTING.page(request.args)
+    return render_template('admin/manage_students.html', students=page.items, page=page)
 
 @admin_bp.route('/students/create', methods=['GET', 'POST'])
 @role_required('admin')
@@ -199,6 +249,8 @@ def create_student():
                      address, guardian_name, guardian_contact, guardian_email, admission_date if admission_date else None),
                     commit=True
                 )
+                refresh_counters('students')
+                invalidate_lookups('students')
                 flash(f'Student {full_name} created successfully!', 'success')
                 return redirect(url_for('admin.manage_students'))
             else:
@@ -206,6 +258,56 @@ def create_student():
     
     return render_template('admin/create_student.html')
 
+@admin_bp.route('/students/import', methods=['GET', 'POST'])
+@role_required('admin')
+def import_students():
+    """Upload a CSV/XLSX list of students to create in bulk"""
+    if request.method == 'POST':
+        upload = request.files.get('student_file')
+        extension = upload.filename.rsplit('.', 1)[-1].lower() if upload and '.' in upload.filename else ''
+        if extension not in IMPORT_EXTENSIONS:
+            flash('Please choose a .csv or .xlsx file.', 'danger')
+            return render_template('admin/import_students.html',
+                                 required_columns=REQUIRED_COLUMNS, optional_columns=OPTIONAL_COLUMNS)
+        
+        # Saved first: the import outlives this request
+        path = os.path.join(Config.UPLOAD_FOLDER, 'imports', f"{uuid.uuid4().hex}.{extension}")
+        upload.save(path)
+        job_id = start_import(path, secure_filename(upload.filename))
+        return redirect(url_for('admin.import_students_status', job_id=job_id))
+    
+    return render_template('admin/import_students.html',
+                         required_columns=REQUIRED_COLUMNS, optional_columns=OPTIONAL_COLUMNS)
+
+@admin_bp.route('/students/import/<job_id>')
+@role_required('admin')
+def import_students_status(job_id):
+    """Progress and error report of a bulk import"""
+    report = get_import(job_id)
+    if not report:
+        flash('Import not found. It may have been started on another server process.', 'warning')
+        return redirect(url_for('admin.import_students'))
+    return render_template('admin/import_students_status.html', report=report, job_id=job_id)
+
+@admin_bp.route('/students/import/<job_id>/errors')
+@role_required('admin')
+def import_students_errors(job_id):
+    """Download the per-row error report of a bulk import as CSV"""
+    report = get_import(job_id)
+    if not report:
+        flash('Import not found.', 'warning')
+        return redirect(url_for('admin.import_students'))
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Line', 'Username', 'Error'])
+    for error in sorted(report.errors, key=lambda error: error['line']):
+        writer.writerow([error['line'], error['username'], error['message']])
+    
+    filename = f"student_import_errors_{report.started_at.strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(buffer.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @admin_bp.route('/students/edit/<int:student_id>', methods=['GET', 'POST'])
 @role_required('admin')
 def edit_student(student_id):
@@ -264,6 +366,8 @@ def edit_student(student_id):
              guardian_contact, guardian_email, admission_date if admission_date else None, student_id),
             commit=True
         )
+        refresh_counters('students')
+        invalidate_lookups('students')
         
         flash('Student updated successfully!', 'success')
         return redirect(url_for('admin.manage_students'))
@@ -371,6 +475,10 @@ def delete_student(student_id):
             commit=True
         )
         if result is not None:
+            invalidate_enrollment_windows()
+            invalidate_visitor_cache()
+            refresh_counters()
+            invalidate_lookups()
             flash('Student deleted permanently!', 'success')
         else:
             flash('Failed to delete student. Please try again.', 'danger')
@@ -383,14 +491,8 @@ def delete_student(student_id):
 @role_required('admin')
 def manage_teachers():
     """Manage teachers"""
-    teachers = execute_query(
-        """SELECT t.*, u.username, u.email, u.full_name, u.status
-           FROM teachers t
-           JOIN users u ON t.user_id = u.user_id
-           ORDER BY t.joining_date DESC""",
-        fetch=True
-    )
-    return render_template('admin/manage_teachers.html', teachers=teachers)
+    page = TEACHER_LISTING.page(request.args)
+    return render_template('admin/manage_teachers.html', teachers=page.items, page=page)
 
 @admin_bp.route('/teachers/create', methods=['GET', 'POST'])
 @role_required('admin')
@@ -430,6 +532,7 @@ def create_teacher():
                  contact, address, joining_date),
                 commit=True
             )
+            refresh_counters('teachers')
             flash(f'Teacher {full_name} created successfully!', 'success')
             return redirect(url_for('admin.manage_teachers'))
         else:
@@ -493,6 +596,7 @@ def edit_teacher(teacher_id):
              address, joining_date if joining_date else None, teacher_id),
             commit=True
         )
+        refresh_counters('teachers')
         
         flash('Teacher updated successfully!', 'success')
         return redirect(url_for('admin.manage_teachers'))
@@ -547,6 +651,8 @@ def delete_teacher(teacher_id):
             commit=True
         )
         if result is not None:
+            invalidate_visitor_cache()
+            refresh_counters('teachers')
             flash('Teacher deleted permanently!', 'success')
         else:
             flash('Failed to delete teacher. Please try again.', 'danger')
@@ -559,8 +665,8 @@ def delete_teacher(teacher_id):
 @role_required('admin')
 def manage_courses():
     """Manage courses"""
-    courses = execute_query("SELECT * FROM courses ORDER BY created_at DESC", fetch=True)
-    return render_template('admin/manage_courses.html', courses=courses)
+    page = COURSE_LISTING.page(request.args)
+    return render_template('admin/manage_courses.html', courses=page.items, page=page)
 
 @admin_bp.route('/courses/create', methods=['GET', 'POST'])
 @role_required('admin')
@@ -585,6 +691,9 @@ def create_course():
         )
         
         if course_id:
+            invalidate_visitor_cache()
+            refresh_counters('courses')
+            invalidate_lookups('batches')
             flash(f'Course {course_name} created successfully!', 'success')
             return redirect(url_for('admin.manage_courses'))
         else:
@@ -619,6 +728,9 @@ def edit_course(course_id):
             (course_name, description, duration_months, duration_type, fees, category, level, status, course_id),
             commit=True
         )
+        invalidate_visitor_cache()
+        refresh_counters('courses')
+        invalidate_lookups('batches')
         
         flash('Course updated successfully!', 'success')
         return redirect(url_for('admin.manage_courses'))
@@ -643,6 +755,10 @@ def delete_course(course_id):
             commit=True
         )
         if result is not None:
+            invalidate_enrollment_windows()
+            invalidate_visitor_cache()
+            refresh_counters()
+            invalidate_lookups()
             flash('Course deleted permanently!', 'success')
         else:
             flash('Failed to delete course. Please try again.', 'danger')
@@ -683,16 +799,10 @@ def view_course(course_id):
 @role_required('admin')
 def manage_batches():
     """Manage batches"""
-    batches = execute_query(
-        """SELECT b.*, c.course_name, t.employee_id, u.full_name as teacher_name
-           FROM batches b
-           JOIN courses c ON b.course_id = c.course_id
-           LEFT JOIN teachers t ON b.teacher_id = t.teacher_id
-           LEFT JOIN users u ON t.user_id = u.user_id
-           ORDER BY b.start_date DESC""",
-        fetch=True
-    )
-    return render_template('admin/manage_batches.html', batches=batches)
+    page = BATCH_LISTING.page(request.args)
+    courses = execute_query("SELECT course_id, course_name FROM courses ORDER BY course_name", fetch=True) or []
+    course_options = [(course['course_id'], course['course_name']) for course in courses]
+    return render_template('admin/manage_batches.html', batches=page.items, page=page, course_options=course_options)
 
 @admin_bp.route('/batches/create', methods=['GET', 'POST'])
 @role_required('admin')
@@ -719,19 +829,23 @@ def create_batch():
         )
         
         if batch_id:
+            invalidate_visitor_cache()
+            refresh_counters('batches')
+            invalidate_lookups('batches')
             flash(f'Batch {batch_name} created successfully!', 'success')
             return redirect(url_for('admin.manage_batches'))
         else:
             flash('Failed to create batch.', 'danger')
     
     # Get courses and teachers for dropdown
-    courses = execute_query("SELECT * FROM courses WHERE status = 'active'", fetch=True)
+    courses = execute_query("SELECT * FROM courses WHERE status = 'active'", fetch=True, cached=True)
     teachers = execute_query(
         """SELECT t.teacher_id, u.full_name, t.specialization
            FROM teachers t
            JOIN users u ON t.user_id = u.user_id
            WHERE u.status = 'active'""",
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     return render_template('admin/create_batch.html', courses=courses, teachers=teachers)
@@ -774,18 +888,32 @@ def edit_batch(batch_id):
              max_students, classroom, status, batch_id),
             commit=True
         )
+        invalidate_enrollment_windows()
+        invalidate_visitor_cache()
+        refresh_counters('batches')
+        invalidate_lookups('batches')
+        
+        # Seats added by a higher max_students go to the waitlist first
+        try:
+            promoted = promote_waitlist(batch_id)
+        except Error:
+            promoted = 0
+            flash('Could not enroll students from the waitlist. Please try again.', 'warning')
+        if promoted:
+            flash(f'{promoted} student(s) enrolled from the waitlist.', 'info')
         
         flash('Batch updated successfully!', 'success')
         return redirect(url_for('admin.manage_batches'))
     
     # Get courses and teachers for dropdown
-    courses = execute_query("SELECT * FROM courses WHERE status = 'active'", fetch=True)
+    courses = execute_query("SELECT * FROM courses WHERE status = 'active'", fetch=True, cached=True)
     teachers = execute_query(
         """SELECT t.teacher_id, u.full_name, t.specialization
            FROM teachers t
            JOIN users u ON t.user_id = u.user_id
            WHERE u.status = 'active'""",
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     return render_template('admin/edit_batch.html', batch=batch, courses=courses, teachers=teachers)
@@ -821,7 +949,8 @@ def view_batch(batch_id):
         fetch=True
     )
     
-    return render_template('admin/view_batch.html', batch=batch, enrollments=enrollments)
+    return render_template('admin/view_batch.html', batch=batch, enrollments=enrollments,
+                         trends=batch_trends(batch_id))
 
 @admin_bp.route('/batches/delete/<int:batch_id>', methods=['POST'])
 @role_required('admin')
@@ -841,6 +970,10 @@ def delete_batch(batch_id):
             commit=True
         )
         if result is not None:
+            invalidate_enrollment_windows()
+            invalidate_visitor_cache()
+            refresh_counters()
+            invalidate_lookups()
             flash('Batch deleted permanently!', 'success')
         else:
             flash('Failed to delete batch. Please try again.', 'danger')
@@ -862,67 +995,27 @@ def mark_attendance():
     if request.method == 'POST':
         batch_id = request.form.get('batch_id')
         attendance_date = request.form.get('attendance_date')
-        attendance_type = request.form.get('attendance_type', 'student')
+        attendance_type = 'student' if request.form.get('attendance_type', 'student') == 'student' else 'teacher'
         person_ids = request.form.getlist('person_ids')
         
-        if attendance_type == 'student':
-            # Process student attendance
-            for student_id in person_ids:
-                status = request.form.get(f'status_{student_id}')
-                remarks = request.form.get(f'remarks_{student_id}', '').strip()
-                
-                if status and status != 'unmarked':
-                    existing = execute_query(
-                        """SELECT attendance_id FROM attendance
-                           WHERE batch_id = %s AND student_id = %s AND attendance_date = %s""",
-                        (batch_id, student_id, attendance_date),
-                        fetch_one=True
-                    )
-                    
-                    if existing:
-                        execute_query(
-                            """UPDATE attendance SET status = %s, marked_by = %s, remarks = %s
-                               WHERE attendance_id = %s""",
-                            (status, session.get('user_id'), remarks if remarks else None, existing['attendance_id']),
-                            commit=True
-                        )
-                    else:
-                        execute_query(
-                            """INSERT INTO attendance (batch_id, student_id, attendance_date, status, marked_by, remarks)
-                               VALUES (%s, %s, %s, %s, %s, %s)""",
-                            (batch_id, student_id, attendance_date, status, session.get('user_id'), remarks if remarks else None),
-                            commit=True
-                        )
-        else:
-            # Process teacher attendance
-            for teacher_id in person_ids:
-                status = request.form.get(f'status_{teacher_id}')
-                remarks = request.form.get(f'remarks_{teacher_id}', '').strip()
-                
-                if status and status != 'unmarked':
-                    existing = execute_query(
-                        """SELECT attendance_id FROM teacher_attendance
-                           WHERE batch_id = %s AND teacher_id = %s AND attendance_date = %s""",
-                        (batch_id, teacher_id, attendance_date),
-                        fetch_one=True
-                    )
-                    
-                    if existing:
-                        execute_query(
-                            """UPDATE teacher_attendance SET status = %s, marked_by = %s, remarks = %s
-                               WHERE attendance_id = %s""",
-                            (status, session.get('user_id'), remarks if remarks else None, existing['attendance_id']),
-                            commit=True
-                        )
-                    else:
-                        execute_query(
-                            """INSERT INTO teacher_attendance (batch_id, teacher_id, attendance_date, status, marked_by, remarks)
-                               VALUES (%s, %s, %s, %s, %s, %s)""",
-                            (batch_id, teacher_id, attendance_date, status, session.get('user_id'), remarks if remarks else None),
-                            commit=True
-                        )
+        # Collect the whole sheet and write it in one statement
+        rows = []
+        for person_id in person_ids:
+            status = request.form.get(f'status_{person_id}')
+            remarks = request.form.get(f'remarks_{person_id}', '').strip()
+            
+            if status and status != 'unmarked':
+                rows.append((batch_id, person_id, attendance_date, status, remarks))
         
-        flash(f'{"Student" if attendance_type == "student" else "Teacher"} attendance marked successfully!', 'success')
+        try:
+            result = save_attendance(attendance_type, rows, session.get('user_id'))
+        except Error:
+            flash('Failed to save attendance. Please try again.', 'danger')
+        else:
+            flash(f'{"Student" if attendance_type == "student" else "Teacher"} attendance marked successfully! '
+                  f'({result["inserted"]} added, {result["updated"]} updated)', 'success')
+            if result['skipped']:
+                flash(f'{result["skipped"]} row(s) had an invalid id and were not saved.', 'warning')
         return redirect(url_for('admin.mark_attendance', type=attendance_type, batch_id=batch_id, date=attendance_date))
     
     # Get all batches for dropdown
@@ -932,7 +1025,8 @@ def mark_attendance():
            JOIN courses c ON b.course_id = c.course_id
            WHERE b.status IN ('upcoming', 'ongoing', 'completed')
            ORDER BY b.batch_name""",
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     selected_batch = request.args.get('batch_id', type=int)
@@ -1028,65 +1122,62 @@ def attendance_reports():
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    # Get all batches for filter
-    batches = execute_query(
-        """SELECT b.batch_id, b.batch_name, c.course_name
-           FROM batches b
-           JOIN courses c ON b.course_id = c.course_id
-           ORDER BY b.batch_name""",
-        fetch=True
-    )
-    
-    # Get all students for filter
-    all_students = execute_query(
-        """SELECT s.student_id, s.enrollment_no, u.full_name
-           FROM students s
-           JOIN users u ON s.user_id = u.user_id
-           WHERE u.status = 'active'
-           ORDER BY u.full_name""",
-        fetch=True
-    )
-    
     # Build attendance summary query
     attendance_summary = []
     low_attendance_students = []
     
     if batch_id:
-        # Get attendance summary for the batch
-        query = """
-            SELECT 
-                s.student_id,
-                s.enrollment_no,
-                u.full_name,
-                COUNT(a.attendance_id) as total_classes,
-                SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
-                SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
-                SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
-                SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
-                SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
-                ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
-            FROM enrollments e
-            JOIN students s ON e.student_id = s.student_id
-            JOIN users u ON s.user_id = u.user_id
-            LEFT JOIN attendance a ON a.student_id = s.student_id AND a.batch_id = e.batch_id
-        """
-        
-        params = [batch_id]
-        query += " WHERE e.batch_id = %s AND e.status = 'active'"
-        
-        if date_from and date_to:
-            query += " AND a.attendance_date BETWEEN %s AND %s"
-            params.extend([date_from, date_to])
-        elif date_from:
-            query += " AND a.attendance_date >= %s"
-            params.append(date_from)
-        elif date_to:
-            query += " AND a.attendance_date <= %s"
-            params.append(date_to)
-        
-        query += " GROUP BY s.student_id, s.enrollment_no, u.full_name ORDER BY u.full_name"
-        
-        attendance_summary = execute_query(query, tuple(params), fetch=True)
+        if date_from or date_to:
+            # Date-limited reports aggregate the raw attendance rows in range
+            query = """
+                SELECT 
+                    s.student_id,
+                    s.enrollment_no,
+                    u.full_name,
+                    COUNT(a.attendance_id) as total_classes,
+                    SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
+                    SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
+                    SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
+                    SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
+                    SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
+                    ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
+                FROM enrollments e
+                JOIN students s ON e.student_id = s.student_id
+                JOIN users u ON s.user_id = u.user_id
+                LEFT JOIN attendance a ON a.student_id = s.student_id AND a.batch_id = e.batch_id
+            """
+            
+            params = [batch_id]
+            query += " WHERE e.batch_id = %s AND e.status = 'active'"
+            
+            if date_from and date_to:
+                query += " AND a.attendance_date BETWEEN %s AND %s"
+                params.extend([date_from, date_to])
+            elif date_from:
+                query += " AND a.attendance_date >= %s"
+                params.append(date_from)
+            elif date_to:
+                query += " AND a.attendance_date <= %s"
+                params.append(date_to)
+            
+            query += " GROUP BY s.student_id, s.enrollment_no, u.full_name ORDER BY u.full_name"
+            
+            attendance_summary = execute_query(query, tuple(params), fetch=True)
+            
+        else:
+            # Whole-batch reports read the maintained rollup
+            attendance_summary = execute_query(
+                f"""SELECT s.student_id, s.enrollment_no, u.full_name,
+                       {SUMMARY_REPORT_COLUMNS}
+                   FROM enrollments e
+                   JOIN students s ON e.student_id = s.student_id
+                   JOIN users u ON s.user_id = u.user_id
+                   LEFT JOIN attendance_summary sm ON sm.batch_id = e.batch_id AND sm.student_id = e.student_id
+                   WHERE e.batch_id = %s AND e.status = 'active'
+                   ORDER BY u.full_name""",
+                (batch_id,),
+                fetch=True
+            )
         
         # Identify low attendance students (< 60%)
         low_attendance_students = [
@@ -1095,45 +1186,61 @@ def attendance_reports():
         ]
     
     elif student_id:
-        # Get attendance summary for specific student across all batches
-        query = """
-            SELECT 
-                b.batch_id,
-                b.batch_name,
-                c.course_name,
-                COUNT(a.attendance_id) as total_classes,
-                SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
-                SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
-                SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
-                SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
-                SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
-                ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
-            FROM enrollments e
-            JOIN batches b ON e.batch_id = b.batch_id
-            JOIN courses c ON b.course_id = c.course_id
-            LEFT JOIN attendance a ON a.student_id = e.student_id AND a.batch_id = e.batch_id
-            WHERE e.student_id = %s
-        """
-        
-        params = [student_id]
-        
-        if date_from and date_to:
-            query += " AND a.attendance_date BETWEEN %s AND %s"
-            params.extend([date_from, date_to])
-        elif date_from:
-            query += " AND a.attendance_date >= %s"
-            params.append(date_from)
-        elif date_to:
-            query += " AND a.attendance_date <= %s"
-            params.append(date_to)
-        
-        query += " GROUP BY b.batch_id, b.batch_name, c.course_name ORDER BY b.batch_name"
+        if date_from or date_to:
+            # Date-limited reports aggregate the raw attendance rows in range
+            query = """
+                SELECT 
+                    b.batch_id,
+                    b.batch_name,
+                    c.course_name,
+                    COUNT(a.attendance_id) as total_classes,
+                    SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
+                    SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
+                    SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
+                    SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
+                    SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
+                    ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
+                FROM enrollments e
+                JOIN batches b ON e.batch_id = b.batch_id
+                JOIN courses c ON b.course_id = c.course_id
+                LEFT JOIN attendance a ON a.student_id = e.student_id AND a.batch_id = e.batch_id
+                WHERE e.student_id = %s
+            """
+            
+            params = [student_id]
+            
+            if date_from and date_to:
+                query += " AND a.attendance_date BETWEEN %s AND %s"
+                params.extend([date_from, date_to])
+            elif date_from:
+                query += " AND a.attendance_date >= %s"
+                params.append(date_from)
+            elif date_to:
+                query += " AND a.attendance_date <= %s"
+                params.append(date_to)
+            
+            query += " GROUP BY b.batch_id, b.batch_name, c.course_name ORDER BY b.batch_name"
+            
+            attendance_summary = execute_query(query, tuple(params), fetch=True)
         
-        attendance_summary = execute_query(query, tuple(params), fetch=True)
+        else:
+            # Whole-history reports read the maintained rollup
+            attendance_summary = execute_query(
+                f"""SELECT b.batch_id, b.batch_name, c.course_name,
+                       {SUMMARY_REPORT_COLUMNS}
+                   FROM enrollments e
+                   JOIN batches b ON e.batch_id = b.batch_id
+                   JOIN courses c ON b.course_id = c.course_id
+                   LEFT JOIN attendance_summary sm ON sm.batch_id = e.batch_id AND sm.student_id = e.student_id
+                   WHERE e.student_id = %s
+                   ORDER BY b.batch_name""",
+                (student_id,),
+                fetch=True
+            )
     
     return render_template('admin/attendance_reports.html',
-                         batches=batches,
-                         all_students=all_students,
+                         selected_batch_label=lookup_label('batches', batch_id),
+                         selected_student_label=lookup_label('students', student_id),
                          attendance_summary=attendance_summary,
                          low_attendance_students=low_attendance_students,
                          selected_batch=batch_id,
@@ -1141,89 +1248,71 @@ def attendance_reports():
                          date_from=date_from,
                          date_to=date_to)
 
+@admin_bp.route('/lookup/<kind>')
+@role_required('admin')
+def lookup_entries(kind):
+    """Typeahead JSON for the student and batch filters"""
+    if kind not in ('students', 'batches'):
+        return jsonify({'error': 'Unknown lookup'}), 404
+    return jsonify({'results': lookup(kind, request.args.get('q', ''))})
+
+def _attendance_history_filters():
+    """Attendance history filters from the query string"""
+    return {
+        'batch_id': request.args.get('batch_id', type=int),
+        'student_id': request.args.get('student_id', type=int),
+        'date_from': request.args.get('date_from', ''),
+        'date_to': request.args.get('date_to', ''),
+        'status': request.args.get('status', ''),
+    }
+
 @admin_bp.route('/attendance/history')
 @role_required('admin')
 def attendance_history():
     """View and manage attendance history"""
     # Get filter parameters
-    batch_id = request.args.get('batch_id', type=int)
-    student_id = request.args.get('student_id', type=int)
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
-    status_filter = request.args.get('status', '')
-    
-    # Get all batches for filter
-    batches = execute_query(
-        """SELECT b.batch_id, b.batch_name, c.course_name
-           FROM batches b
-           JOIN courses c ON b.course_id = c.course_id
-           ORDER BY b.batch_name""",
-        fetch=True
-    )
-    
-    #Get all students for filter
-    all_students = execute_query(
-        """SELECT s.student_id, s.enrollment_no, u.full_name
-           FROM students s
-           JOIN users u ON s.user_id = u.user_id
-           WHERE u.status = 'active'
-           ORDER BY u.full_name""",
-        fetch=True
-    )
+    filters = _attendance_history_filters()
     
-    # Build query for attendance records
-    query = """
-        SELECT 
-            a.*,
-            s.enrollment_no,
-            u.full_name as student_name,
-            b.batch_name,
-            c.course_name,
-            marker.full_name as marked_by_name
-        FROM attendance a
-        JOIN students s ON a.student_id = s.student_id
-        JOIN users u ON s.user_id = u.user_id
-        JOIN batches b ON a.batch_id = b.batch_id
-        JOIN courses c ON b.course_id = c.course_id
-        JOIN users marker ON a.marked_by = marker.user_id
-        WHERE 1=1
-    """
-    
-    params = []
-    
-    if batch_id:
-        query += " AND a.batch_id = %s"
-        params.append(batch_id)
-    
-    if student_id:
-        query += " AND a.student_id = %s"
-        params.append(student_id)
-    
-    if date_from:
-        query += " AND a.attendance_date >= %s"
-        params.append(date_from)
-    
-    if date_to:
-        query += " AND a.attendance_date <= %s"
-        params.append(date_to)
-    
-    if status_filter:
-        query += " AND a.status = %s"
-        params.append(status_filter)
-    
-    query += " ORDER BY a.attendance_date DESC, u.full_name LIMIT 500"
-    
-    attendance_records = execute_query(query, tuple(params) if params else None, fetch=True)
+    page = attendance_history_page(filters, Config.ITEMS_PER_PAGE,
+                                   after=request.args.get('after'),
+                                   before=request.args.get('before'))
     
     return render_template('admin/attendance_history.html',
-                         batches=batches,
-                         all_students=all_students,
-                         attendance_records=attendance_records,
-                         selected_batch=batch_id,
-                         selected_student=student_id,
-                         date_from=date_from,
-                         date_to=date_to,
-                         status_filter=status_filter)
+                         selected_batch_label=lookup_label('batches', filters['batch_id']),
+                         selected_student_label=lookup_label('students', filters['student_id']),
+                         attendance_records=page['records'],
+                         next_cursor=page['next_cursor'],
+                         prev_cursor=page['prev_cursor'],
+                         filter_args={key: value for key, value in filters.items() if value},
+                         selected_batch=filters['batch_id'],
+                         selected_student=filters['student_id'],
+                         date_from=filters['date_from'],
+                         date_to=filters['date_to'],
+                         status_filter=filters['status'])
+
+@admin_bp.route('/attendance/history/export')
+@role_required('admin')
+def export_attendance_history():
+    """Stream the filtered attendance history as CSV"""
+    filters = _attendance_history_filters()
+    columns = ['attendance_date', 'enrollment_no', 'student_name', 'batch_name', 'course_name',
+               'status', 'remarks', 'marked_by_name']
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Date', 'Enrollment No', 'Student', 'Batch', 'Course', 'Status', 'Remarks', 'Marked By'])
+        for record in iter_attendance_history(filters):
+            writer.writerow([record[column] if record[column] is not None else '' for column in columns])
+            if buffer.tell() > 8192:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    filename = f"attendance_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 @admin_bp.route('/attendance/edit/<int:attendance_id>', methods=['GET', 'POST'])
 @role_required('admin')
@@ -1249,12 +1338,11 @@ def edit_attendance(attendance_id):
         status = request.form.get('status')
         remarks = request.form.get('remarks', '').strip()
         
-        execute_query(
-            """UPDATE attendance SET status = %s, remarks = %s, marked_by = %s
-               WHERE attendance_id = %s""",
-            (status, remarks if remarks else None, session.get('user_id'), attendance_id),
-            commit=True
-        )
+        try:
+            update_attendance_record(attendance_id, status, remarks, session.get('user_id'))
+        except Error:
+            flash('Failed to update attendance record. Please try again.', 'danger')
+            return render_template('admin/edit_attendance.html', attendance=attendance)
         
         flash('Attendance record updated successfully!', 'success')
         return redirect(url_for('admin.attendance_history'))
@@ -1265,12 +1353,12 @@ def edit_attendance(attendance_id):
 @role_required('admin')
 def delete_attendance(attendance_id):
     """Delete an attendance record"""
-    execute_query(
-        "DELETE FROM attendance WHERE attendance_id = %s",
-        (attendance_id,),
-        commit=True
-    )
-    flash('Attendance record deleted successfully!', 'success')
+    try:
+        delete_attendance_record(attendance_id)
+    except Error:
+        flash('Failed to delete attendance record. Please try again.', 'danger')
+    else:
+        flash('Attendance record deleted successfully!', 'success')
     return redirect(url_for('admin.attendance_history'))
 
 # ============================================================================
@@ -1281,15 +1369,14 @@ def delete_attendance(attendance_id):
 @role_required('admin')
 def reports():
     """View reports"""
+    counters = get_counters()
+    
     # Fee collection report
-    fee_summary = execute_query(
-        """SELECT 
-               SUM(total_amount) as total_fees,
-               SUM(paid_amount) as collected,
-               SUM(due_amount) as pending
-           FROM fees""",
-        fetch_one=True
-    )
+    fee_summary = {
+        'total_fees': counters['total_fees'],
+        'collected': counters['collected_fees'],
+        'pending': counters['due_fees'],
+    }
     
     # Enrollment trends (last 6 months)
     enrollment_trends = execute_query(
@@ -1316,10 +1403,10 @@ def reports():
     
     # Quick Stats
     quick_stats = {
-        'total_students': execute_query("SELECT COUNT(*) as count FROM students", fetch_one=True)['count'],
-        'total_teachers': execute_query("SELECT COUNT(*) as count FROM teachers", fetch_one=True)['count'],
-        'total_courses': execute_query("SELECT COUNT(*) as count FROM courses WHERE status='active'", fetch_one=True)['count'],
-        'total_batches': execute_query("SELECT COUNT(*) as count FROM batches WHERE status IN ('ongoing', 'upcoming')", fetch_one=True)['count']
+        'total_students': counters['total_students'],
+        'total_teachers': counters['total_teachers'],
+        'total_courses': counters['active_courses'],
+        'total_batches': counters['open_batches']
     }
     
     return render_template('admin/reports.html',
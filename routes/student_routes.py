@@ -1,7 +1,16 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from auth import role_required
-from database import execute_query
-from datetime import datetime, date
+from database import execute_query, Error
+from attendance_service import SUMMARY_REPORT_COLUMNS
+from checkin_service import record_checkin
+from receipt_service import next_receipt_no
+from fee_service import settle_payment, CENT
+from results_service import student_results
+from enrollment_service import enroll_student, drop_enrollment, leave_waitlist, waitlist_position
+from dashboard_counters import adjust_counters
+from passwords import hash_password
+from datetime import date
+from decimal import Decimal, InvalidOperation
 
 student_bp = Blueprint('student', __name__, url_prefix='/student')
 
@@ -96,42 +105,18 @@ def courses():
 def checkin(batch_id):
     """Student self-check-in for today's class"""
     student_id = session.get('student_id')
-    today = date.today().isoformat()
-    
-    # Verify student is enrolled in this batch and batch is active
-    enrollment = execute_query(
-        """SELECT e.enrollment_id FROM enrollments e
-           JOIN batches b ON e.batch_id = b.batch_id
-           WHERE e.student_id = %s AND e.batch_id = %s 
-           AND e.status = 'active'
-           AND b.status IN ('upcoming', 'ongoing')
-           AND CURDATE() BETWEEN b.start_date AND b.end_date""",
-        (student_id, batch_id),
-        fetch_one=True
-    )
     
-    if not enrollment:
-        flash('You cannot check in for this batch at this time.', 'danger')
+    try:
+        result = record_checkin(student_id, batch_id)
+    except Error:
+        flash('Check-in failed. Please try again.', 'danger')
         return redirect(url_for('student.courses'))
     
-    # Check if already checked in today
-    existing = execute_query(
-        """SELECT checkin_id FROM student_checkins
-           WHERE student_id = %s AND batch_id = %s AND checkin_date = %s""",
-        (student_id, batch_id, today),
-        fetch_one=True
-    )
-    
-    if existing:
+    if result == 'ineligible':
+        flash('You cannot check in for this batch at this time.', 'danger')
+    elif result == 'duplicate':
         flash('You have already checked in for this batch today!', 'info')
     else:
-        # Record check-in
-        execute_query(
-            """INSERT INTO student_checkins (student_id, batch_id, checkin_date)
-               VALUES (%s, %s, %s)""",
-            (student_id, batch_id, today),
-            commit=True
-        )
         flash('✓ Check-in successful! You are marked as present for today.', 'success')
     
     return redirect(url_for('student.courses'))
@@ -143,56 +128,24 @@ def enroll():
     student_id = session.get('student_id')
     
     if request.method == 'POST':
-        batch_id = request.form.get('batch_id')
+        batch_id = request.form.get('batch_id', type=int)
         
-        # Check if already enrolled
-        existing = execute_query(
-            "SELECT enrollment_id FROM enrollments WHERE student_id = %s AND batch_id = %s",
-            (student_id, batch_id),
-            fetch_one=True
-        )
-        
-        if existing:
-            flash('You are already enrolled in this batch.', 'warning')
+        try:
+            result = enroll_student(student_id, batch_id)
+        except Error:
+            flash('Enrollment failed. Please try again.', 'danger')
         else:
-            # Get batch and course info
-            batch = execute_query(
-                """SELECT b.*, c.fees FROM batches b
-                   JOIN courses c ON b.course_id = c.course_id
-                   WHERE b.batch_id = %s""",
-                (batch_id,),
-                fetch_one=True
-            )
-            
-            if batch and batch['current_students'] < batch['max_students']:
-                # Create enrollment
-                enrollment_id = execute_query(
-                    """INSERT INTO enrollments (student_id, batch_id, enrollment_date, status)
-                       VALUES (%s, %s, CURDATE(), 'active')""",
-                    (student_id, batch_id),
-                    commit=True
-                )
-                
-                if enrollment_id:
-                    # Update batch student count
-                    execute_query(
-                        "UPDATE batches SET current_students = current_students + 1 WHERE batch_id = %s",
-                        (batch_id,),
-                        commit=True
-                    )
-                    
-                    # Create fee record
-                    execute_query(
-                        """INSERT INTO fees (student_id, course_id, total_amount, due_amount, payment_status)
-                           VALUES (%s, %s, %s, %s, 'pending')""",
-                        (student_id, batch['course_id'], batch['fees'], batch['fees']),
-                        commit=True
-                    )
-                    
-                    flash('Successfully enrolled in the course!', 'success')
-                    return redirect(url_for('student.courses'))
+            if result == 'enrolled':
+                flash('Successfully enrolled in the course!', 'success')
+                return redirect(url_for('student.courses'))
+            elif result == 'waitlisted':
+                position = waitlist_position(student_id, batch_id)
+                flash(f'This batch is full. You have been added to the waitlist (position {position}) '
+                      'and will be enrolled automatically when a seat opens.', 'info')
+            elif result == 'duplicate':
+                flash('You are already enrolled in or waitlisted for this batch.', 'warning')
             else:
-                flash('Batch is full or not available.', 'danger')
+                flash('Batch is not available for enrollment.', 'danger')
     
     # Get available batches
     available_batches = execute_query(
@@ -206,17 +159,44 @@ def enroll():
            LEFT JOIN teachers t ON b.teacher_id = t.teacher_id
            LEFT JOIN users u ON t.user_id = u.user_id
            WHERE b.status IN ('upcoming', 'ongoing')
-               AND b.current_students < b.max_students
                AND NOT EXISTS (
                    SELECT 1 FROM enrollments e
                    WHERE e.student_id = %s AND e.batch_id = b.batch_id
                )
+               AND NOT EXISTS (
+                   SELECT 1 FROM batch_waitlist w
+                   WHERE w.student_id = %s AND w.batch_id = b.batch_id
+               )
            ORDER BY b.start_date""",
+        (student_id, student_id),
+        fetch=True
+    )
+    
+    # Batches the student is queued for, with their place in line
+    waitlist = execute_query(
+        """SELECT w.batch_id, w.created_at, b.batch_name, b.start_date, c.course_name,
+               (SELECT COUNT(*) FROM batch_waitlist ahead
+                WHERE ahead.batch_id = w.batch_id AND ahead.waitlist_id <= w.waitlist_id) as position
+           FROM batch_waitlist w
+           JOIN batches b ON w.batch_id = b.batch_id
+           JOIN courses c ON b.course_id = c.course_id
+           WHERE w.student_id = %s
+           ORDER BY w.created_at""",
         (student_id,),
         fetch=True
     )
     
-    return render_template('student/enroll.html', batches=available_batches)
+    return render_template('student/enroll.html', batches=available_batches, waitlist=waitlist)
+
+@student_bp.route('/waitlist/<int:batch_id>/leave', methods=['POST'])
+@role_required('student')
+def leave_batch_waitlist(batch_id):
+    """Leave a batch's waitlist"""
+    if leave_waitlist(session.get('student_id'), batch_id):
+        flash('You have left the waitlist.', 'success')
+    else:
+        flash('You are not on the waitlist for this batch.', 'warning')
+    return redirect(url_for('student.enroll'))
 
 @student_bp.route('/enrollment/<int:enrollment_id>')
 @role_required('student')
@@ -300,19 +280,16 @@ def cancel_enrollment(enrollment_id):
         flash('Cannot cancel enrollment for ongoing or completed batches. Please contact administration if needed.', 'danger')
         return redirect(url_for('student.courses'))
     
-    # Update enrollment status
-    execute_query(
-        "UPDATE enrollments SET status = 'dropped' WHERE enrollment_id = %s",
-        (enrollment_id,),
-        commit=True
-    )
+    # Drop the enrollment; the freed seat goes to the batch's waitlist first
+    try:
+        cancelled = drop_enrollment(enrollment_id, enrollment['batch_id'])
+    except Error:
+        flash('Cancellation failed. Please try again.', 'danger')
+        return redirect(url_for('student.courses'))
     
-    # Decrease batch student count
-    execute_query(
-        "UPDATE batches SET current_students = current_students - 1 WHERE batch_id = %s",
-        (enrollment['batch_id'],),
-        commit=True
-    )
+    if not cancelled:
+        flash('Only active enrollments can be cancelled.', 'warning')
+        return redirect(url_for('student.courses'))
     
     flash('Enrollment cancelled successfully.', 'success')
     return redirect(url_for('student.courses'))
@@ -351,22 +328,15 @@ def attendance():
     """View attendance records"""
     student_id = session.get('student_id')
     
-    # Get attendance by batch
+    # Get attendance by batch from the maintained rollup
     attendance_data = execute_query(
-        """SELECT b.batch_id, b.batch_name, c.course_name,
-               COUNT(a.attendance_id) as total_classes,
-               SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
-               SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
-               SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
-               SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
-               SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
-               ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
+        f"""SELECT b.batch_id, b.batch_name, c.course_name,
+               {SUMMARY_REPORT_COLUMNS}
            FROM enrollments e
            JOIN batches b ON e.batch_id = b.batch_id
            JOIN courses c ON b.course_id = c.course_id
-           LEFT JOIN attendance a ON a.batch_id = b.batch_id AND a.student_id = e.student_id
+           LEFT JOIN attendance_summary sm ON sm.batch_id = e.batch_id AND sm.student_id = e.student_id
            WHERE e.student_id = %s AND e.status = 'active'
-           GROUP BY b.batch_id
            ORDER BY b.batch_name""",
         (student_id,),
         fetch=True
@@ -395,30 +365,12 @@ def results():
     """View exam results"""
     student_id = session.get('student_id')
     
-    # Get all exam results
-    exam_results = execute_query(
-        """SELECT er.*, e.exam_name, e.exam_type, e.exam_date, e.total_marks,
-               b.batch_name, c.course_name
-           FROM exam_results er
-           JOIN exams e ON er.exam_id = e.exam_id
-           JOIN batches b ON e.batch_id = b.batch_id
-           JOIN courses c ON b.course_id = c.course_id
-           WHERE er.student_id = %s
-           ORDER BY e.exam_date DESC""",
-        (student_id,),
-        fetch=True
-    )
-    
-    # Calculate average performance
-    if exam_results:
-        total_percentage = sum((r['marks_obtained'] / r['total_marks']) * 100 for r in exam_results)
-        avg_percentage = total_percentage / len(exam_results)
-    else:
-        avg_percentage = 0
+    # Precomputed when marks are saved; built once per worker on a miss
+    snapshot = student_results(student_id) or {'exam_results': [], 'avg_percentage': 0}
     
     return render_template('student/results.html',
-                         exam_results=exam_results,
-                         avg_percentage=avg_percentage)
+                         exam_results=snapshot['exam_results'],
+                         avg_percentage=snapshot['avg_percentage'])
 
 @student_bp.route('/certificates')
 @role_required('student')
@@ -500,10 +452,11 @@ def pay_fee(fee_id):
                 return render_template('student/pay_fee.html', fee=fee)
             
             try:
-                amount = float(amount_str)
-                # Round to 2 decimal places for currency
-                amount = round(amount, 2)
-            except ValueError:
+                # Decimal, rounded to paise, so amounts match the DECIMAL columns exactly
+                amount = Decimal(amount_str).quantize(CENT)
+                if not amount.is_finite():
+                    raise InvalidOperation
+            except InvalidOperation:
                 flash('Invalid amount format. Please enter a valid number.', 'danger')
                 return render_template('student/pay_fee.html', fee=fee)
             
@@ -529,92 +482,33 @@ def pay_fee(fee_id):
             if transaction_ref and len(transaction_ref) > 100:
                 transaction_ref = transaction_ref[:100]  # Truncate if too long
             
-            # Generate unique receipt number
-            import random
-            import time
-            max_attempts = 5
-            receipt_no = None
-            
-            for attempt in range(max_attempts):
-                # Generate receipt with timestamp component for better uniqueness
-                timestamp = int(time.time() * 1000) % 1000000
-                random_num = random.randint(1000, 9999)
-                receipt_no = f"RCP{datetime.now().year}{timestamp}{random_num}"
-                
-                # Check if receipt number already exists
-                existing = execute_query(
-                    "SELECT transaction_id FROM fee_transactions WHERE receipt_no = %s",
-                    (receipt_no,),
-                    fetch_one=True
-                )
-                
-                if not existing:
-                    break  # Unique receipt number found
-                
-                if attempt == max_attempts - 1:
-                    flash('Unable to generate receipt number. Please try again.', 'danger')
-                    return render_template('student/pay_fee.html', fee=fee)
-            
-            # Record payment transaction
-            transaction_id = execute_query(
-                """INSERT INTO fee_transactions (fee_id, amount, payment_date, payment_method,
-                   transaction_ref, receipt_no, received_by)
-                   VALUES (%s, %s, CURDATE(), %s, %s, %s, %s)""",
-                (fee_id, amount, payment_method, transaction_ref or None, receipt_no, session.get('user_id')),
-                commit=True
-            )
+            # Receipt numbers come from this worker's reserved block
+            try:
+                receipt_no = next_receipt_no()
+            except Error:
+                flash('Unable to generate receipt number. Please try again.', 'danger')
+                return render_template('student/pay_fee.html', fee=fee)
             
-            # Check if transaction was created (None means error, >= 0 means success)
-            if transaction_id is not None:
-                # Transaction recorded successfully, continue to update fees
-                pass
-            else:
+            # Record the transaction and apply it to the locked fee row as one unit of work
+            try:
+                result = settle_payment(fee_id, student_id, amount, payment_method, transaction_ref or None,
+                                        receipt_no, session.get('user_id'))
+            except Error:
                 flash('Failed to record payment transaction. Please try again.', 'danger')
                 return render_template('student/pay_fee.html', fee=fee)
             
-            # IMPORTANT: Manual fee update as failsafe
-            # While we have a database trigger 'update_fees_on_payment', it may not fire in all configurations
-            # This manual update ensures fees are always synchronized with transactions
-            
-            # Calculate total paid from ALL transactions for this fee
-            total_paid_result = execute_query(
-                "SELECT COALESCE(SUM(amount), 0) as total FROM fee_transactions WHERE fee_id = %s",
-                (fee_id,),
-                fetch_one=True
-            )
-            
-            new_paid = round(float(total_paid_result['total']), 2)
-            new_due = round(float(fee['total_amount']) - new_paid, 2)
+            if result is None:
+                # Another payment on this fee landed first
+                flash('The due amount has changed. Please review it and try again.', 'warning')
+                return redirect(url_for('student.pay_fee', fee_id=fee_id))
             
-            # Ensure due amount is not negative (handle floating point precision)
-            if new_due < 0.01:
-                new_due = 0.00
-            
-            # Determine payment status
-            if new_due == 0:
-                new_status = 'paid'
-            elif new_paid > 0:
-                new_status = 'partial'
-            else:
-                new_status = 'pending'
-            
-            # Update fee record
-            fee_updated = execute_query(
-                """UPDATE fees SET paid_amount = %s, due_amount = %s,
-                   payment_status = %s, updated_at = CURRENT_TIMESTAMP 
-                   WHERE fee_id = %s""",
-                (new_paid, new_due, new_status, fee_id),
-                commit=True
-            )
-            
-            # Check if fee was updated (None means error, >= 0 means success)
-            if fee_updated is not None:
-                # Success! Fee updated successfully
-                pass
-            else:
-                # Fee update failed - this is serious, but transaction was recorded
-                flash('Payment recorded but fee status update failed. Please contact administration.', 'warning')
-                return redirect(url_for('student.fees'))
+            before, after = result
+            old_pending = before['due_amount'] if before['payment_status'] in ('pending', 'partial', 'overdue') else 0
+            adjust_counters({
+                'collected_fees': after['paid_amount'] - before['paid_amount'],
+                'due_fees': after['due_amount'] - before['due_amount'],
+                'pending_fees': after['due_amount'] - old_pending,
+            })
             
             # Success message
 
@@ -717,7 +611,6 @@ def profile():
 @role_required('student')
 def edit_profile():
     """Edit student profile - limited fields only"""
-    import bcrypt
     student_id = session.get('student_id')
     
     student_info = execute_query(
@@ -753,7 +646,7 @@ def edit_profile():
         
         # Update password if provided
         if new_password:
-            password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            password_hash = hash_password(new_password)
             execute_query(
                 "UPDATE users SET password_hash = %s WHERE user_id = %s",
                 (password_hash, student_info['user_id']),
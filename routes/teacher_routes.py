@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 from auth import role_required
-from database import execute_query
+from database import execute_query, Error
+from attendance_service import save_attendance, SUMMARY_REPORT_COLUMNS
+from results_service import parse_marks, not_enrolled, save_exam_results
+from exam_stats import exam_statistics, batch_trends, invalidate_exam_stats
 from datetime import datetime, date
 import re
 import os
@@ -181,39 +184,24 @@ def attendance():
             flash('Cannot mark attendance for future dates! Please select today or a past date.', 'danger')
             return redirect(url_for('teacher.attendance', batch_id=batch_id, date=attendance_date))
         
-        # Process attendance for each student
+        # Collect the whole sheet and write it in one statement
+        rows = []
         for student_id in student_ids:
             status = request.form.get(f'status_{student_id}')
             remarks = request.form.get(f'remarks_{student_id}', '').strip()
             
             # Only save if status is selected (not unmarked)
             if status and status != 'unmarked':
-                # Check if attendance already exists
-                existing = execute_query(
-                    """SELECT attendance_id FROM attendance
-                       WHERE batch_id = %s AND student_id = %s AND attendance_date = %s""",
-                    (batch_id, student_id, attendance_date),
-                    fetch_one=True
-                )
-                
-                if existing:
-                    # Update existing
-                    execute_query(
-                        """UPDATE attendance SET status = %s, marked_by = %s, remarks = %s
-                           WHERE attendance_id = %s""",
-                        (status, session.get('user_id'), remarks if remarks else None, existing['attendance_id']),
-                        commit=True
-                    )
-                else:
-                    # Insert new
-                    execute_query(
-                        """INSERT INTO attendance (batch_id, student_id, attendance_date, status, marked_by, remarks)
-                           VALUES (%s, %s, %s, %s, %s, %s)""",
-                        (batch_id, student_id, attendance_date, status, session.get('user_id'), remarks if remarks else None),
-                        commit=True
-                    )
+                rows.append((batch_id, student_id, attendance_date, status, remarks))
         
-        flash('Attendance marked successfully!', 'success')
+        try:
+            result = save_attendance('student', rows, session.get('user_id'))
+        except Error:
+            flash('Failed to save attendance. Please try again.', 'danger')
+        else:
+            flash(f'Attendance marked successfully! ({result["inserted"]} added, {result["updated"]} updated)', 'success')
+            if result['skipped']:
+                flash(f'{result["skipped"]} row(s) had an invalid id and were not saved.', 'warning')
         return redirect(url_for('teacher.attendance', batch_id=batch_id, date=attendance_date))
     
     # Get teacher's batches for dropdown
@@ -224,7 +212,8 @@ def attendance():
            WHERE b.teacher_id = %s AND b.status IN ('upcoming', 'ongoing')
            ORDER BY b.batch_name""",
         (teacher_id,),
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     # If batch selected, get students and batch details
@@ -305,7 +294,8 @@ def attendance_reports():
            WHERE b.teacher_id = %s
            ORDER BY b.batch_name""",
         (teacher_id,),
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     # Build attendance summary query
@@ -324,41 +314,57 @@ def attendance_reports():
         )
         
         if batch_details:
-            # Get attendance summary for the batch
-            query = """
-                SELECT 
-                    s.student_id,
-                    s.enrollment_no,
-                    u.full_name,
-                    COUNT(a.attendance_id) as total_classes,
-                    SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
-                    SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
-                    SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
-                    SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
-                    SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
-                    ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
-                FROM enrollments e
-                JOIN students s ON e.student_id = s.student_id
-                JOIN users u ON s.user_id = u.user_id
-                LEFT JOIN attendance a ON a.student_id = s.student_id AND a.batch_id = e.batch_id
-            """
-            
-            params = [batch_id]
-            query += " WHERE e.batch_id = %s AND e.status = 'active'"
-            
-            if date_from and date_to:
-                query += " AND a.attendance_date BETWEEN %s AND %s"
-                params.extend([date_from, date_to])
-            elif date_from:
-                query += " AND a.attendance_date >= %s"
-                params.append(date_from)
-            elif date_to:
-                query += " AND a.attendance_date <= %s"
-                params.append(date_to)
-            
-            query += " GROUP BY s.student_id, s.enrollment_no, u.full_name ORDER BY u.full_name"
+            if date_from or date_to:
+                # Date-limited reports aggregate the raw attendance rows in range
+                query = """
+                    SELECT 
+                        s.student_id,
+                        s.enrollment_no,
+                        u.full_name,
+                        COUNT(a.attendance_id) as total_classes,
+                        SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) as attended,
+                        SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present_count,
+                        SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
+                        SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late_count,
+                        SUM(CASE WHEN a.status = 'excused' THEN 1 ELSE 0 END) as excused_count,
+                        ROUND(SUM(CASE WHEN a.status IN ('present', 'late') THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(a.attendance_id), 0), 2) as attendance_percentage
+                    FROM enrollments e
+                    JOIN students s ON e.student_id = s.student_id
+                    JOIN users u ON s.user_id = u.user_id
+                    LEFT JOIN attendance a ON a.student_id = s.student_id AND a.batch_id = e.batch_id
+                """
+                
+                params = [batch_id]
+                query += " WHERE e.batch_id = %s AND e.status = 'active'"
+                
+                if date_from and date_to:
+                    query += " AND a.attendance_date BETWEEN %s AND %s"
+                    params.extend([date_from, date_to])
+                elif date_from:
+                    query += " AND a.attendance_date >= %s"
+                    params.append(date_from)
+                elif date_to:
+                    query += " AND a.attendance_date <= %s"
+                    params.append(date_to)
+                
+                query += " GROUP BY s.student_id, s.enrollment_no, u.full_name ORDER BY u.full_name"
+                
+                attendance_summary = execute_query(query, tuple(params), fetch=True)
             
-            attendance_summary = execute_query(query, tuple(params), fetch=True)
+            else:
+                # Whole-batch reports read the maintained rollup
+                attendance_summary = execute_query(
+                    f"""SELECT s.student_id, s.enrollment_no, u.full_name,
+                           {SUMMARY_REPORT_COLUMNS}
+                       FROM enrollments e
+                       JOIN students s ON e.student_id = s.student_id
+                       JOIN users u ON s.user_id = u.user_id
+                       LEFT JOIN attendance_summary sm ON sm.batch_id = e.batch_id AND sm.student_id = e.student_id
+                       WHERE e.batch_id = %s AND e.status = 'active'
+                       ORDER BY u.full_name""",
+                    (batch_id,),
+                    fetch=True
+                )
             
             # Identify low attendance students (< 60%)
             low_attendance_students = [
@@ -648,6 +654,7 @@ def exams():
                  duration_minutes, description, session.get('user_id')),
                 commit=True
             )
+            invalidate_exam_stats(batch_id)
             
             flash('Exam created successfully!', 'success')
         
@@ -656,56 +663,39 @@ def exams():
             student_ids = request.form.getlist('student_ids')
             marks_list = request.form.getlist('marks')
             
-            # Get exam details for pass/fail calculation
+            # Only exams in the teacher's own batches
             exam = execute_query(
-                "SELECT total_marks, passing_marks FROM exams WHERE exam_id = %s",
-                (exam_id,),
+                """SELECT e.exam_id, e.batch_id, e.total_marks, e.passing_marks FROM exams e
+                   JOIN batches b ON e.batch_id = b.batch_id
+                   WHERE e.exam_id = %s AND b.teacher_id = %s""",
+                (exam_id, teacher_id),
                 fetch_one=True
             )
             
-            for i, student_id in enumerate(student_ids):
-                if i < len(marks_list) and marks_list[i]:
-                    marks = int(marks_list[i])
-                    result_status = 'pass' if marks >= exam['passing_marks'] else 'fail'
-                    
-                    # Calculate grade
-                    percentage = (marks / exam['total_marks']) * 100
-                    if percentage >= 90:
-                        grade = 'A+'
-                    elif percentage >= 80:
-                        grade = 'A'
-                    elif percentage >= 70:
-                        grade = 'B+'
-                    elif percentage >= 60:
-                        grade = 'B'
-                    elif percentage >= 50:
-                        grade = 'C'
-                    else:
-                        grade = 'F'
-                    
-                    # Insert or update result
-                    existing = execute_query(
-                        "SELECT result_id FROM exam_results WHERE exam_id = %s AND student_id = %s",
-                        (exam_id, student_id),
-                        fetch_one=True
-                    )
-                    
-                    if existing:
-                        execute_query(
-                            """UPDATE exam_results SET marks_obtained = %s, grade = %s,
-                               result_status = %s, entered_by = %s
-                               WHERE result_id = %s""",
-                            (marks, grade, result_status, session.get('user_id'), existing['result_id']),
-                            commit=True
-                        )
-                    else:
-                        execute_query(
-                            """INSERT INTO exam_results (exam_id, student_id, marks_obtained,
-                               grade, result_status, entered_by)
-                               VALUES (%s, %s, %s, %s, %s, %s)""",
-                            (exam_id, student_id, marks, grade, result_status, session.get('user_id')),
-                            commit=True
-                        )
+            if not exam:
+                flash('Exam not found.', 'danger')
+                return redirect(url_for('teacher.exams'))
+            
+            entries, errors = parse_marks(student_ids, marks_list, exam['total_marks'])
+            if errors:
+                flash(f'Marks must be whole numbers between 0 and {exam["total_marks"]} for listed students '
+                      f'(invalid: {", ".join(errors[:5])}). Nothing was saved.', 'danger')
+                return redirect(url_for('teacher.enter_marks', exam_id=exam_id))
+            
+            # Marks may only be entered for students actively enrolled in the exam's batch
+            outsiders = not_enrolled(exam['batch_id'], list(entries))
+            if outsiders is None:
+                flash('Failed to save marks. Please try again.', 'danger')
+                return redirect(url_for('teacher.enter_marks', exam_id=exam_id))
+            if outsiders:
+                flash(f'{len(outsiders)} student(s) are not actively enrolled in this batch. '
+                      f'Nothing was saved.', 'danger')
+                return redirect(url_for('teacher.enter_marks', exam_id=exam_id))
+            
+            # Grade every student at once and write them in one statement
+            if save_exam_results(exam, entries, session.get('user_id')) is None:
+                flash('Failed to save marks. Please try again.', 'danger')
+                return redirect(url_for('teacher.enter_marks', exam_id=exam_id))
             
             flash('Marks entered successfully!', 'success')
         
@@ -719,7 +709,8 @@ def exams():
            WHERE b.teacher_id = %s
            ORDER BY b.batch_name""",
         (teacher_id,),
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     # Get all exams for teacher's batches
@@ -769,4 +760,6 @@ def enter_marks(exam_id):
         fetch=True
     )
     
-    return render_template('teacher/enter_marks.html', exam=exam, students=students)
+    return render_template('teacher/enter_marks.html', exam=exam, students=students,
+                         stats=exam_statistics(exam_id),
+                         trends=batch_trends(exam['batch_id']))
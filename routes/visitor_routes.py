@@ -1,11 +1,17 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
 from database import execute_query
+from cache import visitor_cache, cached_page, conditional_get
 
 visitor_bp = Blueprint('visitor', __name__)
 
 @visitor_bp.route('/')
+@cached_page(visitor_cache)
 def home():
     """Homepage for visitors"""
+    data = visitor_cache.get_or_set('data:home', _load_home)
+    return render_template('visitor/home.html', **data)
+
+def _load_home():
     # Get featured courses
     featured_courses = execute_query(
         """SELECT * FROM courses
@@ -35,19 +41,67 @@ def home():
         'total_teachers': execute_query("SELECT COUNT(*) as count FROM teachers", fetch_one=True)['count']
     }
     
-    return render_template('visitor/home.html',
-                         featured_courses=featured_courses,
-                         upcoming_batches=upcoming_batches,
-                         stats=stats)
+    return {
+        'featured_courses': featured_courses,
+        'upcoming_batches': upcoming_batches,
+        'stats': stats,
+    }
 
 @visitor_bp.route('/about')
 def about():
     """About page"""
     return render_template('visitor/about.html')
 
+def catalog_version(course_id=None):
+    """
+    Version token for the course catalog (or one course) and its batches
+
+    Built from MAX(updated_at) and row counts of courses and batches; the
+    counts catch deletes, which do not move MAX(updated_at).
+    """
+    def load():
+        where = "WHERE course_id = %s" if course_id else ""
+        params = (course_id, course_id) if course_id else None
+        return execute_query(
+            f"""SELECT (SELECT MAX(updated_at) FROM courses {where}) as courses_updated,
+                   (SELECT COUNT(*) FROM courses {where}) as courses_count,
+                   (SELECT MAX(updated_at) FROM batches {where}) as batches_updated,
+                   (SELECT COUNT(*) FROM batches {where}) as batches_count""",
+            params,
+            fetch_one=True
+        )
+    
+    # Ids that match no course are not cached, so probing ids cannot fill the cache
+    row = visitor_cache.get_or_set(f'version:{course_id or "catalog"}', load,
+                                   should_store=lambda row: row is not None and (not course_id or row['courses_count']))
+    if not row:
+        return None, None
+    
+    token = f"{row['courses_updated']}|{row['courses_count']}|{row['batches_updated']}|{row['batches_count']}"
+    last_modified = max((ts for ts in (row['courses_updated'], row['batches_updated']) if ts), default=None)
+    return token, last_modified
+
 @visitor_bp.route('/courses')
+@conditional_get(catalog_version)
+@cached_page(visitor_cache)
 def courses():
     """Course catalog"""
+    all_courses = visitor_cache.get_or_set('data:courses', _load_courses,
+                                           should_store=lambda rows: rows is not None) or []
+    
+    # Group by category
+    categories = {}
+    for course in all_courses:
+        cat = course['category'] or 'Other'
+        if cat not in categories:
+            categories[cat] = []
+        categories[cat].append(course)
+    
+    return render_template('visitor/courses.html',
+                         courses=all_courses,
+                         categories=categories)
+
+def _load_courses():
     # Get all active courses
     all_courses = execute_query(
         """SELECT c.*,
@@ -61,22 +115,29 @@ def courses():
            ORDER BY c.course_name""",
         fetch=True
     )
-    
-    # Group by category
-    categories = {}
-    for course in all_courses:
-        cat = course['category'] or 'Other'
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(course)
-    
-    return render_template('visitor/courses.html',
-                         courses=all_courses,
-                         categories=categories)
+    return all_courses
 
 @visitor_bp.route('/course/<int:course_id>')
+@conditional_get(catalog_version)
+@cached_page(visitor_cache)
 def course_detail(course_id):
     """Course detail page"""
+    course, batches = _course_data(course_id)
+    
+    if not course:
+        flash('Course not found.', 'danger')
+        return redirect(url_for('visitor.courses'))
+    
+    return render_template('visitor/course_detail.html',
+                         course=course,
+                         batches=batches)
+
+def _course_data(course_id):
+    """Cached (course, open batches); unknown courses and database errors are not cached"""
+    return visitor_cache.get_or_set(f'data:course:{course_id}', lambda: _load_course(course_id),
+                                    should_store=lambda data: data[0] is not None and data[1] is not None)
+
+def _load_course(course_id):
     course = execute_query(
         "SELECT * FROM courses WHERE course_id = %s AND status = 'active'",
         (course_id,),
@@ -84,8 +145,7 @@ def course_detail(course_id):
     )
     
     if not course:
-        flash('Course not found.', 'danger')
-        return redirect(url_for('visitor.courses'))
+        return None, []
     
     # Get available batches for this course
     batches = execute_query(
@@ -101,10 +161,26 @@ def course_detail(course_id):
         (course_id,),
         fetch=True
     )
-    
-    return render_template('visitor/course_detail.html',
-                         course=course,
-                         batches=batches)
+    return course, batches
+
+@visitor_bp.route('/api/courses')
+@conditional_get(catalog_version)
+def courses_json():
+    """Course catalog as JSON"""
+    all_courses = visitor_cache.get_or_set('data:courses', _load_courses,
+                                           should_store=lambda rows: rows is not None)
+    if all_courses is None:
+        return jsonify({'error': 'Course catalog is unavailable'}), 503
+    return jsonify({'courses': all_courses})
+
+@visitor_bp.route('/api/course/<int:course_id>')
+@conditional_get(catalog_version)
+def course_detail_json(course_id):
+    """Course detail with open batches as JSON"""
+    course, batches = _course_data(course_id)
+    if not course:
+        return jsonify({'error': 'Course not found'}), 404
+    return jsonify({'course': course, 'batches': batches or []})
 
 @visitor_bp.route('/contact', methods=['GET', 'POST'])
 def contact():
@@ -153,7 +229,8 @@ def enquiry():
     # Get courses for dropdown
     courses = execute_query(
         "SELECT course_id, course_name FROM courses WHERE status = 'active'",
-        fetch=True
+        fetch=True,
+        cached=True
     )
     
     return render_template('visitor/enquiry.html', courses=courses)
@@ -0,0 +1,82 @@
+// Typeahead inputs: <input data-typeahead-url="..." data-typeahead-target="hidden input name">
+// Matches come from the admin lookup endpoints; picking one fills the hidden id field.
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-typeahead-url]').forEach(input => {
+        const form = input.form;
+        const hidden = form.querySelector(`input[name="${input.dataset.typeaheadTarget}"]`);
+        const menu = document.createElement('ul');
+        menu.className = 'typeahead-menu';
+        input.parentNode.style.position = 'relative';
+        input.parentNode.appendChild(menu);
+
+        let timer = null;
+        let lastQuery = null;
+
+        function close() {
+            menu.innerHTML = '';
+            menu.style.display = 'none';
+        }
+
+        function choose(item) {
+            input.value = item ? item.label : '';
+            hidden.value = item ? item.id : '';
+            close();
+            if (input.dataset.typeaheadSubmit !== undefined) {
+                form.submit();
+            }
+        }
+
+        function render(results) {
+            menu.innerHTML = '';
+            results.forEach(item => {
+                const option = document.createElement('li');
+                option.textContent = item.label;
+                option.addEventListener('mousedown', e => {
+                    e.preventDefault();
+                    choose(item);
+                });
+                menu.appendChild(option);
+            });
+            menu.style.display = results.length ? 'block' : 'none';
+        }
+
+        input.addEventListener('input', function () {
+            const query = input.value.trim();
+            clearTimeout(timer);
+            if (!query) {
+                // Clearing the text clears the selection
+                if (hidden.value) {
+                    choose(null);
+                }
+                close();
+                return;
+            }
+            timer = setTimeout(() => {
+                if (query === lastQuery) {
+                    return;
+                }
+                lastQuery = query;
+                fetch(`${input.dataset.typeaheadUrl}?q=${encodeURIComponent(query)}`)
+                    .then(response => response.ok ? response.json() : { results: [] })
+                    .then(data => {
+                        if (input.value.trim() === query) {
+                            render(data.results);
+                        }
+                    })
+                    .catch(close);
+            }, 150);
+        });
+
+        input.addEventListener('keydown', function (e) {
+            if (e.key === 'Enter' && menu.firstChild) {
+                e.preventDefault();
+                menu.firstChild.dispatchEvent(new MouseEvent('mousedown'));
+            } else if (e.key === 'Escape') {
+                close();
+            }
+        });
+
+        input.addEventListener('blur', () => setTimeout(close, 100));
+    });
+});
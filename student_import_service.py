@@ -0,0 +1,350 @@
+from database import execute_query, execute_many, transaction, Error
+from passwords import hash_passwords
+from dashboard_counters import refresh_counters
+from typeahead import invalidate_lookups
+from collections import OrderedDict
+from config import Config
+from datetime import date, datetime
+import csv
+import logging
+import os
+import re
+import threading
+import uuid
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('username', 'email', 'password', 'full_name')
+OPTIONAL_COLUMNS = ('dob', 'gender', 'contact', 'address', 'guardian_name',
+                    'guardian_contact', 'guardian_email', 'admission_date')
+ALLOWED_EXTENSIONS = ('csv', 'xlsx')
+
+EMAIL_PATTERN = re.compile(r'^[\w\.-]+@[\w\.-]+\.\w+$')
+CONTACT_PATTERN = re.compile(r'^\d{10}$')
+
+_INSERT_USERS = """INSERT INTO users (username, email, password_hash, role, full_name, status)
+                   VALUES (%s, %s, %s, 'student', %s, 'active')"""
+_INSERT_STUDENTS = """INSERT INTO students (user_id, enrollment_no, dob, gender, contact, address,
+                      guardian_name, guardian_contact, guardian_email, admission_date)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+class ImportFileError(ValueError):
+    """The uploaded file cannot be read as a student list"""
+
+class ImportReport:
+    """Progress and per-row errors of one import; read by the status page while it runs"""
+
+    def __init__(self, filename=None, expected=None):
+        self.filename = filename
+        self.expected = expected
+        self.processed = 0
+        self.imported = 0
+        self.errors = []
+        self.failure = None
+        self.finished = False
+        self.started_at = datetime.now()
+
+    def add_error(self, line, username, message):
+        self.errors.append({'line': line, 'username': username, 'message': message})
+
+    @property
+    def percent(self):
+        if self.finished:
+            return 100
+        if not self.expected:
+            return 0
+        return min(99, self.processed * 100 // self.expected)
+
+def _cell(value):
+    """Spreadsheet cell as the text a CSV would hold"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _header(names):
+    columns = [str(name or '').strip().lower().replace(' ', '_') for name in names]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+    return columns
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.reader(handle)
+        try:
+            columns = _header(next(reader, []))
+            for values in reader:
+                if any(value.strip() for value in values):
+                    yield reader.line_num, dict(zip(columns, values))
+        except UnicodeDecodeError:
+            raise ImportFileError("The CSV is not UTF-8 text; save it as \"CSV UTF-8\" and upload again")
+
+def _xlsx_rows(path):
+    if openpyxl is None:
+        raise ImportFileError("Reading .xlsx files needs openpyxl (pip install openpyxl); upload a CSV instead")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = _header(next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            values = [_cell(value) for value in values]
+            if any(value.strip() for value in values):
+                yield line, dict(zip(columns, values))
+    finally:
+        workbook.close()
+
+def read_rows(path):
+    """
+    Stream (line_number, row dict) pairs from a CSV or XLSX file
+
+    The first row holds the column names (case and spaces ignored); blank
+    rows are skipped. Raises ImportFileError for other file types, missing
+    required columns or .xlsx without openpyxl installed.
+    """
+    extension = path.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return _csv_rows(path)
+    if extension == 'xlsx':
+        return _xlsx_rows(path)
+    raise ImportFileError("Upload a .csv or .xlsx file")
+
+def count_rows(path):
+    """Rough number of data rows, for the progress bar"""
+    try:
+        if path.lower().endswith('.xlsx'):
+            if openpyxl is None:
+                return None
+            workbook = openpyxl.load_workbook(path, read_only=True)
+            try:
+                return max((workbook.active.max_row or 1) - 1, 0)
+            finally:
+                workbook.close()
+        with open(path, 'rb') as handle:
+            return max(sum(1 for line in handle if line.strip()) - 1, 0)
+    except Exception:
+        return None
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{field} must be YYYY-MM-DD")
+
+def validate_row(row):
+    """
+    Clean one row with the same rules as registration
+
+    Returns:
+        Dict of cleaned values; raises ValueError with the reason otherwise
+    """
+    cleaned = {column: (row.get(column) or '').strip() for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    cleaned['password'] = row.get('password') or ''
+    cleaned['gender'] = cleaned['gender'].lower()
+
+    if not 3 <= len(cleaned['username']) <= 50:
+        raise ValueError("Username must be 3-50 characters long")
+    if len(cleaned['email']) > 100 or not EMAIL_PATTERN.match(cleaned['email']):
+        raise ValueError("Invalid email address")
+    if len(cleaned['password']) < 6:
+        raise ValueError("Password must be at least 6 characters long")
+    if not cleaned['full_name'] or len(cleaned['full_name']) > 100:
+        raise ValueError("Full name is required (up to 100 characters)")
+    for field in ('contact', 'guardian_contact'):
+        if cleaned[field] and not CONTACT_PATTERN.match(cleaned[field]):
+            raise ValueError(f"{field} must be a 10-digit number")
+    if cleaned['guardian_email'] and not EMAIL_PATTERN.match(cleaned['guardian_email']):
+        raise ValueError("Invalid guardian_email")
+    if cleaned['gender'] not in ('', 'male', 'female', 'other'):
+        raise ValueError("gender must be male, female or other")
+
+    cleaned['dob'] = _parse_date(cleaned['dob'], 'dob') if cleaned['dob'] else None
+    cleaned['admission_date'] = (_parse_date(cleaned['admission_date'], 'admission_date')
+                                 if cleaned['admission_date'] else date.today())
+    return cleaned
+
+def _existing_accounts(rows):
+    """Lower-cased usernames and emails of rows that already exist, from one query"""
+    if not rows:
+        return set(), set()
+    usernames = [row['username'] for row in rows]
+    emails = [row['email'] for row in rows]
+    found = execute_query(
+        f"""SELECT username, email FROM users
+            WHERE username IN ({", ".join(["%s"] * len(usernames))})
+               OR email IN ({", ".join(["%s"] * len(emails))})""",
+        tuple(usernames + emails),
+        fetch=True
+    )
+    if found is None:
+        raise Error("Could not check for existing users")
+    return ({row['username'].lower() for row in found}, {row['email'].lower() for row in found})
+
+def _drop_existing(rows, report):
+    usernames, emails = _existing_accounts(rows)
+    fresh = []
+    for row in rows:
+        if row['username'].lower() in usernames:
+            report.add_error(row['line'], row['username'], "Username already exists")
+        elif row['email'].lower() in emails:
+            report.add_error(row['line'], row['username'], "Email already exists")
+        else:
+            fresh.append(row)
+    return fresh
+
+def _insert_chunk(rows):
+    """Insert users and their student records for one chunk in a single transaction"""
+    year = datetime.now().year
+    with transaction():
+        execute_many(_INSERT_USERS, [
+            (row['username'], row['email'], row['password_hash'], row['full_name']) for row in rows
+        ])
+        user_ids = execute_query(
+            f"SELECT user_id, username FROM users WHERE username IN ({', '.join(['%s'] * len(rows))})",
+            tuple(row['username'] for row in rows),
+            fetch=True
+        )
+        user_ids = {user['username'].lower(): user['user_id'] for user in user_ids}
+        execute_many(_INSERT_STUDENTS, [
+            (user_ids[row['username'].lower()], f"DSH{year}{user_ids[row['username'].lower()]:05d}",
+             row['dob'], row['gender'] or None, row['contact'], row['address'], row['guardian_name'],
+             row['guardian_contact'], row['guardian_email'], row['admission_date'])
+            for row in rows
+        ])
+
+def _save_chunk(rows, report):
+    """Check, hash and insert one chunk of valid rows, recording what failed"""
+    try:
+        rows = _drop_existing(rows, report)
+        if not rows:
+            return
+        for row, password_hash in zip(rows, hash_passwords([row['password'] for row in rows])):
+            row['password_hash'] = password_hash
+        try:
+            _insert_chunk(rows)
+        except Error as e:
+            if getattr(e, 'errno', None) != 1062:
+                raise
+            # Someone registered one of these accounts since the check: check again
+            rows = _drop_existing(rows, report)
+            if rows:
+                _insert_chunk(rows)
+        report.imported += len(rows)
+    except Error as e:
+        logger.error(f"Student import chunk failed: {e}")
+        for row in rows:
+            report.add_error(row['line'], row['username'], "Database error, row not imported")
+
+def import_students(rows, report=None, progress=None):
+    """
+    Create student accounts from (line_number, row dict) pairs, e.g. read_rows()
+
+    Rows are validated as they stream in and handled in chunks of
+    Config.STUDENT_IMPORT_CHUNK_SIZE: existing usernames/emails are found
+    with one query per chunk, passwords are hashed across the password
+    worker pool, and users plus students go in with two execute_many calls
+    in one transaction per chunk. Enrollment numbers follow registration
+    (DSH<year><user_id>). Duplicates inside the file keep the first row.
+
+    Args:
+        report: ImportReport to fill in (a new one by default)
+        progress: Optional callable(report) called after each chunk
+
+    Returns:
+        The ImportReport
+    """
+    report = report or ImportReport()
+    seen_usernames = set()
+    seen_emails = set()
+    chunk = []
+
+    def flush():
+        if chunk:
+            _save_chunk(chunk, report)
+            chunk.clear()
+        if progress:
+            progress(report)
+
+    for line, row in rows:
+        report.processed += 1
+        try:
+            cleaned = validate_row(row)
+        except ValueError as e:
+            report.add_error(line, (row.get('username') or '').strip(), str(e))
+            continue
+
+        username, email = cleaned['username'].lower(), cleaned['email'].lower()
+        if username in seen_usernames:
+            report.add_error(line, cleaned['username'], "Username repeated in the file")
+            continue
+        if email in seen_emails:
+            report.add_error(line, cleaned['username'], "Email repeated in the file")
+            continue
+        seen_usernames.add(username)
+        seen_emails.add(email)
+
+        cleaned['line'] = line
+        chunk.append(cleaned)
+        if len(chunk) >= Config.STUDENT_IMPORT_CHUNK_SIZE:
+            flush()
+    flush()
+
+    if report.imported:
+        refresh_counters('students')
+        invalidate_lookups('students')
+    return report
+
+# Background imports started from the admin pages, newest last. Kept per
+# worker process, so the status page must be served by the same worker.
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+MAX_KEPT_JOBS = 20
+
+def _run_job(report, path):
+    try:
+        import_students(read_rows(path), report)
+    except ImportFileError as e:
+        report.failure = str(e)
+    except Exception as e:
+        logger.exception("Student import failed")
+        report.failure = f"Import stopped: {e}"
+    finally:
+        report.finished = True
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def start_import(path, filename):
+    """
+    Import a saved upload on a background thread; the file is deleted afterwards
+
+    Returns:
+        Job id for get_import()
+    """
+    job_id = uuid.uuid4().hex
+    report = ImportReport(filename, count_rows(path))
+    with _jobs_lock:
+        _jobs[job_id] = report
+        while len(_jobs) > MAX_KEPT_JOBS:
+            oldest = next(iter(_jobs))
+            if not _jobs[oldest].finished:
+                break
+            _jobs.pop(oldest)
+    threading.Thread(target=_run_job, args=(report, path), name=f"student-import-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+def get_import(job_id):
+    """ImportReport of a background import, or None if unknown to this worker"""
+    with _jobs_lock:
+        return _jobs.get(job_id)
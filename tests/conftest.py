@@ -0,0 +1,121 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class FakeDB:
+    """
+    Stands in for execute_query/execute_many/transaction in a service module
+
+    Each statement goes to the first handler whose fragment it contains; a
+    handler is a value or a callable taking the params. Statements are
+    recorded (whitespace collapsed) in the order they ran.
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.statements = []
+        self.lock = threading.Lock()
+
+    def on(self, fragment, result):
+        self.handlers.append((fragment, result))
+        return self
+
+    def _handle(self, query, params):
+        sql = " ".join(query.split())
+        with self.lock:
+            self.statements.append(sql)
+        for fragment, result in self.handlers:
+            if fragment in sql:
+                return result(params) if callable(result) else result
+        raise AssertionError(f"Unexpected statement: {sql}")
+
+    def execute_query(self, query, params=None, fetch=False, fetch_one=False, commit=False, **kwargs):
+        return self._handle(query, params)
+
+    def execute_many(self, query, data_list):
+        return self._handle(query, data_list)
+
+    @contextmanager
+    def transaction(self):
+        yield None
+
+    def ran(self, fragment):
+        return [sql for sql in self.statements if fragment in sql]
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """fake_db(module, ...) patches the modules' database functions with one FakeDB"""
+    db = FakeDB()
+
+    def patch(*modules):
+        for module in modules:
+            for name in ('execute_query', 'execute_many', 'transaction'):
+                if hasattr(module, name):
+                    monkeypatch.setattr(module, name, getattr(db, name))
+        return db
+
+    return patch
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+
+def _greatest(*values):
+    # MySQL's GREATEST is NULL when any argument is NULL
+    return None if any(value is None for value in values) else max(values)
+
+class SqliteDB:
+    """
+    Runs a service's MySQL statements on an in-memory SQLite database
+
+    For the plain SQL the services share with SQLite: %s placeholders become
+    ?, FOR UPDATE is dropped, and GREATEST/CURDATE are provided. DECIMAL
+    columns come back as Decimal, as with mysql-connector.
+    """
+
+    def __init__(self, schema):
+        self.connection = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES,
+                                          check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function('GREATEST', -1, _greatest)
+        self.connection.create_function('CURDATE', 0, lambda: date.today().isoformat())
+        self.connection.executescript(schema)
+
+    def execute_query(self, query, params=None, fetch=False, fetch_one=False, commit=False, **kwargs):
+        sql = re.sub(r"\bFOR UPDATE\b", "", query).replace('%s', '?')
+        cursor = self.connection.execute(sql, params or ())
+        if fetch_one:
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        if fetch:
+            return [dict(row) for row in cursor.fetchall()]
+        # Like mysql-connector, only an INSERT reports a new row id
+        if commit and sql.lstrip().upper().startswith('INSERT') and cursor.lastrowid:
+            return cursor.lastrowid
+        return cursor.rowcount
+
+    @contextmanager
+    def transaction(self):
+        with self.connection:
+            yield self.connection
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    """sqlite_db(schema, module, ...) patches the modules onto a fresh SQLite database"""
+    def patch(schema, *modules):
+        db = SqliteDB(schema)
+        for module in modules:
+            for name in ('execute_query', 'transaction'):
+                if hasattr(module, name):
+                    monkeypatch.setattr(module, name, getattr(db, name))
+        return db
+
+    return patch
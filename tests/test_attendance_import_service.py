@@ -0,0 +1,36 @@
+from datetime import date
+
+from database import Error
+
+import attendance_import_service
+
+CHUNK = [(2, 11, date(2026, 9, 1), 'present', None), (3, 12, date(2026, 9, 1), 'absent', 'sick')]
+
+def test_deadlocked_chunk_is_retried(fake_db):
+    attempts = []
+
+    def upsert(params):
+        attempts.append(params)
+        if len(attempts) == 1:
+            raise Error(msg="Deadlock found", errno=1213)
+        return 2
+
+    fake_db(attendance_import_service).on("INSERT INTO attendance", upsert)
+    report = attendance_import_service.AttendanceImportReport()
+
+    attendance_import_service._write_chunk(4, CHUNK, 9, report)
+
+    assert len(attempts) == 2
+    assert (report.written, report.failed) == (2, 0)
+
+def test_other_errors_fail_the_chunk(fake_db):
+    def upsert(params):
+        raise Error(msg="Data too long", errno=1406)
+
+    fake_db(attendance_import_service).on("INSERT INTO attendance", upsert)
+    report = attendance_import_service.AttendanceImportReport()
+
+    attendance_import_service._write_chunk(4, CHUNK, 9, report)
+
+    assert (report.written, report.failed) == (0, 2)
+    assert report.errors[0]['line'] == 2
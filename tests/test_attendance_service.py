@@ -0,0 +1,68 @@
+from datetime import date
+
+import attendance_service
+
+def test_upsert_counts_inserted_and_updated_rows(fake_db):
+    summary = []
+    db = fake_db(attendance_service)
+    db.on("SELECT batch_id FROM batches", [{'batch_id': 4}])
+    db.on("FROM attendance WHERE", [{'batch_id': 4, 'person_id': 12, 'attendance_date': date(2026, 10, 1),
+                                     'status': 'absent'}])
+    db.on("INSERT INTO attendance (", 3)
+    db.on("INSERT INTO attendance_summary", lambda params: summary.append(params) or 1)
+
+    result = attendance_service.save_attendance('student', [
+        (4, 11, '2026-10-01', 'present', ''),
+        (4, 12, '2026-10-01', 'present', ''),
+        (4, 13, '2026-10-01', 'late', 'bus'),
+        (4, 14, '2026-10-01', 'unknown', ''),
+    ], marked_by=9)
+
+    assert result == {'inserted': 2, 'updated': 1, 'skipped': 0}
+    # Student 12 moves from absent to present without adding a class
+    assert summary == [(4, 11, 1, 1, 0, 0, 0,
+                        4, 12, 0, 1, -1, 0, 0,
+                        4, 13, 1, 0, 0, 1, 0)]
+
+def test_deadlock_is_retried_once(fake_db):
+    from database import Error
+    attempts = []
+
+    def lock_batches(params):
+        attempts.append(params)
+        if len(attempts) == 1:
+            raise Error(msg="Deadlock found", errno=1213)
+        return [{'batch_id': 4}]
+
+    db = fake_db(attendance_service)
+    db.on("SELECT batch_id FROM batches", lock_batches)
+    db.on("FROM teacher_attendance WHERE", [])
+    db.on("INSERT INTO teacher_attendance", 1)
+
+    result = attendance_service.save_attendance('teacher', [(4, 2, '2026-10-01', 'on_leave', '')], marked_by=9)
+
+    assert result == {'inserted': 1, 'updated': 0, 'skipped': 0}
+    assert len(attempts) == 2
+
+def test_non_numeric_ids_are_skipped(fake_db):
+    db = fake_db(attendance_service)
+    db.on("SELECT batch_id FROM batches", [{'batch_id': 4}])
+    db.on("FROM attendance WHERE", [])
+    db.on("INSERT INTO attendance (", 1)
+    db.on("INSERT INTO attendance_summary", 1)
+
+    result = attendance_service.save_attendance('student', [
+        (4, '11', '2026-10-01', 'present', ''),
+        (4, '11; DROP', '2026-10-01', 'present', ''),
+        ('x', '12', '2026-10-01', 'absent', ''),
+    ], marked_by=9)
+
+    assert result == {'inserted': 1, 'updated': 0, 'skipped': 2}
+
+def test_sheet_with_only_bad_ids_writes_nothing(fake_db):
+    db = fake_db(attendance_service)
+
+    result = attendance_service.save_attendance('student', [(4, 'abc', '2026-10-01', 'present', '')], marked_by=9)
+
+    assert result == {'inserted': 0, 'updated': 0, 'skipped': 1}
+    assert db.statements == []
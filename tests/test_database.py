@@ -0,0 +1,46 @@
+import pytest
+
+import database
+from database import Error
+
+class _StreamingCursor:
+    def __init__(self, batches):
+        self.batches = batches
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        batch = self.batches.pop(0)
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    def close(self):
+        pass
+
+class _Connection:
+    def __init__(self, batches):
+        self.batches = batches
+        self.closed = False
+
+    def cursor(self, **kwargs):
+        return _StreamingCursor(self.batches)
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def test_iter_query_raises_when_the_stream_breaks(monkeypatch):
+    connection = _Connection([[(1,), (2,)], Error(msg="Lost connection to MySQL server during query", errno=2013)])
+    monkeypatch.setattr(database, 'get_db_connection', lambda priority=None: connection)
+
+    rows = []
+    with pytest.raises(Error):
+        for row in database.iter_query("SELECT id FROM attendance", row_type='tuple'):
+            rows.append(row)
+
+    assert rows == [(1,), (2,)]
+    assert connection.closed
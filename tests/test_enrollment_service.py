@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+import enrollment_service
+
+BATCH = {'batch_id': 7, 'course_id': 3, 'status': 'ongoing', 'fees': 1000}
+
+@pytest.fixture
+def seats(fake_db, monkeypatch):
+    """A batch with capacity tracked like the conditional seat claim does"""
+    monkeypatch.setattr(enrollment_service, 'adjust_counters', lambda deltas: None)
+    state = {'current': 0, 'max': 1, 'enrolled': [], 'waitlist': []}
+    lock = threading.Lock()
+
+    def claim(params):
+        with lock:
+            if state['current'] >= state['max']:
+                return 0
+            state['current'] += 1
+            return 1
+
+    def enroll(params):
+        with lock:
+            state['enrolled'].append(params[0])
+        return 1
+
+    def next_waiting(params):
+        return min(state['waitlist'], default=None, key=lambda row: row['waitlist_id'])
+
+    def leave(params):
+        state['waitlist'][:] = [row for row in state['waitlist'] if row['waitlist_id'] != params[0]]
+        return 1
+
+    def wait(params):
+        with lock:
+            state['waitlist'].append({'waitlist_id': len(state['waitlist']) + 1, 'student_id': params[0]})
+        return 1
+
+    db = fake_db(enrollment_service)
+    db.on("SELECT 1 FROM enrollments", None)
+    db.on("FROM batches b JOIN courses c", dict(BATCH))
+    db.on("UPDATE batches SET current_students = current_students + 1", claim)
+    db.on("INSERT INTO enrollments", enroll)
+    db.on("INSERT INTO fees", 1)
+    db.on("INSERT INTO batch_waitlist", wait)
+    db.on("SELECT batch_id FROM batches WHERE batch_id = %s FOR UPDATE", {'batch_id': 7})
+    db.on("SELECT waitlist_id, student_id FROM batch_waitlist", next_waiting)
+    db.on("DELETE FROM batch_waitlist WHERE waitlist_id", leave)
+    return state
+
+def test_last_seat_goes_to_exactly_one_claimant(seats):
+    results = {}
+    start = threading.Barrier(2)
+
+    def claim(student_id):
+        start.wait()
+        results[student_id] = enrollment_service.enroll_student(student_id, 7)
+
+    threads = [threading.Thread(target=claim, args=(student_id,)) for student_id in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results.values()) == ['enrolled', 'waitlisted']
+    assert len(seats['enrolled']) == 1
+    assert seats['current'] == 1
+    assert len(seats['waitlist']) == 1
+
+def test_waitlist_promotion_is_first_in_first_out(seats):
+    for student_id in (1, 11, 12, 13):
+        enrollment_service.enroll_student(student_id, 7)
+    assert seats['enrolled'] == [1]
+
+    seats['max'] = 3
+    assert enrollment_service.promote_waitlist(7) == 2
+
+    assert seats['enrolled'] == [1, 11, 12]
+    assert [row['student_id'] for row in seats['waitlist']] == [13]
@@ -0,0 +1,25 @@
+import exam_stats
+
+EXAM = {'exam_id': 5, 'exam_name': 'Unit 1', 'exam_date': None, 'total_marks': 100, 'passing_marks': 40}
+
+def test_statistics_follow_the_shared_version(fake_db):
+    exam_stats.exam_stats_cache.invalidate()
+    state = {'version': 3, 'marks': [70, 30]}
+    loads = []
+
+    def load(params):
+        loads.append(params)
+        return [dict(EXAM, student_id=index, marks_obtained=mark) for index, mark in enumerate(state['marks'])]
+
+    db = fake_db(exam_stats)
+    db.on("exam_stats_versions v", lambda params: {'version': state['version']})
+    db.on("WHERE e.exam_id = %s", load)
+
+    assert exam_stats.exam_statistics(5)['mean'] == 50
+    assert exam_stats.exam_statistics(5)['mean'] == 50
+    assert len(loads) == 1
+
+    # Another worker saved marks and bumped the batch's version
+    state.update(version=4, marks=[90, 30])
+    assert exam_stats.exam_statistics(5)['mean'] == 60
+    assert len(loads) == 2
@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+import pytest
+
+import fee_service
+
+# The columns of fees and fee_transactions that fee_service reads and writes
+SCHEMA = """
+CREATE TABLE fees (
+    fee_id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    discount_amount DECIMAL(10, 2),
+    paid_amount DECIMAL(10, 2) DEFAULT 0,
+    due_amount DECIMAL(10, 2) NOT NULL,
+    payment_status TEXT DEFAULT 'pending'
+);
+CREATE TABLE fee_transactions (
+    transaction_id INTEGER PRIMARY KEY,
+    fee_id INTEGER NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    payment_date TEXT,
+    payment_method TEXT,
+    transaction_ref TEXT,
+    receipt_no TEXT,
+    received_by INTEGER
+);
+"""
+
+@pytest.fixture
+def fees(sqlite_db):
+    db = sqlite_db(SCHEMA, fee_service)
+    db.connection.executemany(
+        "INSERT INTO fees (fee_id, student_id, total_amount, discount_amount, paid_amount, due_amount) "
+        "VALUES (?, ?, ?, ?, 0, ?)",
+        [(1, 2, Decimal('1500.00'), None, Decimal('1500.00')),
+         (3, 2, Decimal('1500.00'), Decimal('250.00'), Decimal('1250.00'))]
+    )
+    return db
+
+def _stored(db, fee_id):
+    row = db.connection.execute("SELECT paid_amount, due_amount, payment_status FROM fees WHERE fee_id = ?",
+                                (fee_id,)).fetchone()
+    return dict(row)
+
+def test_payments_on_a_fee_with_null_discount_settle_and_reconcile(fees):
+    before, after = fee_service.settle_payment(1, 2, '500.004', 'cash', None, 'RCP2026-000001', 9)
+
+    assert before['due_amount'] == Decimal('1500.00')
+    assert after == {'paid_amount': Decimal('500.00'), 'due_amount': Decimal('1000.00'),
+                     'payment_status': 'partial'}
+    assert _stored(fees, 1) == after
+    # The live totals from fee_transactions agree with the stored ones
+    assert fee_service.verify_fees(1) == []
+
+    _, after = fee_service.settle_payment(1, 2, Decimal('1000'), 'upi', 'T1', 'RCP2026-000002', 9)
+
+    assert after == {'paid_amount': Decimal('1500.00'), 'due_amount': Decimal('0.00'), 'payment_status': 'paid'}
+    assert fee_service.verify_fees() == []
+
+def test_payment_cannot_exceed_the_due_amount(fees):
+    assert fee_service.settle_payment(1, 2, Decimal('1500.01'), 'cash', None, 'RCP2026-000003', 9) is None
+    assert fee_service.settle_payment(3, 2, Decimal('1250.01'), 'cash', None, 'RCP2026-000004', 9) is None
+    assert fees.connection.execute("SELECT COUNT(*) FROM fee_transactions").fetchone()[0] == 0
+
+def test_reconciliation_treats_null_discount_as_zero(fees):
+    fee_service.settle_payment(1, 2, Decimal('400'), 'cash', None, 'RCP2026-000005', 9)
+    fee_service.settle_payment(3, 2, Decimal('400'), 'cash', None, 'RCP2026-000006', 9)
+    # Drift the stored amounts so the live ones are reported
+    fees.connection.execute("UPDATE fees SET paid_amount = 0, due_amount = 0, payment_status = 'paid'")
+
+    drift = {row['fee_id']: row for row in fee_service.verify_fees()}
+
+    assert drift[1]['due_amount'] == 1100
+    assert drift[1]['payment_status'] == 'partial'
+    assert drift[3]['due_amount'] == 850
+
+    assert fee_service.repair_fee(drift[1]) == 1
+    assert _stored(fees, 1) == {'paid_amount': Decimal('400'), 'due_amount': Decimal('1100'),
+                                'payment_status': 'partial'}
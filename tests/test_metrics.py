@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import database
+import metrics
+
+def test_pool_wait_histogram_is_exported(monkeypatch):
+    stats = {'pool_size': 5, 'max_overflow': 2, 'in_use': 1, 'overflow_in_use': 0, 'waiting': 0,
+             'checkouts': 4, 'checkout_failures': 0, 'wait_time_sum': 0.75,
+             'wait_time_buckets': [(0.01, 2), (0.5, 3), (float('inf'), 4)]}
+    monkeypatch.setattr(database, 'connection_pool', SimpleNamespace(stats=lambda: stats))
+
+    lines = metrics.registry.render().splitlines()
+
+    assert 'db_pool_wait_seconds_bucket{le="0.01"} 2' in lines
+    assert 'db_pool_wait_seconds_bucket{le="0.5"} 3' in lines
+    assert 'db_pool_wait_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'db_pool_wait_seconds_sum 0.75' in lines
+    assert 'db_pool_wait_seconds_count 4' in lines
+    assert '# TYPE db_pool_wait_seconds histogram' in lines
+
+def _scrape(monkeypatch, **request_args):
+    from flask import Flask
+    monkeypatch.setattr(metrics.Config, 'METRICS_TOKEN', 's3cret')
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(metrics.metrics_bp)
+    return app.test_client().get('/metrics', **request_args).status_code
+
+def test_metrics_token_is_accepted_from_the_authorization_header(monkeypatch):
+    assert _scrape(monkeypatch, headers={'Authorization': 'Bearer s3cret'}) == 200
+    assert _scrape(monkeypatch, headers={'Authorization': 'Bearer wrong'}) == 404
+
+def test_metrics_token_in_the_query_string_is_refused(monkeypatch):
+    assert _scrape(monkeypatch, query_string={'token': 's3cret'}) == 404
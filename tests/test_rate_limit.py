@@ -0,0 +1,18 @@
+import rate_limit
+
+def test_username_and_email_share_one_account_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limit, '_user_buckets', rate_limit.TokenBucketLimiter('test_login', 3, 0))
+    user = {'user_id': 42, 'username': 'asha', 'email': 'asha@example.com'}
+
+    attempts = [rate_limit.check_login('10.0.0.1', rate_limit.login_key(user, typed))
+                for typed in ('asha', 'asha@example.com', 'ASHA', 'asha@example.com')]
+
+    assert attempts[:3] == [0, 0, 0]
+    assert attempts[3] > 0
+
+    rate_limit.reset_login(rate_limit.login_key(user, 'asha@example.com'))
+    assert rate_limit.check_login('10.0.0.1', rate_limit.login_key(user, 'asha')) == 0
+
+def test_unknown_identifiers_get_their_own_bucket():
+    assert rate_limit.login_key(None, ' Nobody ') == 'name:nobody'
+    assert rate_limit.login_key({'user_id': 7}, 'nobody') == 'id:7'
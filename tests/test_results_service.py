@@ -0,0 +1,14 @@
+import results_service
+
+def test_parse_marks_reports_bad_ids_and_marks():
+    entries, errors = results_service.parse_marks(['1', 'x', '3', '4', '5'], ['40', '50', '', '101', 'ten'], 100)
+
+    assert entries == {1: 40}
+    assert errors == ['student x', '101', 'ten']
+
+def test_not_enrolled_lists_students_outside_the_batch(fake_db):
+    db = fake_db(results_service)
+    db.on("SELECT student_id FROM enrollments", [{'student_id': 1}, {'student_id': 3}])
+
+    assert results_service.not_enrolled(8, [1, 2, 3]) == {2}
+    assert "status = 'active'" in db.statements[0]
@@ -0,0 +1,36 @@
+import student_import_service
+
+def _row(username, email):
+    return {'username': username, 'email': email, 'password': 'secret123', 'full_name': username.title()}
+
+def test_duplicate_rows_in_the_file_keep_the_first(fake_db, monkeypatch):
+    monkeypatch.setattr(student_import_service, 'hash_passwords', lambda passwords: ['hash'] * len(passwords))
+    monkeypatch.setattr(student_import_service, 'refresh_counters', lambda *names: None)
+    monkeypatch.setattr(student_import_service, 'invalidate_lookups', lambda *kinds: None)
+    inserted = []
+
+    def insert_users(rows):
+        inserted.extend(row[0] for row in rows)
+        return len(rows)
+
+    db = fake_db(student_import_service)
+    db.on("SELECT username, email FROM users", [])
+    db.on("INSERT INTO users", insert_users)
+    db.on("SELECT user_id, username FROM users",
+          lambda params: [{'user_id': index, 'username': name} for index, name in enumerate(params, start=1)])
+    db.on("INSERT INTO students", lambda rows: len(rows))
+
+    report = student_import_service.import_students([
+        (2, _row('asha', 'asha@example.com')),
+        (3, _row('Asha', 'other@example.com')),
+        (4, _row('ravi', 'ASHA@example.com')),
+        (5, _row('meera', 'meera@example.com')),
+    ])
+
+    assert inserted == ['asha', 'meera']
+    assert report.processed == 4
+    assert report.imported == 2
+    assert [(error['line'], error['message']) for error in report.errors] == [
+        (3, "Username repeated in the file"),
+        (4, "Email repeated in the file"),
+    ]
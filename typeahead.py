@@ -0,0 +1,106 @@
+from database import iter_query, Error
+from cache import TTLCache
+from config import Config
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Built indexes per kind ('students', 'batches'); rebuilt after invalidation or TTL
+lookup_cache = TTLCache('typeahead', Config.TYPEAHEAD_CACHE_TTL, max_entries=8)
+
+class PrefixIndex:
+    """
+    Sorted (key, id) pairs searched by prefix with bisect
+
+    Every entry is indexed under each of its keys and each word in them,
+    so "sha" finds "Amit Shah" as well as "Shalini".
+    """
+
+    def __init__(self):
+        self.labels = {}
+        self._keys = []
+
+    def add(self, entry_id, label, *keys):
+        self.labels[entry_id] = label
+        for key in keys:
+            if not key:
+                continue
+            key = key.lower()
+            words = key.split()
+            for term in {key, *words}:
+                self._keys.append((term, entry_id))
+
+    def freeze(self):
+        self._keys.sort()
+        return self
+
+    def search(self, prefix, limit=10):
+        """Ids whose keys start with prefix (case-insensitive), in key order"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        found = []
+        position = bisect.bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(found) < limit:
+            key, entry_id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            if entry_id not in found:
+                found.append(entry_id)
+            position += 1
+        return found
+
+def _build_students():
+    index = PrefixIndex()
+    for student_id, enrollment_no, full_name in iter_query(
+            """SELECT s.student_id, s.enrollment_no, u.full_name
+               FROM students s
+               JOIN users u ON s.user_id = u.user_id
+               WHERE u.status = 'active'""",
+            row_type='tuple'):
+        index.add(student_id, f"{enrollment_no} - {full_name}", enrollment_no, full_name)
+    return index.freeze()
+
+def _build_batches():
+    index = PrefixIndex()
+    for batch_id, batch_name, course_name in iter_query(
+            """SELECT b.batch_id, b.batch_name, c.course_name
+               FROM batches b
+               JOIN courses c ON b.course_id = c.course_id""",
+            row_type='tuple'):
+        index.add(batch_id, f"{batch_name} - {course_name}", batch_name)
+    return index.freeze()
+
+_BUILDERS = {'students': _build_students, 'batches': _build_batches}
+
+def _build(kind):
+    try:
+        return _BUILDERS[kind]()
+    except Error as e:
+        logger.error(f"Typeahead index for {kind} not built: {e}")
+        return PrefixIndex()
+
+def _index(kind):
+    # An empty index usually means the load failed; build again next time
+    return lookup_cache.get_or_set(kind, lambda: _build(kind), should_store=lambda index: index.labels)
+
+def lookup(kind, prefix, limit=10):
+    """
+    Typeahead matches for 'students' or 'batches'
+
+    Returns:
+        List of {'id', 'label'} dicts
+    """
+    index = _index(kind)
+    return [{'id': entry_id, 'label': index.labels[entry_id]} for entry_id in index.search(prefix, limit)]
+
+def lookup_label(kind, entry_id):
+    """Display label for a selected id (None if unknown)"""
+    if not entry_id:
+        return None
+    return _index(kind).labels.get(entry_id)
+
+def invalidate_lookups(kind=None):
+    """Call after writes that add, rename or remove students or batches"""
+    lookup_cache.invalidate(kind)